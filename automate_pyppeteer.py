@@ -5,12 +5,31 @@ Goes to satu.unri.ac.id, logs in, and takes full page screenshots
 """
 
 import os
+import sys
+import argparse
 import asyncio
 import json
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime
 from pyppeteer import launch
-from PIL import Image
-import numpy as np
+
+from http_extract import (
+    HttpExtractor, SessionExpiredError, check_expected, check_parity, extract_form_data, save_fixture,
+)
+from launch_profile import PROFILES as LAUNCH_PROFILES, launch_arguments, resolve_profile
+from memory_guard import MemoryGuard, MemoryLimits
+from page_capture import CLIP_PADDING, CONTENT_CLIP_JS, EXTENSIONS, FORMATS, capture_row_screenshot
+from pacing import PacingController, PacingLimits
+from page_readiness import ReadinessEngine
+from resource_policy import ResourcePolicy
+from retry_policy import FailureLog, RetryPolicy, StepTimeouts, failures_file
+from run_journal import RunJournal, latest_run_id
+from run_trace import NO_PHASE, CdpCounter, RunTrace
+from screenshot_pipeline import ScreenshotPipeline
+from shard_runner import COSTS_FILE, run_sharded, update_costs
+from state_store import DOM_SIGNATURE_JS, RowStateStore, row_fingerprint
+from visit_cache import VisitCache
 
 
 def load_credentials(cred_file="cred.txt"):
@@ -43,465 +62,1246 @@ def load_urls(url_file="list_url.txt"):
         return []
 
 
-def auto_crop_image(image_path):
-    """Auto crop image to remove sidebar and blank spaces"""
+def load_session(session_file="session.json"):
+    """Load saved session cookies and local storage from file"""
     try:
-        # Open image
-        img = Image.open(image_path)
-        img_array = np.array(img)
-        
-        # Convert to grayscale for analysis
-        gray = np.mean(img_array, axis=2)
-        
-        # Find non-white regions (assuming white background)
-        # Threshold for "non-white" pixels
-        threshold = 240
-        non_white = gray < threshold
-        
-        # Find bounding box of content
-        rows = np.any(non_white, axis=1)
-        cols = np.any(non_white, axis=0)
-        
-        if not np.any(rows) or not np.any(cols):
-            print("No content found to crop")
-            return image_path
-        
-        # Get bounding box coordinates
-        top, bottom = np.where(rows)[0][[0, -1]]
-        left, right = np.where(cols)[0][[0, -1]]
-        
-        # Add small padding
-        padding = 20
-        top = max(0, top - padding)
-        left = max(0, left - padding)
-        bottom = min(img.height, bottom + padding)
-        right = min(img.width, right + padding)
-        
-        # Crop the image
-        cropped = img.crop((left, top, right, bottom))
-        
-        # Save cropped image
-        cropped_path = image_path.replace('.png', '_cropped.png')
-        cropped.save(cropped_path, 'PNG')
-        
-        print(f"Image cropped: {cropped_path}")
-        print(f"Original size: {img.size}, Cropped size: {cropped.size}")
-        
-        return cropped_path
+        with open(session_file, 'r', encoding='utf-8') as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable session file {session_file}: {e}")
+        return None
+
+    # Skip the probe entirely when every persistent cookie has expired
+    now = time.time()
+    cookies = session.get('cookies') or []
+    if not any(c.get('expires', -1) in (-1, None) or c['expires'] > now for c in cookies):
+        print("Saved session has expired")
+        return None
+    return session
+
+
+async def snapshot_session(page):
+    """Cookies and local storage of a logged-in page, as saved to file"""
+    return {
+        'saved_at': datetime.now().isoformat(timespec='seconds'),
+        'origin': await page.evaluate('() => window.location.origin'),
+        'cookies': await page.cookies(),
+        'local_storage': await page.evaluate('() => Object.assign({}, window.localStorage)'),
+    }
+
+
+async def save_session(page, session_file="session.json"):
+    """Save the logged-in page's cookies and local storage to file"""
+    session = await snapshot_session(page)
+    # The file holds live session cookies, keep it private to the user
+    fd = os.open(session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(session, f, indent=2)
+    print(f"Session saved: {session_file}")
+
+
+# Fields of the login form, on a page that should not have them
+LOGIN_FIELDS = 'input[type="password"], input[type="email"], input[name*="email"], input[placeholder*="email"]'
+
+
+async def is_logged_in(page):
+    """Check that the current page is not the login form"""
+    login_field = await page.querySelector(LOGIN_FIELDS)
+    return login_field is None
+
+
+async def restore_session(page, session, probe_url):
+    """Load a saved session into the page and probe that it is still valid"""
+    if not session:
+        return False
+
+    print(f"Restoring session saved at {session.get('saved_at')}...")
+    await page.setCookie(*session['cookies'])
+    if session.get('local_storage'):
+        # Seed local storage before any page script on the session's origin runs
+        await page.evaluateOnNewDocument('''(origin, items) => {
+            if (window.location.origin !== origin) return;
+            for (const [key, value] of Object.entries(items)) {
+                if (window.localStorage.getItem(key) === null) {
+                    window.localStorage.setItem(key, value);
+                }
+            }
+        }''', session.get('origin'), session['local_storage'])
+
+    # One cheap navigation: an expired session lands back on the login form
+    await page.goto(probe_url, {'waitUntil': 'domcontentloaded'})
+    if await is_logged_in(page):
+        print("Saved session is still valid, skipping login")
+        return True
+
+    print("Saved session is no longer valid")
+    await page.deleteCookie(*session['cookies'])
+    return False
+
+
+async def restart_browser(browser, page, login_url, session_file=None, **launch_options):
+    """Replace a browser with a new one on the same session; returns (browser, page)"""
+    try:
+        session = await snapshot_session(page)
+    except Exception:
+        session = None
+    await browser.close()
+    browser = await launch(**launch_options)
+    page = await browser.newPage()
+    if not await restore_session(page, session, login_url):
+        if not await sign_in(page, login_url, session_file):
+            raise RuntimeError("Could not log in again after restarting the browser")
+    return browser, page
+
+
+# Rows taken from every list page: links at index 4-7 (rows 5-8)
+ISI_ROW_START = 4
+ISI_ROW_END = 8
+
+FIND_ISI_LINKS_JS = '''() => {
+    const links = [];
+    
+    // Find all links with "Isi" text and href containing "input"
+    const isiElements = document.querySelectorAll('a.btn.btn-primary');
+    isiElements.forEach(link => {
+        if (link.textContent.includes('Isi') && link.href.includes('input')) {
+            links.push(link.href);
+        }
+    });
+    
+    return links;
+}'''
+
+EXTRACT_FORM_DATA_JS = '''() => {
+    const data = {};
+    
+    // Get course information from the page header
+    const courseInfo = {};
+    
+    // Find all rows with course information
+    const infoRows = document.querySelectorAll('.row.border-gray-300');
+    infoRows.forEach(row => {
+        const labels = row.querySelectorAll('label');
+        const values = row.querySelectorAll('.fw-bold');
         
-    except Exception as e:
-        print(f"Error cropping image: {e}")
-        return image_path
+        labels.forEach((label, index) => {
+            const labelText = label.textContent.trim();
+            const valueDiv = values[index];
+            if (valueDiv) {
+                let valueText = valueDiv.textContent.trim();
+                
+                // Clean up the text (remove extra whitespace, newlines)
+                valueText = valueText.replace(/\\s+/g, ' ').trim();
+                
+                if (labelText === 'Program Studi') {
+                    courseInfo.program_studi = valueText;
+                } else if (labelText === 'Semester') {
+                    courseInfo.semester = valueText;
+                } else if (labelText === 'Mata Kuliah') {
+                    courseInfo.mata_kuliah = valueText;
+                } else if (labelText === 'Dosen Pengampu') {
+                    courseInfo.dosen_pengampu = valueText;
+                } else if (labelText === 'Kelas') {
+                    courseInfo.kelas = valueText;
+                }
+            }
+        });
+    });
+    
+    data.course_info = courseInfo;
+    
+    // Get form action URL
+    const form = document.querySelector('form');
+    if (form) {
+        data.form_action = form.action;
+    }
+    
+    // Get CSRF token
+    const token = document.querySelector('input[name="_token"]');
+    if (token) {
+        data.csrf_token = token.value;
+    }
+    
+    // Get selected dosen option
+    const selectedOption = document.querySelector('input[name="dosenOption"]:checked');
+    if (selectedOption) {
+        data.dosen_option = selectedOption.value;
+    }
+    
+    // Get dosen hadir (present lecturer)
+    const dosenHadir = document.querySelector('#selectDosenHadir');
+    if (dosenHadir) {
+        data.dosen_hadir = {
+            value: dosenHadir.value,
+            text: dosenHadir.options[dosenHadir.selectedIndex]?.text || ''
+        };
+    }
+    
+    // Get dosen pengganti asing (foreign substitute)
+    const dosenPenggantiAsing = document.querySelector('#inputDosenPenggantiAsing');
+    if (dosenPenggantiAsing) {
+        data.dosen_pengganti_asing = dosenPenggantiAsing.value;
+    }
+    
+    // Get asal instansi (institution origin)
+    const asalInstansi = document.querySelector('#inputInstansiAsal');
+    if (asalInstansi) {
+        data.asal_instansi = asalInstansi.value;
+    }
+    
+    // Get tanggal rencana (planned date)
+    const tanggalRencana = document.querySelector('#inputTanggalRencana');
+    if (tanggalRencana) {
+        data.tanggal_rencana = tanggalRencana.value;
+    }
+    
+    // Get tanggal terlaksana (actual date)
+    const tanggalTerlaksana = document.querySelector('input[name="inputTanggalTerlaksana"]');
+    if (tanggalTerlaksana) {
+        data.tanggal_terlaksana = tanggalTerlaksana.value;
+    }
+    
+    // Get tema (theme)
+    const tema = document.querySelector('#inputTema');
+    if (tema) {
+        data.tema = tema.value;
+    }
+    
+    // Get pokok bahasan (topic of discussion)
+    const pokokBahasan = document.querySelector('#exampleFormControlTextarea1');
+    if (pokokBahasan) {
+        data.pokok_bahasan = pokokBahasan.value;
+    }
+    
+    // Get current URL
+    data.current_url = window.location.href;
+    
+    // Get page title
+    data.page_title = document.title;
+    
+    return data;
+}'''
 
 
-async def login_and_visit_urls(login_url, urls_list, output_dir="screenshots"):
-    """Login to the site and visit each URL to take screenshots"""
-    # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+async def login(page, login_url, credentials):
+    """Run the two-step email/password login on the given page"""
+    print(f"Navigating to login page: {login_url}...")
+    await page.goto(login_url, {'waitUntil': 'networkidle0'})
+    print("Login page loaded")
+    
+    # Step 1: Enter email
+    print("Step 1: Entering email...")
+    await page.waitForSelector('input[type="email"], input[name*="email"], input[placeholder*="email"]')
+    await page.type('input[type="email"], input[name*="email"], input[placeholder*="email"]', credentials['username'])
+    print(f"Email entered: {credentials['username']}")
+    
+    # Click continue/lanjutkan button
+    print("Clicking continue button...")
+    # Try different selectors for the continue button
+    continue_clicked = False
+    try:
+        # Try to find button with text "Lanjutkan"
+        await page.click('button[type="submit"], input[type="submit"], .btn-primary, button.btn')
+        continue_clicked = True
+        print("Clicked continue button")
+    except:
+        try:
+            # Alternative: find button by text content using XPath-like approach
+            await page.evaluate('''() => {
+                const buttons = Array.from(document.querySelectorAll('button'));
+                const lanjutkanBtn = buttons.find(btn => 
+                    btn.textContent.includes('Lanjutkan') || 
+                    btn.textContent.includes('Continue') ||
+                    btn.textContent.includes('lanjutkan')
+                );
+                if (lanjutkanBtn) {
+                    lanjutkanBtn.click();
+                    return true;
+                }
+                return false;
+            }''')
+            continue_clicked = True
+            print("Clicked continue button via text content")
+        except Exception as e:
+            print(f"Could not find continue button: {e}")
+            return False
+    
+    if not continue_clicked:
+        print("Warning: Continue button not found, trying to proceed anyway...")
+        # Try pressing Enter as fallback
+        await page.keyboard.press('Enter')
+    
+    # Wait for password page to load
+    print("Waiting for password page...")
+    await page.waitForNavigation({'waitUntil': 'networkidle0'})
+    print("Password page loaded")
+    
+    # Step 2: Enter password
+    print("Step 2: Entering password...")
+    await page.waitForSelector('input[type="password"]')
+    await page.type('input[type="password"]', credentials['password'])
+    print("Password entered")
+    
+    # Click login button
+    print("Clicking login button...")
+    login_clicked = False
+    try:
+        # Try common login button selectors
+        await page.click('button[type="submit"], input[type="submit"], .btn-primary, button.btn')
+        login_clicked = True
+        print("Clicked login button")
+    except:
+        try:
+            # Alternative: find button by text content
+            await page.evaluate('''() => {
+                const buttons = Array.from(document.querySelectorAll('button'));
+                const loginBtn = buttons.find(btn => 
+                    btn.textContent.includes('Login') || 
+                    btn.textContent.includes('Masuk') ||
+                    btn.textContent.includes('login') ||
+                    btn.textContent.includes('masuk')
+                );
+                if (loginBtn) {
+                    loginBtn.click();
+                    return true;
+                }
+                return false;
+            }''')
+            login_clicked = True
+            print("Clicked login button via text content")
+        except Exception as e:
+            print(f"Could not find login button: {e}")
+            # Try pressing Enter as fallback
+            await page.keyboard.press('Enter')
+            login_clicked = True
+            print("Pressed Enter as fallback")
+    
+    if not login_clicked:
+        print("Warning: Login button not found, trying Enter key...")
+        await page.keyboard.press('Enter')
+    
+    # Wait for login to complete
+    print("Waiting for login to complete...")
+    await page.waitForNavigation({'waitUntil': 'networkidle0'})
+    print("Login completed successfully!")
+    return True
+
+
+async def sign_in(page, login_url, session_file=None):
+    """Reuse the cached session or run the full login; returns whether it worked"""
+    session = load_session(session_file) if session_file else None
+    if await restore_session(page, session, login_url):
+        return True
     
     # Load credentials
     credentials = load_credentials()
     if not credentials:
-        return None
+        return False
+    
+    if not await login(page, login_url, credentials):
+        return False
+    
+    if session_file:
+        await save_session(page, session_file)
+    return True
+
+
+async def log_in_again(page, login_url, ctx, session_file=None, http_concurrency=4, save_html_dir=None):
+    """Log in again on a tab after the session expired
+
+    The tab's resource phase is lifted for the login page and restored
+    afterwards. The new session is saved to ``session_file`` and the run's
+    HttpExtractor, if any, restarted with its cookies.
+    """
+    print("🔑 Session expired, logging in again...")
+    previous_phase = ctx.policy.current_phase(page) if ctx.policy else None
+    ctx.set_phase(page, None)
+    try:
+        if not await sign_in(page, login_url, None):
+            raise RuntimeError("Login failed")
+    finally:
+        ctx.set_phase(page, previous_phase)
+    if session_file:
+        await save_session(page, session_file)
+    if ctx.http:
+        await ctx.http.close()
+        ctx.http = await HttpExtractor(concurrency=http_concurrency, save_html_dir=save_html_dir).start(page)
+
+
+# True when a page is the login form, i.e. the session expired
+LOGIN_FORM_JS = f'''() => document.querySelector({json.dumps(LOGIN_FIELDS)}) !== null'''
+
+# Page functions registered with the readiness checks, for ReadinessEngine.probe
+PAGE_FUNCTIONS = {
+    'links': FIND_ISI_LINKS_JS,
+    'form': EXTRACT_FORM_DATA_JS,
+    'signature': DOM_SIGNATURE_JS,
+    'clip': CONTENT_CLIP_JS,
+    'login_form': LOGIN_FORM_JS,
+}
+
+
+@dataclass
+class RunContext:
+    """Settings and helpers of one run, shared by every tab"""
+    output_dir: str
+    timestamp: str
+    readiness: ReadinessEngine
+    pipeline: ScreenshotPipeline
+    policy: ResourcePolicy = None
+    # Read form pages from their raw HTML instead of a page script
+    http: HttpExtractor = None
+    screenshots: bool = True
+    save_html_dir: str = None
+    # Fingerprints of earlier runs, to skip screenshots of unchanged rows
+    state: RowStateStore = None
+    trace: RunTrace = None
+    # "full" page for the pixel crop, or "clip" to the form container
+    capture_mode: str = 'full'
+    image_format: str = 'png'
+    image_quality: int = 90
+    # Per-host rate of navigations, adapted to the server's latency and errors
+    pacing: PacingController = None
+    cdp: CdpCounter = None
+    # Time limits of the steps of a page
+    timeouts: StepTimeouts = None
+
+    async def setup_tab(self, page):
+        """Attach the run's trackers to a new tab before it navigates"""
+        await self.readiness.attach(page)
+        if self.policy:
+            await self.policy.attach(page)
+        if self.trace:
+            self.trace.attach(page)
+        if self.cdp:
+            self.cdp.attach(page)
+
+    def phase(self, name, page=None, **details):
+        """Context manager timing a phase of the run when tracing is on"""
+        if self.trace:
+            return self.trace.phase(name, page, **details)
+        return NO_PHASE
+
+    def navigation(self, url):
+        """Context manager pacing a navigation to ``url`` when pacing is on"""
+        if self.pacing:
+            return self.pacing.navigation(url)
+        return NO_PHASE
+
+    async def step(self, name, awaitable):
+        """Await one step of a page within its time limit, when limits are set"""
+        if self.timeouts:
+            return await self.timeouts.run(name, awaitable)
+        return await awaitable
+
+    def set_phase(self, page, phase):
+        """Apply the resource policy of a phase to the tab's next requests"""
+        if self.policy:
+            self.policy.set_phase(page, phase)
+
+
+async def collect_isi_links(page, url, ctx):
+    """Open a list page, load all of its content and return its "Isi" links"""
+    if ctx.http:
+        # Server-rendered lists need no browser; fall back to the tab otherwise
+        try:
+            async with ctx.navigation(url), ctx.phase('list.http', url=url):
+                isi_links = await ctx.http.isi_links(url)
+        except Exception as e:
+            print(f"Could not read the list page over HTTP: {e}")
+            isi_links = []
+        if isi_links:
+            print(f"Found {len(isi_links)} 'isi' links over HTTP: {isi_links}")
+            return isi_links
+        print("No 'isi' links in the raw HTML, loading the list page in the browser...")
+    
+    # Only documents, scripts and XHR are needed to find the links
+    ctx.set_phase(page, 'discovery')
+    async with ctx.navigation(url) as outcome, ctx.phase('list.navigate', page, url=url):
+        response = await ctx.step('navigate', page.goto(url, {'waitUntil': 'domcontentloaded'}))
+        outcome['status'] = response and response.status
+    print("Initial page load complete")
+    
+    if ctx.readiness.probing:
+        # Settle, scroll in lazy content and find the links in one call
+        async with ctx.phase('list.probe', page, url=url) as details:
+            record, found = await ctx.step('settle', ctx.readiness.probe(page, 'list', links=()))
+            details.update(record)
+        isi_links = found['links']
+    else:
+        # Wait for network, DOM and images to settle, scrolling in lazy content
+        async with ctx.phase('list.settle', page, url=url) as details:
+            details.update(await ctx.step('settle', ctx.readiness.settle(page, 'list')))
+        
+        # Find all "Isi" links with the specific structure
+        print("Finding all 'Isi' links...")
+        async with ctx.phase('list.links', page, url=url):
+            isi_links = await ctx.step('extract', page.evaluate(FIND_ISI_LINKS_JS))
+    
+    # A list without links may be the login form of an expired session
+    if not isi_links and not await is_logged_in(page):
+        raise SessionExpiredError(f"Redirected to the login form while loading {url}")
+    print(f"Found {len(isi_links)} 'isi' links: {isi_links}")
+    return isi_links
+
+
+def add_row_info(form_data, url_index, row_number, original_url):
+    """Tag extracted form data with the row it came from"""
+    form_data['url_index'] = url_index
+    form_data['row_number'] = row_number
+    form_data['original_url'] = original_url
+    
+    print(f"Form data collected for row {row_number}")
+    print(f"Form data: {json.dumps(form_data, indent=2, ensure_ascii=False)}")
+    return form_data
+
+
+def fixture_name(url_index, row_number):
+    return f"url_{url_index:02d}_row_{row_number}.html"
+
+
+async def fetch_row(link, url_index, row_number, original_url, ctx):
+    """Read one "Isi" row page over HTTP, without a browser tab or screenshot"""
+    print(f"Fetching link {row_number}: {link}")
+    async with ctx.navigation(link), ctx.phase('row.http', url_index=url_index, row=row_number):
+        form_data = await ctx.http.form_data(link, fixture_name(url_index, row_number))
+    return add_row_info(form_data, url_index, row_number, original_url), None
+
+
+async def capture_row(page, link, url_index, row_number, original_url, ctx):
+    """Open one "Isi" row page, extract its form data and screenshot it
+
+    Returns the form data and a future of the cropped screenshot's path
+    (``None`` without screenshots); the crop runs in the screenshot
+    pipeline while the tab moves on.
+    """
+    print(f"Navigating to link {row_number}: {link}")
+    
+    # A screenshotted page needs styles, images and fonts as part of the load
+    ctx.set_phase(page, 'capture' if ctx.screenshots else 'extract')
+    
+    row = {'url_index': url_index, 'row': row_number}
+    
+    # Navigate directly to the URL
+    async with ctx.navigation(link) as outcome, ctx.phase('row.navigate', page, **row):
+        response = await ctx.step('navigate', page.goto(link, {'waitUntil': 'domcontentloaded'}))
+        outcome['status'] = response and response.status
+    
+    # Wait for the form page to settle, and run the page functions needed
+    # below in the same call when the readiness engine has them
+    found = {}
+    async with ctx.phase('row.settle', page, **row) as details:
+        if ctx.readiness.probing:
+            calls = {'login_form': ()}
+            if not ctx.http:
+                calls['form'] = ()
+            if ctx.screenshots and ctx.state:
+                calls['signature'] = ()
+            if ctx.screenshots and ctx.capture_mode == 'clip':
+                calls['clip'] = (CLIP_PADDING,)
+            record, found = await ctx.step('settle', ctx.readiness.probe(page, 'form', **calls))
+            logged_out = found['login_form']
+        else:
+            record = await ctx.step('settle', ctx.readiness.settle(page, 'form'))
+            logged_out = not await is_logged_in(page)
+        details.update(record)
+    if logged_out:
+        raise SessionExpiredError(f"Redirected to the login form while loading {link}")
+    
+    # Extract form data and course info
+    print("Extracting form data and course information...")
+    async with ctx.phase('row.extract', page, **row):
+        if ctx.http or ctx.save_html_dir:
+            html = await ctx.step('extract', response.text())
+            if ctx.save_html_dir:
+                save_fixture(ctx.save_html_dir, fixture_name(url_index, row_number), page.url, html)
+        if ctx.http:
+            # Parse the document the browser already downloaded
+            form_data = extract_form_data(html, page.url)
+        elif 'form' in found:
+            form_data = found['form']
+        else:
+            form_data = await ctx.step('extract', page.evaluate(EXTRACT_FORM_DATA_JS))
+    add_row_info(form_data, url_index, row_number, original_url)
+    
+    if not ctx.screenshots:
+        return form_data, None
+    
+    if ctx.state:
+        async with ctx.phase('row.fingerprint', page, **row):
+            if 'signature' in found:
+                signature = found['signature']
+            else:
+                signature = await ctx.step('extract', page.evaluate(DOM_SIGNATURE_JS))
+            fingerprint = row_fingerprint(form_data, signature)
+        status, previous_screenshot = ctx.state.check(link, fingerprint)
+        form_data['row_status'] = status
+        if previous_screenshot:
+            print(f"Row {row_number} unchanged since the last run, reusing {previous_screenshot}")
+            reused = asyncio.get_running_loop().create_future()
+            reused.set_result(previous_screenshot)
+            return form_data, reused
+    
+    # Take screenshot of this page
+    filename = f"url_{url_index:02d}_row_{row_number}_{ctx.timestamp}{EXTENSIONS[ctx.image_format]}"
+    filepath = os.path.join(ctx.output_dir, filename)
+    
+    async with ctx.phase('row.screenshot', page, **row) as details:
+        image_bytes, clipped = await ctx.step('screenshot', capture_row_screenshot(
+            page, ctx.capture_mode, ctx.image_format, ctx.image_quality, clip=found.get('clip')
+        ))
+        details.update(image_bytes=len(image_bytes), clipped=clipped)
+    
+    # Auto crop (unless clipped in the page) and save the screenshot off the event loop
+    async with ctx.phase('row.queue', **row):
+        cropped_path = await ctx.pipeline.submit(image_bytes, filepath, crop=not clipped)
+    print(f"Screenshot queued: {filename}")
+    
+    if ctx.state:
+        def remember(future):
+            if not future.cancelled() and future.exception() is None:
+                ctx.state.record(link, fingerprint, future.result())
+        cropped_path.add_done_callback(remember)
+    return form_data, cropped_path
+
+
+class TabPool:
+    """Run list-page and row jobs over several tabs of one logged-in browser
+
+    All tabs live in the browser's default context, so they share the cookies
+    set by the login. Row jobs are dispatched before list jobs, which keeps a
+    single-tab pool in the same order as visiting everything on one page.
+    A job that fails only loses its own result and the worker carries on
+    with the next job; a tab that was closed or crashed is replaced after
+    any job, failed or not.
+    ``submit_later`` queues a retry after a delay without holding a tab,
+    and the pool does not drain while one is waiting.
+    With a ``guard`` (a ``MemoryGuard``) a tab is also replaced when it
+    grows too big, and the browser is restarted through ``relaunch(page)``
+    (returning the new browser and a logged-in tab) when it does; queued
+    jobs wait meanwhile and keep their order.
+    """
+
+    ROW_PRIORITY = 0
+    LIST_PRIORITY = 1
+
+    def __init__(self, browser, concurrency, viewport, first_page=None, setup_tab=None, keep_results=True,
+                 guard=None, relaunch=None):
+        self.browser = browser
+        self.concurrency = max(1, concurrency)
+        self.viewport = viewport
+        self.first_page = first_page
+        self.setup_tab = setup_tab
+        # A long-running pool hands results back through its jobs instead
+        self.keep_results = keep_results
+        self.results = {}
+        self.failures = []
+        self.guard = guard
+        self.relaunch = relaunch
+        self._queue = asyncio.PriorityQueue()
+        self._seq = 0
+        self._workers = []
+        # Closed while the browser restarts; the generation tells workers
+        # their tab belongs to a closed browser
+        self._open = asyncio.Event()
+        self._open.set()
+        self._generation = 0
+        self._busy = 0
+        self._deferred = 0
+        self._crashed = set()
+        # Generation of the browser each tab was opened in
+        self._tab_generation = {}
+
+    async def new_tab(self):
+        # Read together with the browser: a restart during newPage leaves the tab old
+        generation = self._generation
+        page = await self.browser.newPage()
+        self._tab_generation[page] = generation
+        await page.setViewport(self.viewport)
+        if self.setup_tab:
+            await self.setup_tab(page)
+        return self._watch(page)
+
+    def _watch(self, page):
+        # A crashed renderer leaves the page open but unusable
+        page.on('error', lambda _: self._crashed.add(page))
+        return page
+
+    async def _replace_broken(self, page):
+        """A new tab for one that was closed or whose renderer crashed"""
+        self._crashed.discard(page)
+        self._tab_generation.pop(page, None)
+        if self.guard:
+            self.guard.forget(page)
+        if not page.isClosed():
+            try:
+                await page.close()
+            except Exception:
+                pass
+        return await self.new_tab()
+
+    def submit(self, priority, key, job):
+        """Queue ``job(page)``; its return value is stored under ``key``"""
+        self._seq += 1
+        self._queue.put_nowait((priority, key, self._seq, job))
+
+    def submit_later(self, delay, priority, key, job):
+        """Queue ``job(page)`` once ``delay`` seconds passed"""
+        def put():
+            self._deferred -= 1
+            self.submit(priority, key, job)
+        self._deferred += 1
+        asyncio.get_running_loop().call_later(delay, put)
+
+    async def _worker(self, page):
+        while True:
+            _, key, _, job = await self._queue.get()
+            await self._open.wait()
+            if self._tab_generation.get(page) != self._generation:
+                # A tab of the browser closed by a restart
+                self._tab_generation.pop(page, None)
+                page = await self.new_tab()
+            self._busy += 1
+            try:
+                result = await job(page)
+                if self.keep_results:
+                    self.results[key] = result
+            except Exception as e:
+                print(f"❌ Job {key} failed: {e}")
+                self.failures.append({'key': key, 'error': str(e)})
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+            # Also after jobs that handled their own failure, e.g. to retry later
+            if page.isClosed() or page in self._crashed:
+                page = await self._replace_broken(page)
+            if self.guard:
+                page = await self._check_memory(page)
+
+    async def _check_memory(self, page):
+        """Replace an oversized tab or restart an oversized browser; returns the tab to use"""
+        if self.relaunch and self.guard.browser_over_limit(self.browser):
+            return await self._restart(page)
+        reason = await self.guard.check_tab(page)
+        if reason is None:
+            return page
+        self.guard.recycled[reason] += 1
+        self.guard.forget(page)
+        self._tab_generation.pop(page, None)
+        fresh = await self.new_tab()
+        await page.close()
+        return fresh
+
+    async def _restart(self, page):
+        """Restart the browser once the other tabs finished their jobs"""
+        if not self._open.is_set():
+            return page
+        self._open.clear()
+        try:
+            while self._busy:
+                await asyncio.sleep(0.05)
+            print("♻️ Browser over its memory limit, restarting it...")
+            self.browser, page = await self.relaunch(page)
+            self._watch(page)
+            await page.setViewport(self.viewport)
+            if self.setup_tab:
+                await self.setup_tab(page)
+            self.guard.restarts += 1
+            self._generation += 1
+            self._tab_generation[page] = self._generation
+        finally:
+            self._open.set()
+        return page
+
+    @property
+    def queued(self):
+        return self._queue.qsize() + self._deferred
+
+    async def start(self):
+        """Open the tabs and start one worker per tab"""
+        pages = []
+        if self.first_page:
+            self._tab_generation[self.first_page] = self._generation
+            pages.append(self._watch(self.first_page))
+        while len(pages) < self.concurrency:
+            pages.append(await self.new_tab())
+        self._workers = [asyncio.ensure_future(self._worker(page)) for page in pages]
+        return self._workers
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _drain(self):
+        """Wait until no job is queued, running or waiting for its retry"""
+        while True:
+            await self._queue.join()
+            if not self._deferred:
+                return
+            await asyncio.sleep(0.05)
+
+    async def run(self):
+        """Start the tabs, wait until the queue drains, then stop the workers"""
+        workers = await self.start()
+        drained = asyncio.ensure_future(self._drain())
+        try:
+            # Workers only finish on their own when a tab cannot be replaced
+            await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+            if not drained.done():
+                dead = next(worker for worker in workers if worker.done())
+                raise dead.exception() or RuntimeError("Tab worker stopped")
+        finally:
+            drained.cancel()
+            await self.stop()
+        return self.results
+
+
+async def login_and_visit_urls(login_url, urls_list, output_dir="screenshots", concurrency=1,
+                               session_file="session.json", resource_policy=None,
+                               crop_workers=None, crop_queue=None, extract_mode="browser",
+                               screenshots=True, save_html_dir=None, resume=None, state_db=None,
+                               run_id=None, url_indexes=None, browser_args=None, trace=False,
+                               headless=False, capture_mode='full', image_format='png', image_quality=90,
+                               max_tab_heap_mb=512, max_tab_navigations=250, max_browser_rss_mb=None,
+                               visit_cache=None, visit_cache_max_age=24,
+                               pace_floor=0.5, pace_ceiling=10, pace_target_ms=2000, page_probe=True,
+                               report=False, launch_profile='window', user_data_dir=None,
+                               row_attempts=3, list_attempts=3, retry_delay=1.0, step_timeouts=None):
+    """Login to the site and visit each URL to take screenshots
+
+    ``concurrency`` is the number of tabs used to visit the list pages and
+    their "Isi" rows once the login is done. The session is reused from
+    ``session_file`` when it is still valid and saved there after a full
+    login; pass ``None`` to always log in from scratch. ``resource_policy``
+    (a ``ResourcePolicy``) blocks the resources each phase does not need.
+    Screenshots are cropped by ``crop_workers`` processes with at most
+    ``crop_queue`` of them waiting (defaults: one per core, twice that).
+    With ``extract_mode="http"`` form pages are read from their raw HTML,
+    and without ``screenshots`` the rows are fetched over HTTP with the
+    session cookies instead of being opened in a tab. ``save_html_dir``
+    keeps the raw row pages as fixtures for ``parity`` checks.
+    Rows are streamed to a JSONL file and checkpointed as they finish;
+    ``resume`` (a run timestamp or ``"latest"``) continues an earlier run
+    and skips the rows it already completed. With ``state_db`` (an SQLite
+    file) rows whose content matches the last run keep their screenshot.
+    A shard of a larger run passes its ``run_id`` and the ``url_indexes``
+    of its URLs in the full list, plus any extra Chromium ``browser_args``.
+    The tab time spent on each list URL is added to ``url_costs.json``.
+    With ``trace`` every phase is timed into ``trace_<timestamp>.jsonl`` and
+    a Chrome trace-event file, and summarised at the end. The browser is
+    started with ``launch_profile`` (see launch_profile.PROFILES);
+    ``headless`` and ``user_data_dir`` override the profile's settings.
+    The time from launch to the first navigation is reported. ``capture_mode="clip"`` screenshots
+    only the form container instead of cropping full-page captures;
+    ``image_format`` is png, jpeg or webp, with ``image_quality`` for the
+    lossy ones. A tab whose JS heap passes ``max_tab_heap_mb`` or that
+    served ``max_tab_navigations`` jobs is swapped for a fresh one, and the
+    browser is restarted on the same session once its processes use more
+    than ``max_browser_rss_mb`` (0 or None turns a limit off).
+    A row page linked from more than one list is visited once; the other
+    rows are added to its record's ``references``. With ``visit_cache`` (an
+    SQLite file) visits younger than ``visit_cache_max_age`` hours are
+    reused by later runs as well.
+    Navigations to each host are paced between ``pace_floor`` and
+    ``pace_ceiling`` per second: faster while the server answers within
+    ``pace_target_ms``, slower on errors and timeouts (a ceiling of 0 or
+    None turns pacing off). With ``page_probe`` the page-side checks and
+    extraction are registered once per tab and run as one call per page;
+    the CDP messages per row are reported either way. ``report`` builds a
+    PDF of the rows' fields and screenshots, with an HTML index, at the end.
+    A failed row is tried up to ``row_attempts`` times and a failed list
+    page up to ``list_attempts`` times, after a jittered backoff starting at
+    ``retry_delay`` seconds that keeps its tab free for other pages; a page
+    that lands on the login form logs the run in again first. Each step of a
+    page has a time limit, overridden per step by ``step_timeouts`` (a dict
+    of retry_policy.StepTimeouts fields). Pages that fail every attempt are
+    listed in ``failures_<timestamp>.json``.
+    """
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Continue an earlier run under its own timestamp, or start a new one
+    timestamp = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    if resume and not run_id:
+        run_id = latest_run_id(output_dir) if resume == 'latest' else resume
+        if run_id:
+            timestamp = run_id
+            print(f"Resuming run {run_id}")
+        else:
+            print("No earlier run to resume, starting a new one")
+    journal = RunJournal(output_dir, timestamp)
+    if journal.resumed:
+        print(f"{len(journal.done)} row(s) already done in this run")
+    visits = VisitCache(visit_cache, visit_cache_max_age)
+    retry = RetryPolicy(row_attempts=max(1, row_attempts), list_attempts=max(1, list_attempts),
+                        base_delay=retry_delay)
+    failures = FailureLog(timestamp)
+    
+    run_trace = RunTrace(output_dir, timestamp) if trace else None
+    
+    # Crop and save screenshots in worker processes
+    pipeline = ScreenshotPipeline(workers=crop_workers, max_pending=crop_queue, trace=run_trace,
+                                  quality=image_quality).start()
     
     # Launch browser
-    print("Launching browser...")
-    browser = await launch(
-        headless=False,  # Set to True if you don't want to see the browser
-        args=['--no-sandbox', '--disable-setuid-sandbox']
-    )
+    profile = resolve_profile(launch_profile, headless, user_data_dir)
+    print(f"Launching browser ({launch_profile} profile)...")
+    launch_started = time.time()
+    launch_options = launch_arguments(profile, browser_args)
+    browser = await launch(**launch_options)
+    launched = time.time()
+    if run_trace:
+        run_trace.record('launch', launch_started, launched, profile=launch_profile)
     
+    ctx = None
     try:
         page = await browser.newPage()
+        first_navigation = asyncio.get_running_loop().create_future()
+        page.once('domcontentloaded',
+                  lambda: first_navigation.done() or first_navigation.set_result(time.time()))
         
         # Set viewport size to accommodate wide content
-        await page.setViewport({'width': 1440, 'height': 1440})
+        viewport = {'width': 1440, 'height': 1440}
+        await page.setViewport(viewport)
+        
+        # Track network and DOM activity so pages are used as soon as they settle
+        # and intercept requests so each phase only loads what it needs
+        ctx = RunContext(
+            output_dir=output_dir,
+            timestamp=timestamp,
+            readiness=ReadinessEngine(functions=PAGE_FUNCTIONS if page_probe else None),
+            pipeline=pipeline,
+            policy=resource_policy,
+            screenshots=screenshots,
+            save_html_dir=save_html_dir,
+            state=RowStateStore(state_db) if state_db and screenshots else None,
+            trace=run_trace,
+            capture_mode=capture_mode,
+            image_format=image_format,
+            image_quality=image_quality,
+            pacing=PacingController(PacingLimits(
+                floor=pace_floor, ceiling=pace_ceiling, target_latency_ms=pace_target_ms,
+                start=min(max(2.0, pace_floor), pace_ceiling),
+            )) if pace_ceiling else None,
+            cdp=CdpCounter(),
+            timeouts=StepTimeouts(**(step_timeouts or {})),
+        )
+        await ctx.setup_tab(page)
         
         # Maximize browser window to full screen
-        await page.evaluate('''() => {
-            window.moveTo(0, 0);
-            window.resizeTo(screen.width, screen.height);
-        }''')
+        if profile.maximize:
+            await page.evaluate('''() => {
+                window.moveTo(0, 0);
+                window.resizeTo(screen.width, screen.height);
+            }''')
         
         # LOGIN PROCESS
-        print(f"Navigating to login page: {login_url}...")
-        await page.goto(login_url, {'waitUntil': 'networkidle0'})
-        print("Login page loaded")
-        
-        # Step 1: Enter email
-        print("Step 1: Entering email...")
-        await page.waitForSelector('input[type="email"], input[name*="email"], input[placeholder*="email"]')
-        await page.type('input[type="email"], input[name*="email"], input[placeholder*="email"]', credentials['username'])
-        print(f"Email entered: {credentials['username']}")
-        
-        # Click continue/lanjutkan button
-        print("Clicking continue button...")
-        # Try different selectors for the continue button
-        continue_clicked = False
-        try:
-            # Try to find button with text "Lanjutkan"
-            await page.click('button[type="submit"], input[type="submit"], .btn-primary, button.btn')
-            continue_clicked = True
-            print("Clicked continue button")
-        except:
-            try:
-                # Alternative: find button by text content using XPath-like approach
-                await page.evaluate('''() => {
-                    const buttons = Array.from(document.querySelectorAll('button'));
-                    const lanjutkanBtn = buttons.find(btn => 
-                        btn.textContent.includes('Lanjutkan') || 
-                        btn.textContent.includes('Continue') ||
-                        btn.textContent.includes('lanjutkan')
-                    );
-                    if (lanjutkanBtn) {
-                        lanjutkanBtn.click();
-                        return true;
-                    }
-                    return false;
-                }''')
-                continue_clicked = True
-                print("Clicked continue button via text content")
-            except Exception as e:
-                print(f"Could not find continue button: {e}")
+        async with ctx.phase('login', page):
+            if not await sign_in(page, login_url, session_file):
                 return None
         
-        if not continue_clicked:
-            print("Warning: Continue button not found, trying to proceed anyway...")
-            # Try pressing Enter as fallback
-            await page.keyboard.press('Enter')
+        if first_navigation.done():
+            print(f"🚀 {launch_profile} profile: browser up in {launched - launch_started:.2f} s, "
+                  f"first navigation after {first_navigation.result() - launch_started:.2f} s")
+            if run_trace:
+                run_trace.record('first_navigation', launch_started, first_navigation.result(),
+                                 profile=launch_profile)
         
-        # Wait for password page to load
-        print("Waiting for password page...")
-        await page.waitForNavigation({'waitUntil': 'networkidle0'})
-        print("Password page loaded")
+        if extract_mode == 'http':
+            ctx.http = await HttpExtractor(concurrency=max(4, 2 * concurrency),
+                                           save_html_dir=save_html_dir).start(page)
         
-        # Step 2: Enter password
-        print("Step 2: Entering password...")
-        await page.waitForSelector('input[type="password"]')
-        await page.type('input[type="password"]', credentials['password'])
-        print("Password entered")
+        # VISIT EACH URL AND TAKE SCREENSHOTS
+        guard = None
+        if max_tab_heap_mb or max_tab_navigations or max_browser_rss_mb:
+            guard = MemoryGuard(MemoryLimits(max_heap_mb=max_tab_heap_mb or None,
+                                             max_navigations=max_tab_navigations or None,
+                                             max_browser_rss_mb=max_browser_rss_mb or None))
         
-        # Click login button
-        print("Clicking login button...")
-        login_clicked = False
-        try:
-            # Try common login button selectors
-            await page.click('button[type="submit"], input[type="submit"], .btn-primary, button.btn')
-            login_clicked = True
-            print("Clicked login button")
-        except:
-            try:
-                # Alternative: find button by text content
-                await page.evaluate('''() => {
-                    const buttons = Array.from(document.querySelectorAll('button'));
-                    const loginBtn = buttons.find(btn => 
-                        btn.textContent.includes('Login') || 
-                        btn.textContent.includes('Masuk') ||
-                        btn.textContent.includes('login') ||
-                        btn.textContent.includes('masuk')
-                    );
-                    if (loginBtn) {
-                        loginBtn.click();
-                        return true;
-                    }
-                    return false;
-                }''')
-                login_clicked = True
-                print("Clicked login button via text content")
-            except Exception as e:
-                print(f"Could not find login button: {e}")
-                # Try pressing Enter as fallback
-                await page.keyboard.press('Enter')
-                login_clicked = True
-                print("Pressed Enter as fallback")
-        
-        if not login_clicked:
-            print("Warning: Login button not found, trying Enter key...")
-            await page.keyboard.press('Enter')
+        async def relaunch(old_page):
+            nonlocal browser
+            browser, new_page = await restart_browser(browser, old_page, login_url, session_file,
+                                                      **launch_options)
+            return browser, new_page
         
-        # Wait for login to complete
-        print("Waiting for login to complete...")
-        await page.waitForNavigation({'waitUntil': 'networkidle0'})
-        print("Login completed successfully!")
+        pool = TabPool(browser, concurrency, viewport, first_page=page, setup_tab=ctx.setup_tab,
+                       guard=guard, relaunch=relaunch)
         
-        # VISIT EACH URL AND TAKE SCREENSHOTS
-        screenshot_files = []
-        all_form_data = []
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        login_lock = asyncio.Lock()
         
-        for i, url in enumerate(urls_list, 1):
-            print(f"\n--- Visiting URL {i}/{len(urls_list)}: {url} ---")
-            
-            # Navigate with multiple wait conditions
-            await page.goto(url, {'waitUntil': 'networkidle0'})
-            print("Initial page load complete")
-            
-            # Wait for page to be fully interactive
-            await page.waitForFunction('document.readyState === "complete"')
-            print("Page fully loaded")
-            
-            # No CSS injection - keep pages as-is
-            
-            # Additional wait for any dynamic content
-            await asyncio.sleep(5)
-            print("Waiting for dynamic content to load...")
-            
-            # Wait for any images to load
-            await page.waitForFunction('''() => {
-                const images = Array.from(document.images);
-                return images.every(img => img.complete);
-            }''', {'timeout': 10000})
-            print("All images loaded")
-            
-            # Scroll to load all content with better waiting
-            print("Scrolling to load all content...")
-            await page.evaluate('''() => {
-                return new Promise((resolve) => {
-                    let totalHeight = 0;
-                    const distance = 100;
-                    let stableCount = 0;
-                    let lastHeight = 0;
-                    
-                    const timer = setInterval(() => {
-                        const scrollHeight = document.body.scrollHeight;
-                        window.scrollBy(0, distance);
-                        totalHeight += distance;
-                        
-                        // Check if height is stable (no new content loading)
-                        if (scrollHeight === lastHeight) {
-                            stableCount++;
-                        } else {
-                            stableCount = 0;
-                            lastHeight = scrollHeight;
-                        }
-                        
-                        // If height is stable for 3 iterations and we've scrolled enough
-                        if (stableCount >= 3 && totalHeight >= scrollHeight) {
-                            clearInterval(timer);
-                            window.scrollTo(0, 0);
-                            // Additional wait for any lazy-loaded content
-                            setTimeout(resolve, 2000);
-                        }
-                    }, 200);
-                });
-            }''')
-            print("Scrolling complete, waiting for final content...")
-            
-            # Final wait for any remaining dynamic content
-            await asyncio.sleep(3)
-            
-            # Find all "Isi" links with the specific structure
-            print("Finding all 'Isi' links...")
-            isi_links = await page.evaluate('''() => {
-                const links = [];
-                
-                // Find all links with "Isi" text and href containing "input"
-                const isiElements = document.querySelectorAll('a.btn.btn-primary');
-                isiElements.forEach(link => {
-                    if (link.textContent.includes('Isi') && link.href.includes('input')) {
-                        links.push(link.href);
-                    }
-                });
-                
-                return links;
-            }''')
-            
-            print(f"Found {len(isi_links)} 'isi' links: {isi_links}")
-            
-            # Navigate to links at index 4-7 (rows 5-8)
-            for idx in range(4, min(8, len(isi_links))):
-                if idx < len(isi_links):
-                    link = isi_links[idx]
-                    print(f"Navigating to link {idx + 1}: {link}")
-                    
-                    # Navigate directly to the URL
-                    await page.goto(link, {'waitUntil': 'networkidle0'})
-                    
-                    # Wait for page to load
-                    await page.waitForFunction('document.readyState === "complete"')
-                    await asyncio.sleep(2)
-                    
-                    # Extract form data and course info
-                    print("Extracting form data and course information...")
-                    form_data = await page.evaluate('''() => {
-                        const data = {};
-                        
-                        // Get course information from the page header
-                        const courseInfo = {};
-                        
-                        // Find all rows with course information
-                        const infoRows = document.querySelectorAll('.row.border-gray-300');
-                        infoRows.forEach(row => {
-                            const labels = row.querySelectorAll('label');
-                            const values = row.querySelectorAll('.fw-bold');
-                            
-                            labels.forEach((label, index) => {
-                                const labelText = label.textContent.trim();
-                                const valueDiv = values[index];
-                                if (valueDiv) {
-                                    let valueText = valueDiv.textContent.trim();
-                                    
-                                    // Clean up the text (remove extra whitespace, newlines)
-                                    valueText = valueText.replace(/\\s+/g, ' ').trim();
-                                    
-                                    if (labelText === 'Program Studi') {
-                                        courseInfo.program_studi = valueText;
-                                    } else if (labelText === 'Semester') {
-                                        courseInfo.semester = valueText;
-                                    } else if (labelText === 'Mata Kuliah') {
-                                        courseInfo.mata_kuliah = valueText;
-                                    } else if (labelText === 'Dosen Pengampu') {
-                                        courseInfo.dosen_pengampu = valueText;
-                                    } else if (labelText === 'Kelas') {
-                                        courseInfo.kelas = valueText;
-                                    }
-                                }
-                            });
-                        });
-                        
-                        data.course_info = courseInfo;
-                        
-                        // Get form action URL
-                        const form = document.querySelector('form');
-                        if (form) {
-                            data.form_action = form.action;
-                        }
-                        
-                        // Get CSRF token
-                        const token = document.querySelector('input[name="_token"]');
-                        if (token) {
-                            data.csrf_token = token.value;
-                        }
-                        
-                        // Get selected dosen option
-                        const selectedOption = document.querySelector('input[name="dosenOption"]:checked');
-                        if (selectedOption) {
-                            data.dosen_option = selectedOption.value;
-                        }
-                        
-                        // Get dosen hadir (present lecturer)
-                        const dosenHadir = document.querySelector('#selectDosenHadir');
-                        if (dosenHadir) {
-                            data.dosen_hadir = {
-                                value: dosenHadir.value,
-                                text: dosenHadir.options[dosenHadir.selectedIndex]?.text || ''
-                            };
-                        }
-                        
-                        // Get dosen pengganti asing (foreign substitute)
-                        const dosenPenggantiAsing = document.querySelector('#inputDosenPenggantiAsing');
-                        if (dosenPenggantiAsing) {
-                            data.dosen_pengganti_asing = dosenPenggantiAsing.value;
-                        }
-                        
-                        // Get asal instansi (institution origin)
-                        const asalInstansi = document.querySelector('#inputInstansiAsal');
-                        if (asalInstansi) {
-                            data.asal_instansi = asalInstansi.value;
-                        }
-                        
-                        // Get tanggal rencana (planned date)
-                        const tanggalRencana = document.querySelector('#inputTanggalRencana');
-                        if (tanggalRencana) {
-                            data.tanggal_rencana = tanggalRencana.value;
-                        }
-                        
-                        // Get tanggal terlaksana (actual date)
-                        const tanggalTerlaksana = document.querySelector('input[name="inputTanggalTerlaksana"]');
-                        if (tanggalTerlaksana) {
-                            data.tanggal_terlaksana = tanggalTerlaksana.value;
-                        }
-                        
-                        // Get tema (theme)
-                        const tema = document.querySelector('#inputTema');
-                        if (tema) {
-                            data.tema = tema.value;
-                        }
-                        
-                        // Get pokok bahasan (topic of discussion)
-                        const pokokBahasan = document.querySelector('#exampleFormControlTextarea1');
-                        if (pokokBahasan) {
-                            data.pokok_bahasan = pokokBahasan.value;
-                        }
-                        
-                        // Get current URL
-                        data.current_url = window.location.href;
-                        
-                        // Get page title
-                        data.page_title = document.title;
-                        
-                        return data;
-                    }''')
-                    
-                    # Add row info to form data
-                    form_data['url_index'] = i
-                    form_data['row_number'] = idx + 1
-                    form_data['original_url'] = url
-                    
-                    # Add to combined data array
-                    all_form_data.append(form_data)
-                    
-                    print(f"Form data collected for row {idx + 1}")
-                    print(f"Form data: {json.dumps(form_data, indent=2, ensure_ascii=False)}")
-                    
-                    # Take screenshot of this page
-                    filename = f"url_{i:02d}_row_{idx+1}_{timestamp}.png"
-                    filepath = os.path.join(output_dir, filename)
-                    
-                    await page.screenshot({
-                        'path': filepath,
-                        'fullPage': True,
-                        'quality': 90,
-                        'type': 'png'
-                    })
-                    
-                    # Auto crop the screenshot
-                    cropped_path = auto_crop_image(filepath)
-                    screenshot_files.append(cropped_path)
-                    print(f"Screenshot saved: {filename}")
-                    
-                    # No need to go back - just continue to next link
-            
-            # Skip the original screenshot since we're taking individual ones
-            continue
-            
-            # Take full page screenshot
-            filename = f"url_{i:02d}_{timestamp}.png"
-            filepath = os.path.join(output_dir, filename)
-            
-            # Get page height for reference (but don't modify width)
-            page_height = await page.evaluate('''() => {
-                return Math.max(document.body.scrollHeight, document.body.offsetHeight, 
-                               document.documentElement.clientHeight, document.documentElement.scrollHeight, 
-                               document.documentElement.offsetHeight);
-            }''')
+        async def revalidate_session(page, seen_logins):
+            # Log in again once for all the pages that found the session expired;
+            # HTTP rows have no tab and log in on a spare one, opened only here
+            async with login_lock:
+                if failures.relogins != seen_logins:
+                    return
+                spare = None if page else await pool.browser.newPage()
+                try:
+                    await log_in_again(page or spare, login_url, ctx, session_file,
+                                       max(4, 2 * concurrency), save_html_dir)
+                finally:
+                    if spare:
+                        await spare.close()
+                failures.relogins += 1
+        
+        async def next_attempt(kind, key, error, attempt, page, seen_logins):
+            # Seconds until a failed page is tried again, None once it is out of attempts
+            failures.failed_attempts += 1
+            attempts = retry.attempts(kind)
+            if attempt >= attempts:
+                return None
+            delay = retry.backoff(attempt)
+            if isinstance(error, SessionExpiredError):
+                try:
+                    await revalidate_session(page, seen_logins)
+                except Exception as e:
+                    print(f"❌ Could not log in again: {e}")
+                    return None
+                delay = 0
+            print(f"🔁 {kind.capitalize()} {key} failed ({error}), attempt {attempt + 1}/{attempts} "
+                  f"in {delay:.1f} s")
+            return delay
+        
+        # Rows read over HTTP do not need a tab and run next to the pool
+        http_rows = {}
+        
+        # Tab seconds per list URL, used to balance the shards of later runs
+        url_costs = {}
+        
+        def add_cost(url, started):
+            url_costs[url] = url_costs.get(url, 0.0) + time.monotonic() - started
+        
+        def record_row(i, url, row_number, form_data, cropped_path, visit):
+            # The row is in the JSONL file now, checkpointed once its screenshot is saved
+            journal.add_row(form_data)
+            if cropped_path is None:
+                journal.complete_row(url, row_number, i)
+                visits.resolve(visit, form_data)
+                return
             
-            # Get current viewport width
-            viewport = page.viewport
-            print(f"Page height: {page_height}px, Viewport width: {viewport['width']}px")
+            def saved(future):
+                if future.cancelled() or future.exception():
+                    print(f"❌ Screenshot for row {(i, row_number)} failed: {future.exception()}")
+                    visits.resolve(visit, form_data)
+                    return
+                journal.complete_row(url, row_number, i, future.result())
+                visits.resolve(visit, form_data, future.result())
+            cropped_path.add_done_callback(saved)
+        
+        def row_job(i, url, idx, link, visit):
+            key = (i, idx + 1)
+            attempt = 0
             
-            # Take screenshot with full page height and width
-            await page.screenshot({
-                'path': filepath,
-                'fullPage': True,
-                'clip': None,  # Ensure we capture the full content area
-                'quality': 90,  # High quality for better readability
-                'type': 'png'   # PNG for better text clarity
-            })
+            async def job(tab):
+                nonlocal attempt
+                attempt += 1
+                seen_logins = failures.relogins
+                started = time.monotonic()
+                try:
+                    with ctx.cdp.row(tab):
+                        result = await capture_row(tab, link, i, idx + 1, url, ctx)
+                except Exception as e:
+                    delay = await next_attempt('row', key, e, attempt, tab, seen_logins)
+                    if delay is None:
+                        failures.add_dead_letter('row', i, url, e, attempt, idx + 1, link)
+                        visits.fail(visit)
+                        raise
+                    # The tab serves other pages while this one waits
+                    pool.submit_later(delay, TabPool.ROW_PRIORITY, key, job)
+                    return
+                failures.recovered += attempt > 1
+                record_row(i, url, idx + 1, *result, visit)
+                add_cost(url, started)
+            return job
+        
+        async def http_row(i, url, idx, link, visit):
+            attempt = 0
+            while True:
+                attempt += 1
+                seen_logins = failures.relogins
+                started = time.monotonic()
+                try:
+                    result = await fetch_row(link, i, idx + 1, url, ctx)
+                    break
+                except Exception as e:
+                    delay = await next_attempt('row', (i, idx + 1), e, attempt, None, seen_logins)
+                    if delay is None:
+                        failures.add_dead_letter('row', i, url, e, attempt, idx + 1, link)
+                        visits.fail(visit)
+                        raise
+                    await asyncio.sleep(delay)
+            failures.recovered += attempt > 1
+            record_row(i, url, idx + 1, *result, visit)
+            add_cost(url, started)
+        
+        def reuse_visit(i, url, idx, visit):
+            # Reference the earlier row in its record instead of visiting the page again
+            def done(visit):
+                if visit.state == 'failed':
+                    visit_row(i, url, idx, visit.url)
+                    return
+                visit.record.setdefault('references', []).append(
+                    {'url_index': i, 'row_number': idx + 1, 'original_url': url})
+                journal.add_row(visit.record)
+                journal.complete_row(url, idx + 1, i, visit.screenshot)
+            print(f"Row {idx + 1} of URL {i} links a page already visited, reusing it")
+            visit.then(done)
+        
+        def visit_row(i, url, idx, link):
+            visit, first = visits.claim(link)
+            if not first:
+                reuse_visit(i, url, idx, visit)
+                return
+            if visit.stored:
+                form_data, screenshot, visited_at = visit.stored
+                if screenshot or not ctx.screenshots:
+                    print(f"Row {idx + 1} of URL {i} was visited at {visited_at}, reusing it")
+                    form_data.pop('references', None)
+                    form_data = add_row_info(dict(form_data, cached_visit=visited_at), i, idx + 1, url)
+                    journal.add_row(form_data)
+                    journal.complete_row(url, idx + 1, i, screenshot)
+                    visits.resolve_stored(visit, form_data, screenshot)
+                    return
+            if ctx.http and not ctx.screenshots:
+                http_rows[(i, idx + 1)] = asyncio.ensure_future(http_row(i, url, idx, link, visit))
+                return
+            pool.submit(TabPool.ROW_PRIORITY, (i, idx + 1), row_job(i, url, idx, link, visit))
+        
+        # Progress over this process's URLs; a shard's indexes are those of the full list
+        lists_started = 0
+        
+        def progress(i):
+            nonlocal lists_started
+            lists_started += 1
+            position = f"{lists_started}/{total}"
+            return f"{position}, #{i} of the full list" if url_indexes else position
+        
+        def list_job(i, url):
+            attempt = 0
             
-            screenshot_files.append(filepath)
-            print(f"Full page screenshot saved: {filename}")
+            async def job(tab):
+                nonlocal attempt
+                if journal.list_done(url):
+                    print(f"\n--- Skipping URL {progress(i)}, all rows done: {url} ---")
+                    return None
+                attempt += 1
+                if attempt == 1:
+                    print(f"\n--- Visiting URL {progress(i)}: {url} ---")
+                else:
+                    print(f"\n--- Visiting URL {i} again (attempt {attempt}): {url} ---")
+                seen_logins = failures.relogins
+                started = time.monotonic()
+                try:
+                    isi_links = await collect_isi_links(tab, url, ctx)
+                except Exception as e:
+                    delay = await next_attempt('list', (i, 0), e, attempt, tab, seen_logins)
+                    if delay is None:
+                        failures.add_dead_letter('list', i, url, e, attempt)
+                        raise
+                    pool.submit_later(delay, TabPool.LIST_PRIORITY, (i, 0), job)
+                    return None
+                failures.recovered += attempt > 1
+                add_cost(url, started)
+                row_indexes = range(ISI_ROW_START, min(ISI_ROW_END, len(isi_links)))
+                journal.add_list(url, [idx + 1 for idx in row_indexes])
+                for idx in row_indexes:
+                    if journal.is_done(url, idx + 1):
+                        print(f"Row {idx + 1} of URL {i} already done, skipping")
+                        continue
+                    visit_row(i, url, idx, isi_links[idx])
+                return isi_links
+            return job
+        
+        indexes = url_indexes or range(1, len(urls_list) + 1)
+        total = len(indexes)
+        for i, url in zip(indexes, urls_list):
+            pool.submit(TabPool.LIST_PRIORITY, (i, 0), list_job(i, url))
+        
+        print(f"Visiting {len(urls_list)} URLs with {pool.concurrency} tab(s)...")
+        await pool.run()
+        # A failed row can queue the rows that were waiting on it
+        while http_rows:
+            key = next(iter(http_rows))
+            try:
+                await http_rows.pop(key)
+            except Exception as e:
+                print(f"❌ Job {key} failed: {e}")
+                pool.failures.append({'key': key, 'error': str(e)})
+        
+        # Every checkpoint is written once the last screenshots are saved
+        await pipeline.drain()
+        screenshot_files = journal.screenshot_files()
+        update_costs(os.path.join(output_dir, COSTS_FILE), url_costs)
         
-        # Save combined JSON data
-        if all_form_data:
+        # Save combined JSON data, in url_index/row_number order
+        if os.path.getsize(journal.records_path):
             combined_json_filename = f"combined_form_data_{timestamp}.json"
             combined_json_filepath = os.path.join(output_dir, combined_json_filename)
-            
-            with open(combined_json_filepath, 'w', encoding='utf-8') as f:
-                json.dump(all_form_data, f, indent=2, ensure_ascii=False)
+            entries = journal.write_combined(combined_json_filepath)
             
             print(f"\n📄 Combined JSON data saved: {combined_json_filename}")
-            print(f"📊 Total form data entries: {len(all_form_data)}")
+            print(f"📊 Total form data entries: {entries}")
+            
+            if report:
+                from run_report import build_report
+                pdf_path, _, _ = await asyncio.get_running_loop().run_in_executor(
+                    None, build_report, output_dir, timestamp)
+                print(f"📑 Report saved: {os.path.basename(pdf_path)}")
+        
+        # Failed attempts and dead letters, next to the combined JSON
+        if not failures.empty:
+            failures_path = failures.write(os.path.join(output_dir, failures_file(timestamp)))
+            print(f"🩹 Retries: {failures.failed_attempts} failed attempt(s), {failures.recovered} page(s) "
+                  f"recovered, {failures.relogins} new login(s), {len(failures.dead_letters)} dead letter(s) "
+                  f"in {os.path.basename(failures_path)}")
+        
+        print("\n⏱️ Page readiness waits:")
+        for profile_name, stats in ctx.readiness.summary().items():
+            print(f"   {profile_name}: {stats['count']} pages, mean {stats['mean_ms']} ms, "
+                  f"max {stats['max_ms']} ms, {stats['timeouts']} timed out")
+        
+        if ctx.policy:
+            print(f"🚫 Resource policy: {ctx.policy.summary()}")
+        
+        cdp_per_row = ctx.cdp.per_row()
+        if cdp_per_row:
+            scripts = 'page probe' if ctx.readiness.probing else 'separate scripts'
+            print(f"📡 CDP per row ({scripts}): {cdp_per_row['sent']} commands sent "
+                  f"({cdp_per_row['sent_kib']} KiB), {cdp_per_row['received']} messages received")
+        
+        if ctx.pacing:
+            for host, stats in ctx.pacing.summary().items():
+                print(f"🚦 Pacing {host}: {stats['navigations']} navigations, ended at {stats['rate']} nav/s "
+                      f"after {stats['changes']} change(s), {stats['waited_s']} s spent waiting")
+        
+        if pool.failures:
+            print(f"\n⚠️ {len(pool.failures)} page(s) failed and were skipped")
+        
+        if guard and (guard.restarts or any(guard.recycled.values())):
+            print(f"🧠 Memory guard: {guard.summary()}")
+        
+        if pipeline.stalls:
+            print(f"🐢 Screenshot pipeline was full {pipeline.stalls} time(s), "
+                  f"tabs waited {pipeline.stall_seconds:.1f} s for the croppers")
+        
+        if ctx.http:
+            print(f"🌐 {ctx.http.fetched} page(s) read over HTTP")
+        
+        if ctx.state:
+            print(f"🔁 Incremental rows: {ctx.state.summary()}")
+        
+        if visits.hits or visits.stored_hits:
+            print(f"♻️ Visit cache: {visits.summary()}")
+        
+        if run_trace:
+            print(f"\n📈 Phase timings (trace: {os.path.basename(run_trace.write_chrome_trace())}):")
+            for phase_name, stats in run_trace.summary().items():
+                print(f"   {phase_name}: {stats['count']} x, p50 {stats['p50_ms']} ms, "
+                      f"p95 {stats['p95_ms']} ms, total {stats['total_s']} s")
         
         print(f"\n✅ Completed! {len(screenshot_files)} screenshots taken.")
         return screenshot_files
@@ -510,12 +1310,244 @@ async def login_and_visit_urls(login_url, urls_list, output_dir="screenshots"):
         print(f"Error occurred: {e}")
         return None
         
+    finally:
+        if ctx and ctx.http:
+            await ctx.http.close()
+        await browser.close()
+        await pipeline.close()
+        if ctx and ctx.state:
+            ctx.state.close()
+        if run_trace:
+            run_trace.close()
+        visits.close()
+        journal.close()
+
+
+async def run_parity(fixtures_dir, expected=False):
+    """Check that the HTTP extractor reads saved pages like the page script
+
+    With ``expected`` the parser is compared with the page script's values
+    recorded in the directory's expected.json, without a browser.
+    """
+    if expected:
+        fixture_paths, differences = check_expected(fixtures_dir)
+        return report_parity(fixture_paths, differences)
+    
+    fixture_paths = sorted(
+        os.path.join(fixtures_dir, name) for name in os.listdir(fixtures_dir) if name.endswith('.html')
+    )
+    if not fixture_paths:
+        print(f"❌ No .html fixtures in {fixtures_dir}")
+        return False
+    
+    browser = await launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
+    try:
+        page = await browser.newPage()
+        differences = await check_parity(page, fixture_paths, EXTRACT_FORM_DATA_JS)
     finally:
         await browser.close()
+    return report_parity(fixture_paths, differences)
+
+
+def report_parity(fixture_paths, differences):
+    for path, key, parsed, scripted in differences:
+        print(f"❌ {os.path.basename(path)} [{key}]: parser {parsed!r} != page script {scripted!r}")
+    print(f"{'✅' if not differences else '❌'} {len(fixture_paths)} fixture(s) checked, "
+          f"{len(differences)} difference(s)")
+    return not differences
+
+
+async def prepare_session(login_url, session_file, browser_args=None):
+    """Log in once and save the session, so shards can all start from it"""
+    browser = await launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'] + list(browser_args or []))
+    try:
+        return await sign_in(await browser.newPage(), login_url, session_file)
+    finally:
+        await browser.close()
+
+
+def build_resource_policy(enabled=True, policy_file=None):
+    """The per-phase resource policy selected on the command line, or None"""
+    if not enabled:
+        return None
+    return ResourcePolicy.from_file(policy_file) if policy_file else ResourcePolicy()
+
+
+async def run_shard_worker(spec_path):
+    """Run one shard of a sharded run, as described by its spec file"""
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    options = dict(spec['options'])
+    resource_policy = build_resource_policy(*options.pop('resource_policy'))
+    urls = spec['urls']
+    screenshot_files = await login_and_visit_urls(
+        spec['login_url'], [url for _, url in urls],
+        output_dir=spec['output_dir'],
+        resource_policy=resource_policy,
+        run_id=spec['run_id'],
+        url_indexes=[url_index for url_index, _ in urls],
+        **options,
+    )
+    return screenshot_files is not None
+
+
+def step_timeout(value):
+    """Parse a STEP=SECONDS time limit of the command line"""
+    step, _, seconds = value.partition('=')
+    if step not in {field.name for field in fields(StepTimeouts)}:
+        raise argparse.ArgumentTypeError(f"unknown step {step!r}")
+    try:
+        return step, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number of seconds: {seconds!r}")
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='number of tabs used to visit list pages and rows (default: 1)')
+    parser.add_argument('--session-file', default='session.json',
+                        help='where the login session is cached between runs (default: session.json)')
+    parser.add_argument('--no-session-cache', action='store_true',
+                        help='always run the full login and do not save the session')
+    parser.add_argument('--resource-policy', metavar='FILE',
+                        help='JSON file overriding the per-phase resource rules')
+    parser.add_argument('--no-resource-policy', action='store_true',
+                        help='load every resource instead of blocking the ones a phase does not need')
+    parser.add_argument('--crop-workers', type=int,
+                        help='processes cropping screenshots (default: one per core)')
+    parser.add_argument('--crop-queue', type=int,
+                        help='screenshots allowed to wait for a cropper before tabs pause '
+                             '(default: twice the crop workers)')
+    parser.add_argument('--extract', choices=['browser', 'http'], default='browser',
+                        help='read form pages with a page script or from their raw HTML (default: browser)')
+    parser.add_argument('--no-screenshots', action='store_true',
+                        help='only collect form data; with --extract http no tab opens the rows')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN',
+                        help='continue an interrupted run (default: the latest one), skipping finished rows')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip the screenshot of rows whose content has not changed since the last run')
+    parser.add_argument('--state-db', default='satu_state.sqlite3',
+                        help='row fingerprints kept for --incremental (default: satu_state.sqlite3)')
+    parser.add_argument('--visit-cache', metavar='FILE',
+                        help='keep visited row pages in this SQLite file and reuse them in later runs')
+    parser.add_argument('--visit-cache-max-age', type=float, default=24, metavar='HOURS',
+                        help='oldest visit reused from --visit-cache (default: 24)')
+    parser.add_argument('--save-html', metavar='DIR',
+                        help='save the raw HTML of every row page as a parity fixture')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='browser processes sharing the URL list, balanced by measured cost (default: 1)')
+    parser.add_argument('--shard-session', choices=['shared', 'own'], default='shared',
+                        help='shards start from one login saved up front, or each logs in itself '
+                             '(default: shared)')
+    parser.add_argument('--shard-launch-delay', type=float, default=2.0, metavar='SECONDS',
+                        help='pause between starting one shard and the next (default: 2)')
+    parser.add_argument('--shard-cpus', type=int, metavar='N',
+                        help='pin each shard and its browser to N cores of its own')
+    parser.add_argument('--shard-memory-mb', type=int, metavar='MB',
+                        help='stop a shard whose processes use more memory; finish it with --resume')
+    parser.add_argument('--capture', choices=['full', 'clip'], default='full',
+                        help='screenshot the full page and crop its pixels, or clip the capture '
+                             'to the form container measured in the page (default: full)')
+    parser.add_argument('--image-format', choices=FORMATS, default='png',
+                        help='screenshot file type (default: png)')
+    parser.add_argument('--image-quality', type=int, default=90,
+                        help='JPEG/WebP quality, 0-100 (default: 90)')
+    parser.add_argument('--max-tab-heap-mb', type=float, default=512,
+                        help='replace a tab whose JS heap grows past this (default: 512, 0: off)')
+    parser.add_argument('--max-tab-navigations', type=int, default=250,
+                        help='replace a tab after this many pages (default: 250, 0: off)')
+    parser.add_argument('--max-browser-rss-mb', type=float, default=0,
+                        help='restart the browser, keeping the session, when its processes '
+                             'use more memory than this (default: 0, off)')
+    parser.add_argument('--pace-floor', type=float, default=0.5,
+                        help='slowest navigation rate per host, per second (default: 0.5)')
+    parser.add_argument('--pace-ceiling', type=float, default=10,
+                        help='fastest navigation rate per host and browser process (default: 10)')
+    parser.add_argument('--pace-target-ms', type=float, default=2000,
+                        help='navigation time (90th percentile) above which the rate is lowered (default: 2000)')
+    parser.add_argument('--no-pacing', action='store_true',
+                        help='navigate as fast as the tabs allow')
+    parser.add_argument('--separate-scripts', action='store_true',
+                        help='settle and read pages with one CDP call per check, as before the page probe')
+    parser.add_argument('--row-attempts', type=int, default=3,
+                        help='attempts per row page before it is listed as failed (default: 3)')
+    parser.add_argument('--list-attempts', type=int, default=3,
+                        help='attempts per list page before it is listed as failed (default: 3)')
+    parser.add_argument('--retry-delay', type=float, default=1.0,
+                        help='backoff after a first failed attempt in seconds, doubled per attempt and '
+                             'jittered (default: 1)')
+    parser.add_argument('--step-timeout', type=step_timeout, action='append', default=[],
+                        metavar='STEP=SECONDS',
+                        help='time limit of a page step (navigate, settle, extract or screenshot; '
+                             'defaults: 30, 30, 20, 60 s, 0 for none), repeatable')
+    parser.add_argument('--report', action='store_true',
+                        help='build a PDF of every row\'s fields and screenshot, with an HTML index')
+    parser.add_argument('--launch-profile', choices=list(LAUNCH_PROFILES), default='window',
+                        help='browser start-up: "window" (visible, fresh profile) or "fast" (headless, '
+                             'cached profile in chromium_profile/, trimmed flags) (default: window)')
+    parser.add_argument('--user-data-dir', metavar='DIR',
+                        help='Chromium profile directory kept between runs, for any launch profile')
+    parser.add_argument('--headless', action='store_true',
+                        help='run the browser without a window')
+    parser.add_argument('--trace', action='store_true',
+                        help='time every phase into trace_<run>.jsonl and a Chrome trace-event file')
+    parser.add_argument('--browser-arg', action='append', default=[], metavar='FLAG',
+                        help='extra Chromium command line flag, may be repeated')
+    
+    subcommands = parser.add_subparsers(dest='command')
+    recrop = subcommands.add_parser('recrop', help='re-crop the screenshots of a directory on all cores')
+    recrop.add_argument('directory', nargs='?', default='screenshots',
+                        help='directory holding the original screenshots (default: screenshots)')
+    recrop.add_argument('--workers', type=int, help='processes to use (default: one per core)')
+    recrop.add_argument('--keep-sidebar', action='store_true',
+                        help='do not cut a navigation sidebar off the left edge')
+    parity = subcommands.add_parser('parity', help='compare the HTTP extractor with the page script '
+                                                   'on saved HTML fixtures')
+    parity.add_argument('directory', help='directory of pages saved with --save-html')
+    parity.add_argument('--expected', action='store_true',
+                        help='compare with the page script values in the directory\'s expected.json '
+                             'instead of a browser (e.g. fixtures/http_extract)')
+    report = subcommands.add_parser('report', help='build the PDF and HTML report of a run')
+    report.add_argument('run', nargs='?', default='latest',
+                        help='run timestamp, or "latest" (default)')
+    report.add_argument('--directory', default='screenshots',
+                        help='output directory of the run (default: screenshots)')
+    report.add_argument('--dpi', type=int, default=110,
+                        help='resolution of the screenshots in the PDF (default: 110)')
+    report.add_argument('--quality', type=int, default=80,
+                        help='JPEG quality of the screenshots (default: 80)')
+    shard_worker = subcommands.add_parser('shard-worker')
+    shard_worker.add_argument('spec', help='shard spec written by the --shards run')
+    return parser.parse_args(argv)
 
 
 async def main():
     """Main function"""
+    args = parse_args()
+    if args.command == 'recrop':
+        from image_crop import recrop_directory
+        recrop_directory(args.directory, args.workers, remove_sidebar=not args.keep_sidebar)
+        return
+    if args.command == 'parity':
+        if not await run_parity(args.directory, args.expected):
+            sys.exit(1)
+        return
+    if args.command == 'report':
+        from run_report import build_report
+        run_id = latest_run_id(args.directory) if args.run == 'latest' else args.run
+        if not run_id:
+            print(f"❌ No run found in {args.directory}")
+            return
+        pdf_path, html_path, rows = build_report(args.directory, run_id, args.dpi, args.quality)
+        print(f"📑 {rows} row(s) written to {pdf_path} and {html_path}")
+        return
+    if args.command == 'shard-worker':
+        if not await run_shard_worker(args.spec):
+            sys.exit(1)
+        return
+    
     login_url = "https://satu.unri.ac.id"
     urls_list = load_urls()
     
@@ -527,9 +1559,66 @@ async def main():
     for i, url in enumerate(urls_list, 1):
         print(f"   {i}. {url}")
     
-    screenshot_files = await login_and_visit_urls(login_url, urls_list)
+    options = dict(
+        concurrency=args.concurrency,
+        session_file=None if args.no_session_cache else args.session_file,
+        crop_workers=args.crop_workers,
+        crop_queue=args.crop_queue,
+        extract_mode=args.extract,
+        screenshots=not args.no_screenshots,
+        save_html_dir=args.save_html,
+        state_db=args.state_db if args.incremental else None,
+        browser_args=args.browser_arg,
+        trace=args.trace,
+        headless=args.headless,
+        launch_profile=args.launch_profile,
+        user_data_dir=args.user_data_dir,
+        capture_mode=args.capture,
+        image_format=args.image_format,
+        image_quality=args.image_quality,
+        max_tab_heap_mb=args.max_tab_heap_mb,
+        max_tab_navigations=args.max_tab_navigations,
+        max_browser_rss_mb=args.max_browser_rss_mb,
+        visit_cache=args.visit_cache,
+        visit_cache_max_age=args.visit_cache_max_age,
+        pace_floor=args.pace_floor,
+        pace_ceiling=0 if args.no_pacing else args.pace_ceiling,
+        pace_target_ms=args.pace_target_ms,
+        page_probe=not args.separate_scripts,
+        row_attempts=args.row_attempts,
+        list_attempts=args.list_attempts,
+        retry_delay=args.retry_delay,
+        step_timeouts=dict(args.step_timeout),
+    )
+    policy_setting = (not args.no_resource_policy, args.resource_policy)
+    
+    if args.shards > 1:
+        session_mode = args.shard_session if options['session_file'] else 'own'
+        if session_mode == 'shared':
+            print("Preparing the shared session...")
+            if not await prepare_session(login_url, options['session_file'], args.browser_arg):
+                print("❌ Failed to complete automation")
+                return
+        screenshot_files = await run_sharded(
+            os.path.abspath(__file__), login_url, urls_list, "screenshots", args.shards,
+            dict(options, resource_policy=policy_setting),
+            resume=args.resume,
+            session_mode=session_mode,
+            launch_delay=args.shard_launch_delay,
+            cpus_per_shard=args.shard_cpus,
+            memory_limit_mb=args.shard_memory_mb,
+            report=args.report,
+        )
+    else:
+        screenshot_files = await login_and_visit_urls(
+            login_url, urls_list,
+            resource_policy=build_resource_policy(*policy_setting),
+            resume=args.resume,
+            report=args.report,
+            **options,
+        )
     
-    if screenshot_files:
+    if screenshot_files is not None:
         print("\n✅ Automation completed successfully!")
         print(f"📸 Screenshots taken:")
         for file in screenshot_files:
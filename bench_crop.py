@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the screenshot auto-crop kernels
+
+Compares the original full-array crop (np.mean over the whole image) with
+image_crop.find_content_box on large synthetic full-page captures. Each run
+happens in a fresh process; the reported peak RSS is how far the process
+grew above its size once the decoded image was in memory.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_crop import find_content_box
+
+# (width, height, mode) of the generated screenshots
+DEFAULT_SIZES = [
+    (1440, 5000, 'RGB'),
+    (1440, 20000, 'RGB'),
+    (1440, 40000, 'RGB'),
+    (1440, 20000, 'RGBA'),
+    (1440, 20000, 'P'),
+]
+
+
+def legacy_find_content_box(img, threshold=240, padding=20):
+    """The crop box exactly as the original auto_crop_image computed it"""
+    img_array = np.array(img)
+    gray = np.mean(img_array, axis=2)
+    non_white = gray < threshold
+    rows = np.any(non_white, axis=1)
+    cols = np.any(non_white, axis=0)
+    if not np.any(rows) or not np.any(cols):
+        return None
+    top, bottom = np.where(rows)[0][[0, -1]]
+    left, right = np.where(cols)[0][[0, -1]]
+    return (max(0, left - padding), max(0, top - padding),
+            min(img.width, right + padding), min(img.height, bottom + padding))
+
+
+KERNELS = {
+    'legacy': legacy_find_content_box,
+    'strips': find_content_box,
+}
+
+
+def make_screenshot(path, width, height, mode):
+    """Write a page-like capture: dark sidebar, white page, blocks of content"""
+    rng = np.random.default_rng(height)
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    pixels[:, :260] = (30, 30, 45)
+    for top in range(200, height - 400, 350):
+        left = int(rng.integers(320, 500))
+        pixels[top:top + 250, left:left + int(rng.integers(400, 900))] = rng.integers(0, 200, 3)
+    img = Image.fromarray(pixels)
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.ADAPTIVE)
+    img.save(path, 'PNG')
+
+
+def _proc_status_kib(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Forget the peak RSS reached so far (Linux only), e.g. while decoding"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kib():
+    peak = _proc_status_kib('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _current_rss_kib():
+    current = _proc_status_kib('VmRSS')
+    # Without procfs the peak so far is the best available baseline
+    return current if current is not None else _peak_rss_kib()
+
+
+def _run_kernel(kernel_name, path, results):
+    img = Image.open(path)
+    img.load()
+    _reset_peak_rss()
+    before = _current_rss_kib()
+    started = time.perf_counter()
+    try:
+        box = KERNELS[kernel_name](img)
+        error = None
+    except Exception as e:
+        box, error = None, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+    results.put({
+        'seconds': elapsed,
+        'peak_rss_mib': (_peak_rss_kib() - before) / 1024,
+        'box': tuple(int(v) for v in box) if box else None,
+        'error': error,
+    })
+
+
+def measure(kernel_name, path):
+    """Run one kernel on one image in a fresh process"""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_kernel, args=(kernel_name, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('images', nargs='*',
+                        help='screenshots to benchmark (default: generated captures)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per kernel and image (default: 3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = args.images
+        if not images:
+            print("Generating synthetic screenshots...")
+            images = []
+            for width, height, mode in DEFAULT_SIZES:
+                path = os.path.join(tmp, f"capture_{width}x{height}_{mode}.png")
+                make_screenshot(path, width, height, mode)
+                images.append(path)
+
+        print(f"\n{'image':<34} {'kernel':<8} {'time (s)':>10} {'peak RSS (MiB)':>16}  box")
+        for path in images:
+            for kernel_name in KERNELS:
+                runs = [measure(kernel_name, path) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r['seconds'])
+                peak = max(r['peak_rss_mib'] for r in runs)
+                box = best['error'] or best['box']
+                print(f"{os.path.basename(path):<34} {kernel_name:<8} "
+                      f"{best['seconds']:>10.3f} {peak:>16.1f}  {box}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark against the local SATU stand-in
+
+Starts fixture_server in the background and runs the whole pipeline (login,
+list pages, rows, screenshots) once per mode, each in a fresh process with
+its own working directory. Reported per mode: rows per minute, time from
+start to the first row in the JSONL output, the peak memory of the
+process tree (Python, Chromium and the croppers), and the CDP commands sent
+and messages received per row, as the run prints them at the end. Each
+run's log is kept in its working directory (see --keep).
+
+New modes are added to MODES as keyword arguments of login_and_visit_urls.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from fixture_server import add_config_arguments, config_from_args, list_urls, start_server
+from process_memory import process_tree_rss_mb
+
+MODES = {
+    'browser': {'concurrency': 1},
+    'tabs-4': {'concurrency': 4},
+    'separate-scripts': {'concurrency': 4, 'page_probe': False},
+    'fast-start': {'concurrency': 4, 'launch_profile': 'fast'},
+    'http-extract': {'concurrency': 4, 'extract_mode': 'http'},
+    'clip-jpeg': {'concurrency': 4, 'capture_mode': 'clip', 'image_format': 'jpeg'},
+    'data-only': {'concurrency': 4, 'extract_mode': 'http', 'screenshots': False},
+}
+
+CDP_PER_ROW = re.compile(r'CDP per row \([^)]*\): ([\d.]+) commands sent \(([\d.]+) KiB\), '
+                         r'([\d.]+) messages received')
+
+
+def _run_mode(login_url, urls, options, workdir):
+    os.chdir(workdir)
+    sys.stdout = open('run.log', 'w', encoding='utf-8', buffering=1)
+    from automate_pyppeteer import login_and_visit_urls
+    from resource_policy import ResourcePolicy
+
+    result = asyncio.run(login_and_visit_urls(
+        login_url, urls, resource_policy=ResourcePolicy(), headless=True, **options
+    ))
+    raise SystemExit(0 if result is not None else 1)
+
+
+def _rows_written(workdir):
+    paths = glob.glob(os.path.join(workdir, 'screenshots', 'form_data_*.jsonl'))
+    if not paths:
+        return 0
+    with open(paths[0], 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def _cdp_per_row(workdir):
+    """Commands sent, KiB sent and messages received per row, from the run's log"""
+    try:
+        with open(os.path.join(workdir, 'run.log'), 'r', encoding='utf-8') as f:
+            match = CDP_PER_ROW.search(f.read())
+    except OSError:
+        return None
+    if not match:
+        return None
+    sent, sent_kib, received = (float(group) for group in match.groups())
+    return {'sent': sent, 'sent_kib': sent_kib, 'received': received}
+
+
+def measure(login_url, urls, options, workdir, credentials, interval=0.1):
+    """Run one mode in a fresh process and sample it until it exits"""
+    os.makedirs(workdir)
+    with open(os.path.join(workdir, 'cred.txt'), 'w') as f:
+        f.write(f"username={credentials[0]}\npassword={credentials[1]}\n")
+
+    ctx = multiprocessing.get_context('spawn')
+    process = ctx.Process(target=_run_mode, args=(login_url, urls, options, workdir))
+    started = time.perf_counter()
+    process.start()
+    first_result = None
+    peak_mib = 0.0
+    while process.is_alive():
+        peak_mib = max(peak_mib, process_tree_rss_mb(process.pid))
+        if first_result is None and _rows_written(workdir):
+            first_result = time.perf_counter() - started
+        time.sleep(interval)
+    process.join()
+    elapsed = time.perf_counter() - started
+
+    rows = _rows_written(workdir)
+    return {
+        'ok': process.exitcode == 0,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_minute': round(rows / elapsed * 60, 1),
+        'first_result_s': round(first_result, 2) if first_result is not None else None,
+        'peak_rss_mib': round(peak_mib, 1),
+        'cdp_per_row': _cdp_per_row(workdir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES),
+                        help='modes to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per mode (default: 1)')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    parser.add_argument('--keep', action='store_true', help='keep the working directories of the runs')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server, base_url = start_server(config)
+    urls = list_urls(base_url, config)
+    print(f"Fixture site at {base_url}/: {config.lists} list(s) of {config.rows_per_list} rows, "
+          f"{config.latency_ms:.0f} ms latency, {config.page_kb} KiB + {config.images} image(s) per form")
+
+    root = tempfile.mkdtemp(prefix='satu-bench-')
+    results = []
+    try:
+        print(f"\n{'mode':<16} {'rows':>5} {'time (s)':>9} {'rows/min':>9} {'first (s)':>10} "
+              f"{'peak RSS (MiB)':>15} {'CDP sent/row':>13} {'CDP recv/row':>13}")
+        for mode in args.modes:
+            for attempt in range(args.repeat):
+                workdir = os.path.join(root, f"{mode}_{attempt}")
+                result = measure(f"{base_url}/", urls, MODES[mode], workdir,
+                                 (config.username, config.password))
+                result['mode'] = mode
+                results.append(result)
+                first = f"{result['first_result_s']:.2f}" if result['first_result_s'] is not None else '-'
+                cdp = result['cdp_per_row'] or {}
+                print(f"{mode:<16} {result['rows']:>5} {result['seconds']:>9.2f} "
+                      f"{result['rows_per_minute']:>9.1f} {first:>10} {result['peak_rss_mib']:>15.1f} "
+                      f"{cdp.get('sent', '-'):>13} {cdp.get('received', '-'):>13}"
+                      f"{'' if result['ok'] else '  (failed)'}")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"\nRuns kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(config), 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
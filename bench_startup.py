@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Start-up benchmark of the browser launch profiles
+
+Each attempt runs in a fresh process, timed from just before the process
+starts: importing the automation module, launching the browser with the
+profile and loading the fixture site's login page (the first navigation
+of a run). A profile with a persistent profile directory gets a new,
+empty one per benchmark, so its first attempt is cold and the later ones
+use the HTTP cache the first one filled. Also reported is whether numpy or
+PIL were loaded at start-up, which should only happen once a crop runs.
+Tabs get the default resource policy, as in a run.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fixture_server import add_config_arguments, config_from_args, start_server
+from launch_profile import PROFILES
+
+
+def _start(login_url, profile_name, user_data_dir, connection):
+    import automate_pyppeteer  # noqa: F401, its import is part of the start-up
+    imported = time.time()
+    heavy = [name for name in ('numpy', 'PIL') if name in sys.modules]
+
+    from launch_profile import launch_arguments, resolve_profile
+    from pyppeteer import launch
+    from resource_policy import ResourcePolicy
+
+    async def first_navigation():
+        profile = resolve_profile(profile_name, user_data_dir=user_data_dir)
+        browser = await launch(**launch_arguments(profile))
+        launched = time.time()
+        try:
+            page = await browser.newPage()
+            await ResourcePolicy().attach(page)
+            await page.goto(login_url, {'waitUntil': 'load'})
+            return launched, time.time()
+        finally:
+            await browser.close()
+
+    launched, navigated = asyncio.run(first_navigation())
+    connection.send({'imported': imported, 'launched': launched, 'navigated': navigated, 'heavy': heavy})
+
+
+def measure(login_url, profile_name, user_data_dir):
+    """Start one process with the profile; returns its timings in seconds"""
+    ctx = multiprocessing.get_context('spawn')
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_start, args=(login_url, profile_name, user_data_dir, sender))
+    started = time.time()
+    process.start()
+    process.join()
+    if not receiver.poll():
+        return {'ok': False}
+    times = receiver.recv()
+    return {
+        'ok': process.exitcode == 0,
+        'import_s': round(times['imported'] - started, 2),
+        'launch_s': round(times['launched'] - times['imported'], 2),
+        'first_navigation_s': round(times['navigated'] - started, 2),
+        'heavy_imports': times['heavy'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=['fast'],
+                        help='launch profiles to measure (default: fast; window needs a display)')
+    parser.add_argument('--repeat', type=int, default=3, help='starts per profile (default: 3)')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(config_from_args(args))
+    root = tempfile.mkdtemp(prefix='satu-startup-')
+    try:
+        print(f"{'profile':<8} {'start':<6} {'import (s)':>10} {'launch (s)':>10} "
+              f"{'first nav (s)':>14}  heavy imports")
+        for name in args.profiles:
+            user_data_dir = os.path.join(root, name) if PROFILES[name].user_data_dir else None
+            for attempt in range(args.repeat):
+                result = measure(f"{base_url}/", name, user_data_dir)
+                start = 'warm' if user_data_dir and attempt else 'cold'
+                if not result['ok']:
+                    print(f"{name:<8} {start:<6} failed")
+                    continue
+                print(f"{name:<8} {start:<6} {result['import_s']:>10.2f} {result['launch_s']:>10.2f} "
+                      f"{result['first_navigation_s']:>14.2f}  {', '.join(result['heavy_imports']) or '-'}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
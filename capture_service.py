@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Long-running capture service
+
+Keeps one logged-in browser and a pool of tabs warm and takes capture and
+extract jobs over a local HTTP API, on a TCP port or a Unix socket:
+
+    POST /jobs      {"url": ..., "type": "list" | "row", "screenshot": true}
+                    streams one JSON line per event (accepted, row, failed,
+                    done); with "stream": false it answers with the job id
+    GET  /jobs/ID   the job's state and events so far (?stream=1 to follow it)
+    GET  /status    queue, tabs and session
+
+A job for a URL that is already queued or running, or that finished within
+the last ``--dedup-seconds``, joins the existing job instead of running again.
+
+    python capture_service.py --socket /tmp/satu.sock --tabs 4
+    curl --unix-socket /tmp/satu.sock -d '{"url": "https://satu.unri.ac.id/..."}' http://satu/jobs
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from pyppeteer import launch
+
+from automate_pyppeteer import (
+    ISI_ROW_END, ISI_ROW_START, PAGE_FUNCTIONS, RunContext, TabPool, capture_row, collect_isi_links,
+    fetch_row, log_in_again, restart_browser, sign_in,
+)
+from http_extract import HttpExtractor, SessionExpiredError
+from memory_guard import MemoryGuard, MemoryLimits
+from page_capture import FORMATS
+from pacing import PacingController
+from page_readiness import ReadinessEngine
+from resource_policy import ResourcePolicy
+from retry_policy import StepTimeouts
+from screenshot_pipeline import ScreenshotPipeline
+from visit_cache import normalize_url
+
+# Finished jobs kept for GET /jobs/ID and deduplication
+MAX_FINISHED_JOBS = 500
+
+
+class Job:
+    """One request and the events it produced, for every client following it"""
+
+    def __init__(self, number, kind, url, screenshot):
+        self.number = number
+        self.id = str(number)
+        self.kind = kind
+        self.url = url
+        self.screenshot = screenshot
+        self.state = 'queued'
+        self.events = []
+        self.rows = 0
+        self.failed = 0
+        self.submitted = time.monotonic()
+        self.finished = None
+        self._changed = asyncio.Condition()
+        # Rows whose screenshot is still in the pipeline
+        self.pending = []
+
+    @property
+    def key(self):
+        return self.kind, normalize_url(self.url), self.screenshot
+
+    async def add(self, event):
+        event = dict(event, job=self.id)
+        self.events.append(event)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def finish(self):
+        await asyncio.gather(*self.pending, return_exceptions=True)
+        self.state = 'done'
+        self.finished = time.monotonic()
+        await self.add({'event': 'done', 'rows': self.rows, 'failed': self.failed,
+                        'seconds': round(self.finished - self.submitted, 2)})
+
+    async def follow(self):
+        """Yield the job's events from the first one until it is done"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > sent)
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.state == 'done' and sent == len(self.events):
+                return
+
+    def describe(self):
+        return {'id': self.id, 'type': self.kind, 'url': self.url, 'screenshot': self.screenshot,
+                'state': self.state, 'rows': self.rows, 'failed': self.failed, 'events': self.events}
+
+
+class CaptureService:
+    """Warm browser, tab pool and job table behind the HTTP API"""
+
+    def __init__(self, login_url, tabs=2, output_dir='screenshots', session_file='session.json',
+                 resource_policy=None, extract_mode='browser', capture_mode='full', image_format='png',
+                 image_quality=90, crop_workers=None, headless=True, dedup_seconds=60.0,
+                 memory_limits=None):
+        self.login_url = login_url
+        self.tabs = tabs
+        self.output_dir = output_dir
+        self.session_file = session_file
+        self.resource_policy = resource_policy
+        self.extract_mode = extract_mode
+        self.capture_mode = capture_mode
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.crop_workers = crop_workers
+        self.headless = headless
+        self.dedup_seconds = dedup_seconds
+        self.guard = MemoryGuard(memory_limits or MemoryLimits())
+        self.jobs = OrderedDict()
+        self.started = None
+        self.browser = None
+        self.pool = None
+        self.ctx = None
+        self.logins = 0
+        self._numbers = itertools.count(1)
+        self._active = {}
+        self._login_lock = asyncio.Lock()
+
+    async def start(self):
+        """Launch the browser, log in and open the tab pool"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        pipeline = ScreenshotPipeline(workers=self.crop_workers, quality=self.image_quality).start()
+        print("Launching browser...")
+        self.browser = await launch(**self.launch_options)
+        page = await self.browser.newPage()
+        viewport = {'width': 1440, 'height': 1440}
+        await page.setViewport(viewport)
+        self.ctx = RunContext(
+            output_dir=self.output_dir,
+            timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"),
+            readiness=ReadinessEngine(functions=PAGE_FUNCTIONS),
+            pipeline=pipeline,
+            policy=self.resource_policy,
+            capture_mode=self.capture_mode,
+            image_format=self.image_format,
+            image_quality=self.image_quality,
+            pacing=PacingController(),
+            timeouts=StepTimeouts(),
+        )
+        await self.ctx.setup_tab(page)
+        if not await sign_in(page, self.login_url, self.session_file):
+            raise RuntimeError("Login failed")
+        self.logins += 1
+        if self.extract_mode == 'http':
+            self.ctx.http = await HttpExtractor(concurrency=max(4, 2 * self.tabs)).start(page)
+        self.pool = TabPool(self.browser, self.tabs, viewport, first_page=page,
+                            setup_tab=self.ctx.setup_tab, keep_results=False,
+                            guard=self.guard, relaunch=self._relaunch)
+        await self.pool.start()
+        self.started = time.monotonic()
+        print(f"✅ Browser ready with {self.pool.concurrency} tab(s)")
+
+    @property
+    def launch_options(self):
+        return {'headless': self.headless, 'args': ['--no-sandbox', '--disable-setuid-sandbox']}
+
+    async def _relaunch(self, old_page):
+        """Restart the browser for the memory guard, on the same session"""
+        self.browser, page = await restart_browser(self.browser, old_page, self.login_url,
+                                                   self.session_file, **self.launch_options)
+        return self.browser, page
+
+    async def close(self):
+        if self.pool:
+            await self.pool.stop()
+        if self.ctx and self.ctx.http:
+            await self.ctx.http.close()
+        if self.browser:
+            await self.browser.close()
+        if self.ctx:
+            await self.ctx.pipeline.close()
+
+    async def relogin(self, page, seen_logins):
+        """Log in again after the session expired, once for all tabs that noticed
+
+        Without a ``page`` (HTTP rows) the login runs on a spare tab, opened
+        only when this caller is the one to log in.
+        """
+        async with self._login_lock:
+            if self.logins != seen_logins:
+                return
+            spare = None if page else await self.browser.newPage()
+            try:
+                await log_in_again(page or spare, self.login_url, self.ctx, self.session_file,
+                                   max(4, 2 * self.tabs))
+            finally:
+                if spare:
+                    await spare.close()
+            self.logins += 1
+
+    # Jobs
+
+    def submit(self, kind, url, screenshot=True):
+        """Queue a job, or return the equal one already queued or recently done"""
+        job = Job(next(self._numbers), kind, url, screenshot)
+        existing = self._active.get(job.key)
+        if existing and (existing.state != 'done'
+                         or time.monotonic() - existing.finished < self.dedup_seconds):
+            return existing, True
+
+        self._active[job.key] = job
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_FINISHED_JOBS:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.state != 'done':
+                break
+            del self.jobs[oldest.id]
+            if self._active.get(oldest.key) is oldest:
+                del self._active[oldest.key]
+
+        if kind == 'list':
+            self.pool.submit(TabPool.LIST_PRIORITY, (job.number, 0), self._list_job(job))
+        elif screenshot or not self.ctx.http:
+            self.pool.submit(TabPool.ROW_PRIORITY, (job.number, 0), self._single_row_job(job))
+        else:
+            asyncio.ensure_future(self._http_single_row(job))
+        return job, False
+
+    async def _row(self, job, page, link, row_number, list_url):
+        """Capture one row on a tab; its event is added once its screenshot is saved"""
+        seen_logins = self.logins
+        try:
+            form_data, screenshot = await capture_row(page, link, job.number, row_number, list_url,
+                                                      self.job_context(job))
+        except SessionExpiredError:
+            await self.relogin(page, seen_logins)
+            form_data, screenshot = await capture_row(page, link, job.number, row_number, list_url,
+                                                      self.job_context(job))
+
+        async def report():
+            path = await screenshot if screenshot else None
+            job.rows += 1
+            await job.add({'event': 'row', 'row_number': row_number, 'url': link,
+                           'form_data': form_data, 'screenshot': path})
+        job.pending.append(asyncio.ensure_future(report()))
+
+    async def _http_row(self, job, link, row_number, list_url):
+        seen_logins = self.logins
+        try:
+            form_data, _ = await fetch_row(link, job.number, row_number, list_url, self.ctx)
+        except SessionExpiredError:
+            # The pool's tabs are busy with other jobs
+            await self.relogin(None, seen_logins)
+            form_data, _ = await fetch_row(link, job.number, row_number, list_url, self.ctx)
+        job.rows += 1
+        await job.add({'event': 'row', 'row_number': row_number, 'url': link,
+                       'form_data': form_data, 'screenshot': None})
+
+    def job_context(self, job):
+        """The shared run context, with screenshots switched per job"""
+        if job.screenshot == self.ctx.screenshots:
+            return self.ctx
+        return replace(self.ctx, screenshots=job.screenshot)
+
+    async def _failed(self, job, error, row_number=None):
+        job.failed += 1
+        await job.add({'event': 'failed', 'row_number': row_number, 'error': str(error)})
+
+    def _list_job(self, job):
+        async def run(page):
+            job.state = 'running'
+            try:
+                seen_logins = self.logins
+                try:
+                    links = await collect_isi_links(page, job.url, self.ctx)
+                except SessionExpiredError:
+                    await self.relogin(page, seen_logins)
+                    links = await collect_isi_links(page, job.url, self.ctx)
+            except Exception as e:
+                await self._failed(job, e)
+                await job.finish()
+                return
+            rows = list(range(ISI_ROW_START, min(ISI_ROW_END, len(links))))
+            await job.add({'event': 'list', 'links': len(links), 'rows': [idx + 1 for idx in rows]})
+            remaining = {'count': len(rows)}
+
+            async def row_done():
+                remaining['count'] -= 1
+                if not remaining['count']:
+                    await job.finish()
+
+            for idx in rows:
+                if self.ctx.http and not job.screenshot:
+                    async def http_row(idx=idx):
+                        try:
+                            await self._http_row(job, links[idx], idx + 1, job.url)
+                        except Exception as e:
+                            await self._failed(job, e, idx + 1)
+                        await row_done()
+                    asyncio.ensure_future(http_row())
+                    continue
+
+                async def row_job(tab, idx=idx):
+                    try:
+                        await self._row(job, tab, links[idx], idx + 1, job.url)
+                    except Exception as e:
+                        await self._failed(job, e, idx + 1)
+                    await row_done()
+                self.pool.submit(TabPool.ROW_PRIORITY, (job.number, idx + 1), row_job)
+            if not rows:
+                await job.finish()
+        return run
+
+    def _single_row_job(self, job):
+        async def run(page):
+            job.state = 'running'
+            try:
+                await self._row(job, page, job.url, 0, job.url)
+            except Exception as e:
+                await self._failed(job, e, 0)
+            await job.finish()
+        return run
+
+    async def _http_single_row(self, job):
+        job.state = 'running'
+        try:
+            await self._http_row(job, job.url, 0, job.url)
+        except Exception as e:
+            await self._failed(job, e, 0)
+        await job.finish()
+
+    def status(self):
+        states = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            'tabs': self.pool.concurrency if self.pool else 0,
+            'queued_tasks': self.pool.queued if self.pool else 0,
+            'jobs': states,
+            'logins': self.logins,
+            'uptime_s': round(time.monotonic() - self.started, 1) if self.started else 0,
+            'pipeline_stalls': self.ctx.pipeline.stalls if self.ctx else 0,
+            'memory_guard': self.guard.summary(),
+            'pacing': self.ctx.pacing.summary() if self.ctx else {},
+        }
+
+
+def make_app(service):
+    """aiohttp application exposing the service"""
+    from aiohttp import web
+
+    async def stream(request, job, deduplicated=False):
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        accepted = {'event': 'accepted', 'job': job.id, 'deduplicated': deduplicated,
+                    'queued_tasks': service.pool.queued}
+        await response.write((json.dumps(accepted) + '\n').encode())
+        async for event in job.follow():
+            await response.write((json.dumps(event, ensure_ascii=False) + '\n').encode())
+        await response.write_eof()
+        return response
+
+    async def create_job(request):
+        try:
+            body = await request.json()
+            url = body['url'] if isinstance(body, dict) else None
+        except (ValueError, KeyError):
+            url = None
+        if not isinstance(url, str):
+            return web.json_response({'error': 'expected a JSON body with "url"'}, status=400)
+        if urlsplit(url).scheme not in ('http', 'https'):
+            return web.json_response({'error': 'url must start with http:// or https://'}, status=400)
+        kind = body.get('type', 'list')
+        if kind not in ('list', 'row'):
+            return web.json_response({'error': 'type must be "list" or "row"'}, status=400)
+
+        job, deduplicated = service.submit(kind, url, bool(body.get('screenshot', True)))
+        if body.get('stream', True):
+            return await stream(request, job, deduplicated)
+        return web.json_response({'job': job.id, 'deduplicated': deduplicated}, status=202)
+
+    async def get_job(request):
+        job = service.jobs.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'error': 'no such job'}, status=404)
+        if request.query.get('stream'):
+            return await stream(request, job)
+        return web.json_response(job.describe())
+
+    async def get_status(request):
+        return web.json_response(service.status())
+
+    app = web.Application()
+    app.router.add_post('/jobs', create_job)
+    app.router.add_get('/jobs/{job_id}', get_job)
+    app.router.add_get('/status', get_status)
+    return app
+
+
+async def serve(service, host='127.0.0.1', port=8790, socket_path=None):
+    """Start the service and answer requests until interrupted"""
+    from aiohttp import web
+
+    await service.start()
+    runner = web.AppRunner(make_app(service))
+    await runner.setup()
+    if socket_path:
+        site = web.UnixSite(runner, socket_path)
+        where = f"unix:{socket_path}"
+    else:
+        site = web.TCPSite(runner, host, port)
+        where = f"http://{host}:{port}"
+    await site.start()
+    print(f"📡 Capture service listening on {where}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8790, help='port to listen on (default: 8790)')
+    parser.add_argument('--socket', metavar='PATH', help='listen on a Unix socket instead of a port')
+    parser.add_argument('--login-url', default='https://satu.unri.ac.id')
+    parser.add_argument('--tabs', type=int, default=2, help='tabs kept open (default: 2)')
+    parser.add_argument('--output-dir', default='screenshots')
+    parser.add_argument('--session-file', default='session.json')
+    parser.add_argument('--no-resource-policy', action='store_true')
+    parser.add_argument('--resource-policy', metavar='FILE')
+    parser.add_argument('--extract', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--capture', choices=['full', 'clip'], default='full')
+    parser.add_argument('--image-format', choices=FORMATS, default='png')
+    parser.add_argument('--image-quality', type=int, default=90)
+    parser.add_argument('--crop-workers', type=int)
+    parser.add_argument('--show-browser', action='store_true', help='run the browser with a window')
+    parser.add_argument('--dedup-seconds', type=float, default=60.0,
+                        help='reuse the result of an equal job finished this recently (default: 60)')
+    parser.add_argument('--max-tab-heap-mb', type=float, default=512,
+                        help='replace a tab whose JS heap grows past this (default: 512, 0: off)')
+    parser.add_argument('--max-tab-navigations', type=int, default=250,
+                        help='replace a tab after this many pages (default: 250, 0: off)')
+    parser.add_argument('--max-browser-rss-mb', type=float, default=0,
+                        help='restart the browser, keeping the session, past this much memory (default: off)')
+    args = parser.parse_args()
+
+    resource_policy = None
+    if not args.no_resource_policy:
+        resource_policy = ResourcePolicy.from_file(args.resource_policy) if args.resource_policy else ResourcePolicy()
+    service = CaptureService(
+        args.login_url,
+        tabs=args.tabs,
+        output_dir=args.output_dir,
+        session_file=args.session_file,
+        resource_policy=resource_policy,
+        extract_mode=args.extract,
+        capture_mode=args.capture,
+        image_format=args.image_format,
+        image_quality=args.image_quality,
+        crop_workers=args.crop_workers,
+        headless=not args.show_browser,
+        dedup_seconds=args.dedup_seconds,
+        memory_limits=MemoryLimits(max_heap_mb=args.max_tab_heap_mb or None,
+                                   max_navigations=args.max_tab_navigations or None,
+                                   max_browser_rss_mb=args.max_browser_rss_mb or None),
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for satu.unri.ac.id
+
+Serves the pages the automation depends on: the email page, the password
+page, list pages whose "Isi" buttons (``a.btn.btn-primary``) lead to
+``input`` URLs, and form pages with the course info rows
+(``.row.border-gray-300``), ``#selectDosenHadir`` and the other fields read
+by the extractors. Response latency, page weight and lazily loaded content
+are configurable, so runs can be measured without the live site.
+
+    python fixture_server.py --port 8765 --write-urls list_url.txt
+"""
+
+import argparse
+import html
+import json
+import random
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, fields
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class FixtureConfig:
+    """Shape of the fake site"""
+    lists: int = 3
+    rows_per_list: int = 10
+    username: str = 'bench@example.com'
+    password: str = 'bench'
+    # Delay of every page and API response, plus up to jitter_ms at random
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    # Delay of every stylesheet, script and image
+    asset_latency_ms: float = 10.0
+    # Filler text and images on every form page
+    page_kb: int = 50
+    images: int = 4
+    image_kb: int = 30
+    # Last rows of a list only appear once the page is scrolled to the bottom
+    lazy_rows: int = 0
+    # Form page images are inserted by a script after this delay
+    lazy_ms: int = 0
+    # Sessions expire after this many seconds (0: never)
+    session_seconds: int = 0
+
+
+SEMESTERS = ['Ganjil 2024/2025', 'Genap 2024/2025']
+COURSES = ['Algoritma dan Pemrograman', 'Basis Data', 'Jaringan Komputer', 'Sistem Operasi',
+           'Kecerdasan Buatan', 'Rekayasa Perangkat Lunak', 'Statistika', 'Kalkulus']
+LECTURERS = ['Dr. Andi Saputra', 'Siti Rahma, M.Kom', 'Budi Hartono, M.T.', 'Dr. Rina Wulandari']
+
+STYLESHEET = '''
+body { margin: 0; font-family: sans-serif; background: #fff; }
+.sidebar { position: fixed; top: 0; bottom: 0; left: 0; width: 250px; background: #1e1e2d; color: #ccc; padding: 20px; }
+.content { margin-left: 290px; padding: 30px; max-width: 1000px; }
+.row { display: flex; gap: 20px; margin-bottom: 12px; }
+.border-gray-300 { border-bottom: 1px solid #ddd; padding-bottom: 8px; }
+.fw-bold { font-weight: bold; }
+.btn { display: inline-block; padding: 4px 12px; border-radius: 4px; text-decoration: none; }
+.btn-primary { background: #3e97ff; color: #fff; border: 0; }
+.filler p { color: #555; line-height: 1.5; }
+table { border-collapse: collapse; width: 100%; }
+td { border-bottom: 1px solid #eee; padding: 10px; height: 60px; }
+'''
+
+LAZY_LIST_JS = '''
+(function () {
+    const table = document.querySelector('#rows');
+    const more = document.querySelector('#more');
+    let loading = false;
+    window.addEventListener('scroll', () => {
+        if (loading || !more || window.innerHeight + window.scrollY < document.body.scrollHeight - 50) return;
+        loading = true;
+        fetch(more.dataset.src).then(r => r.json()).then(rows => {
+            rows.forEach(row => {
+                const tr = document.createElement('tr');
+                tr.innerHTML = `<td>${row.title}</td><td><a class="btn btn-primary" href="${row.href}">Isi</a></td>`;
+                table.appendChild(tr);
+            });
+            more.remove();
+        });
+    });
+})();
+'''
+
+LAZY_IMAGES_JS = '''
+setTimeout(() => {
+    const gallery = document.querySelector('#gallery');
+    JSON.parse(gallery.dataset.images).forEach(src => {
+        const img = document.createElement('img');
+        img.src = src;
+        img.width = 200;
+        gallery.appendChild(img);
+    });
+}, %d);
+'''
+
+
+def make_png(size_bytes, seed):
+    """An uncompressed noise PNG of roughly ``size_bytes`` (stdlib only)"""
+    width = 200
+    height = max(1, size_bytes // (width * 3 + 1))
+    rng = random.Random(seed)
+    raw = b''.join(b'\0' + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, 0)) + chunk(b'IEND', b''))
+
+
+def layout(title, body, scripts=''):
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<link rel="stylesheet" href="/static/app.css"></head>
+<body><nav class="sidebar"><h3>SATU</h3><p>Monev Perkuliahan</p></nav>
+<div class="content">{body}</div>{scripts}</body></html>'''
+
+
+def login_page(step):
+    if step == 'email':
+        field = '<input type="email" name="email" placeholder="email">'
+        button = 'Lanjutkan'
+    else:
+        field = '<input type="password" name="password">'
+        button = 'Masuk'
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Login SATU</title></head>
+<body><form method="POST" action="/login/{step}">{field}
+<button type="submit" class="btn btn-primary">{button}</button></form></body></html>'''
+
+
+def list_page(config, list_number):
+    visible = config.rows_per_list - config.lazy_rows
+    rows = ''.join(
+        f'<tr><td>Pertemuan {row}</td>'
+        f'<td><a class="btn btn-primary" href="/monev/input/{list_number}/{row}">Isi</a></td></tr>'
+        for row in range(1, visible + 1)
+    )
+    more, scripts = '', ''
+    if config.lazy_rows:
+        more = f'<div id="more" data-src="/api/list/{list_number}?offset={visible}">Memuat...</div>'
+        scripts = f'<script>{LAZY_LIST_JS}</script>'
+    body = f'<h2>Daftar Pertemuan {list_number}</h2><table id="rows">{rows}</table>{more}'
+    return layout(f'Monev {list_number}', body, scripts)
+
+
+def form_page(config, list_number, row):
+    rng = random.Random(list_number * 1000 + row)
+    info = {
+        'Program Studi': 'Teknik Informatika',
+        'Semester': rng.choice(SEMESTERS),
+        'Mata Kuliah': COURSES[(list_number + row) % len(COURSES)],
+        'Dosen Pengampu': LECTURERS[list_number % len(LECTURERS)],
+        'Kelas': 'ABCD'[row % 4],
+    }
+    info_rows = ''.join(
+        f'<div class="row border-gray-300"><label>{label}</label>'
+        f'<div class="fw-bold">\n  {html.escape(value)}\n</div></div>'
+        for label, value in info.items()
+    )
+    options = ''.join(
+        f'<option value="{index}"{" selected" if index == list_number % len(LECTURERS) else ""}>{name}</option>'
+        for index, name in enumerate(LECTURERS)
+    )
+    form = f'''<form method="POST" action="/monev/input/{list_number}/{row}">
+<input type="hidden" name="_token" value="{secrets.token_hex(20)}">
+<label><input type="radio" name="dosenOption" value="hadir" checked> Dosen hadir</label>
+<label><input type="radio" name="dosenOption" value="pengganti"> Dosen pengganti</label>
+<select id="selectDosenHadir" name="dosenHadir">{options}</select>
+<input id="inputDosenPenggantiAsing" name="dosenPenggantiAsing" value="">
+<input id="inputInstansiAsal" name="instansiAsal" value="">
+<input id="inputTanggalRencana" type="date" name="tanggalRencana" value="2024-09-{row:02d}">
+<input type="date" name="inputTanggalTerlaksana" value="2024-09-{row:02d}">
+<input id="inputTema" name="tema" value="Pertemuan {row}: {info['Mata Kuliah']}">
+<textarea id="exampleFormControlTextarea1" name="pokokBahasan">Pokok bahasan pertemuan {row}</textarea>
+<button type="submit" class="btn btn-primary">Simpan</button>
+</form>'''
+
+    sentence = f'Catatan perkuliahan {info["Mata Kuliah"]} pertemuan {row}. '
+    filler = ''.join(f'<p>{sentence * 8}</p>' for _ in range(config.page_kb * 1024 // (len(sentence) * 8 + 7)))
+    images = [f'/static/img/{list_number}/{row}/{index}.png' for index in range(config.images)]
+    scripts = '<script src="/static/app.js"></script>'
+    if config.lazy_ms:
+        gallery = f'<div id="gallery" data-images="{html.escape(json.dumps(images))}"></div>'
+        scripts += f'<script>{LAZY_IMAGES_JS % config.lazy_ms}</script>'
+    else:
+        gallery = '<div id="gallery">' + ''.join(f'<img src="{src}" width="200">' for src in images) + '</div>'
+    body = f'<h2>Monev Perkuliahan</h2>{info_rows}{form}{gallery}<div class="filler">{filler}</div>'
+    return layout(f'Isi Monev {list_number}-{row}', body, scripts)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Routes of the fake site; the server carries the config and sessions"""
+
+    def log_message(self, format, *args):
+        pass
+
+    # Helpers
+
+    def _delay(self, asset=False):
+        config = self.server.config
+        delay = config.asset_latency_ms if asset else config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=()):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location, cookie=None):
+        headers = [('Location', location)]
+        if cookie:
+            headers.append(('Set-Cookie', f'{cookie}; Path=/; HttpOnly'))
+        self._send(302, headers=headers)
+
+    def _cookie(self, name):
+        cookies = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookies[name].value if name in cookies else None
+
+    def _logged_in(self):
+        created = self.server.sessions.get(self._cookie('satu_session'))
+        if created is None:
+            return False
+        lifetime = self.server.config.session_seconds
+        return not lifetime or time.time() - created < lifetime
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+    # Routes
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlparse(self.path)
+        path = url.path
+
+        if path.startswith('/static/'):
+            self._delay(asset=True)
+            # Cacheable like the real site's assets, for the browser profile cache
+            if path == '/static/app.css':
+                return self._send(200, STYLESHEET, 'text/css', [('Cache-Control', 'max-age=3600')])
+            if path == '/static/app.js':
+                return self._send(200, 'window.satuReady = true;', 'application/javascript',
+                                  [('Cache-Control', 'max-age=3600')])
+            if path.startswith('/static/img/'):
+                image = make_png(config.image_kb * 1024, path)
+                return self._send(200, image, 'image/png', [('Cache-Control', 'max-age=3600')])
+            return self._send(404, 'Not found')
+
+        self._delay()
+        if path == '/login/password':
+            if not self._cookie('satu_login'):
+                return self._redirect('/')
+            return self._send(200, login_page('password'))
+        if not self._logged_in():
+            if path == '/':
+                return self._send(200, login_page('email'))
+            return self._redirect('/')
+
+        if path == '/':
+            links = ''.join(f'<li><a href="/monev/list/{n}">Monev {n}</a></li>' for n in range(1, config.lists + 1))
+            return self._send(200, layout('Beranda SATU', f'<h2>Beranda</h2><ul>{links}</ul>'))
+        match = re.fullmatch(r'/monev/list/(\d+)', path)
+        if match:
+            return self._send(200, list_page(config, int(match.group(1))))
+        match = re.fullmatch(r'/api/list/(\d+)', path)
+        if match:
+            list_number = int(match.group(1))
+            offset = int(parse_qs(url.query).get('offset', ['0'])[0])
+            rows = [{'title': f'Pertemuan {row}', 'href': f'/monev/input/{list_number}/{row}'}
+                    for row in range(offset + 1, config.rows_per_list + 1)]
+            return self._send(200, json.dumps(rows), 'application/json')
+        match = re.fullmatch(r'/monev/input/(\d+)/(\d+)', path)
+        if match:
+            return self._send(200, form_page(config, int(match.group(1)), int(match.group(2))))
+        return self._send(404, layout('Not found', '<h2>404</h2>'))
+
+    def do_POST(self):
+        config = self.server.config
+        self._delay()
+        form = self._form()
+        if self.path == '/login/email':
+            if form.get('email') != config.username:
+                return self._redirect('/')
+            return self._redirect('/login/password', cookie=f'satu_login={secrets.token_hex(8)}')
+        if self.path == '/login/password':
+            if not self._cookie('satu_login') or form.get('password') != config.password:
+                return self._redirect('/')
+            token = secrets.token_hex(16)
+            self.server.sessions[token] = time.time()
+            return self._redirect('/', cookie=f'satu_session={token}')
+        return self._redirect(self.path if self._logged_in() else '/')
+
+
+def start_server(config=None, host='localhost', port=0):
+    """Serve the fake site from a background thread; returns (server, base url)"""
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    server.config = config or FixtureConfig()
+    server.sessions = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def list_urls(base_url, config):
+    """URLs of every list page, as they would appear in list_url.txt"""
+    return [f"{base_url}/monev/list/{n}" for n in range(1, config.lists + 1)]
+
+
+def add_config_arguments(parser):
+    """Command line options for every FixtureConfig field"""
+    for field in fields(FixtureConfig):
+        parser.add_argument('--' + field.name.replace('_', '-'), type=type(field.default),
+                            default=field.default, help=f'(default: {field.default})')
+
+
+def config_from_args(args):
+    return FixtureConfig(**{field.name: getattr(args, field.name) for field in fields(FixtureConfig)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--write-urls', metavar='FILE', help='write the list page URLs to FILE')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server, base_url = start_server(config, args.host, args.port)
+    if args.write_urls:
+        with open(args.write_urls, 'w') as f:
+            f.write('\n'.join(list_urls(base_url, config)) + '\n')
+    print(f"Serving the SATU stand-in at {base_url}/ (login: {config.username} / {config.password})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
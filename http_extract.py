@@ -0,0 +1,424 @@
+"""
+Browser-free extraction of the SATU "Isi" form pages
+
+The form pages are server rendered, so their fields can be read from the raw
+HTML. The parser here builds a small element tree and reads it into the same
+``form_data`` schema as the ``EXTRACT_FORM_DATA_JS`` page script, following
+the DOM's rules for ``.value``, ``.text`` and ``textContent``. Pages are
+fetched with a pooled aiohttp client carrying the browser's session cookies.
+"""
+
+import asyncio
+import json
+import os
+import re
+from html.parser import HTMLParser
+from http.cookies import Morsel
+from urllib.parse import urljoin
+
+# Whitespace as matched by JavaScript's trim() and \s
+JS_WHITESPACE = '\t\n\v\f\r \u00a0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+JS_WHITESPACE_RUN = re.compile(f'[{JS_WHITESPACE}]+')
+ASCII_WHITESPACE_RUN = re.compile('[\t\n\f\r ]+')
+
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+}
+# Start tags that close an open element of the same kind (<option>, <li>, ...)
+SELF_CLOSING_SIBLINGS = {'option', 'li', 'p', 'tr', 'td', 'th', 'dt', 'dd'}
+
+COURSE_INFO_LABELS = {
+    'Program Studi': 'program_studi',
+    'Semester': 'semester',
+    'Mata Kuliah': 'mata_kuliah',
+    'Dosen Pengampu': 'dosen_pengampu',
+    'Kelas': 'kelas',
+}
+
+DATE_VALUE = re.compile(r'^\d{4,}-\d{2}-\d{2}$')
+
+# Values the page script gave on the fixtures of a directory, next to them
+EXPECTED_FILE = 'expected.json'
+
+
+class SessionExpiredError(Exception):
+    """The server answered with the login form instead of the requested page"""
+
+
+class Element:
+    """Element node of the parsed page"""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self):
+        return set(self.attrs.get('class', '').split())
+
+    def iter(self):
+        """This element and its descendant elements, in document order"""
+        yield self
+        for child in self.children:
+            if isinstance(child, Element):
+                yield from child.iter()
+
+    def find_all(self, match):
+        return [el for el in self.iter() if el is not self and match(el)]
+
+    def find(self, match):
+        return next((el for el in self.iter() if el is not self and match(el)), None)
+
+    def text_content(self):
+        parts = []
+        for child in self.children:
+            parts.append(child.text_content() if isinstance(child, Element) else child)
+        return ''.join(parts)
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {})
+        self._open = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SELF_CLOSING_SIBLINGS and self._open[-1].tag == tag:
+            self._open.pop()
+        # Repeated attributes keep their first value, as in the DOM
+        attr_map = {}
+        for name, value in attrs:
+            attr_map.setdefault(name, '' if value is None else value)
+        element = Element(tag, attr_map, self._open[-1])
+        self._open[-1].children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self._open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS and self._open[-1].tag == tag:
+            self._open.pop()
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self._open) - 1, 0, -1):
+            if self._open[depth].tag == tag:
+                del self._open[depth:]
+                return
+
+    def handle_data(self, data):
+        current = self._open[-1]
+        # The parser drops one newline right after <textarea>/<pre>
+        if current.tag in ('textarea', 'pre') and not current.children and data.startswith('\n'):
+            data = data[1:]
+        if data:
+            current.children.append(data)
+
+
+def parse_html(html):
+    """Parse a page into an element tree; returns the document node"""
+    builder = _TreeBuilder()
+    # The HTML input stream turns CR LF and lone CR into LF before parsing
+    builder.feed(html.replace('\r\n', '\n').replace('\r', '\n'))
+    builder.close()
+    return builder.root
+
+
+def js_trim(text):
+    return text.strip(JS_WHITESPACE)
+
+
+def _by_id(element_id):
+    return lambda el: el.attrs.get('id') == element_id
+
+
+def _input_named(name):
+    return lambda el: el.tag == 'input' and el.attrs.get('name') == name
+
+
+def _option_text(option):
+    text = ''.join(
+        child.text_content() if isinstance(child, Element) else child
+        for child in option.children
+        if not (isinstance(child, Element) and child.tag == 'script')
+    )
+    return ASCII_WHITESPACE_RUN.sub(' ', text).strip('\t\n\f\r ')
+
+
+def _option_value(option):
+    if 'value' in option.attrs:
+        return option.attrs['value']
+    return _option_text(option)
+
+
+def _selected_option(select):
+    options = select.find_all(lambda el: el.tag == 'option')
+    selected = [option for option in options if 'selected' in option.attrs]
+    if selected:
+        return selected[-1]
+    if 'multiple' in select.attrs:
+        return None
+    return next((option for option in options if 'disabled' not in option.attrs), None)
+
+
+def element_value(element):
+    """The ``.value`` property of a form control as the DOM reports it"""
+    if element.tag == 'select':
+        option = _selected_option(element)
+        return _option_value(option) if option is not None else ''
+    if element.tag == 'textarea':
+        return element.text_content()
+    if element.tag != 'input':
+        return element.attrs.get('value')
+
+    input_type = element.attrs.get('type', 'text').lower()
+    if 'value' not in element.attrs:
+        return 'on' if input_type in ('checkbox', 'radio') else ''
+    value = element.attrs['value']
+    if input_type in ('text', 'search', 'tel', 'password', 'url', 'email'):
+        value = value.replace('\r', '').replace('\n', '')
+        if input_type in ('url', 'email'):
+            value = value.strip('\t\n\f\r ')
+    elif input_type == 'date' and not DATE_VALUE.match(value):
+        value = ''
+    return value
+
+
+def _base_url(document, page_url):
+    base = document.find(lambda el: el.tag == 'base' and 'href' in el.attrs)
+    return urljoin(page_url, base.attrs['href']) if base else page_url
+
+
+def extract_form_data(html, page_url):
+    """Read an "Isi" form page into the schema of EXTRACT_FORM_DATA_JS"""
+    document = parse_html(html)
+    base_url = _base_url(document, page_url)
+    data = {}
+
+    # Get course information from the page header
+    course_info = {}
+    info_rows = document.find_all(lambda el: {'row', 'border-gray-300'} <= el.classes)
+    for row in info_rows:
+        labels = row.find_all(lambda el: el.tag == 'label')
+        values = row.find_all(lambda el: 'fw-bold' in el.classes)
+        for index, label in enumerate(labels):
+            if index >= len(values):
+                continue
+            key = COURSE_INFO_LABELS.get(js_trim(label.text_content()))
+            value_text = js_trim(JS_WHITESPACE_RUN.sub(' ', js_trim(values[index].text_content())))
+            if key:
+                course_info[key] = value_text
+    data['course_info'] = course_info
+
+    form = document.find(lambda el: el.tag == 'form')
+    if form is not None:
+        data['form_action'] = urljoin(base_url, form.attrs.get('action', ''))
+
+    token = document.find(_input_named('_token'))
+    if token is not None:
+        data['csrf_token'] = element_value(token)
+
+    selected_option = document.find(lambda el: _input_named('dosenOption')(el) and 'checked' in el.attrs)
+    if selected_option is not None:
+        data['dosen_option'] = element_value(selected_option)
+
+    dosen_hadir = document.find(_by_id('selectDosenHadir'))
+    if dosen_hadir is not None:
+        selected = _selected_option(dosen_hadir) if dosen_hadir.tag == 'select' else None
+        data['dosen_hadir'] = {
+            'value': element_value(dosen_hadir),
+            'text': _option_text(selected) if selected is not None else '',
+        }
+
+    fields = [
+        ('dosen_pengganti_asing', _by_id('inputDosenPenggantiAsing')),
+        ('asal_instansi', _by_id('inputInstansiAsal')),
+        ('tanggal_rencana', _by_id('inputTanggalRencana')),
+        ('tanggal_terlaksana', _input_named('inputTanggalTerlaksana')),
+        ('tema', _by_id('inputTema')),
+        ('pokok_bahasan', _by_id('exampleFormControlTextarea1')),
+    ]
+    for key, match in fields:
+        element = document.find(match)
+        value = element_value(element) if element is not None else None
+        # Elements without a value property are left out, like undefined in JSON
+        if value is not None:
+            data[key] = value
+
+    data['current_url'] = page_url
+    title = document.find(lambda el: el.tag == 'title')
+    data['page_title'] = (
+        ASCII_WHITESPACE_RUN.sub(' ', title.text_content()).strip('\t\n\f\r ') if title is not None else ''
+    )
+    return data
+
+
+def extract_isi_links(html, page_url):
+    """Read the "Isi" links of a list page, as FIND_ISI_LINKS_JS does"""
+    document = parse_html(html)
+    base_url = _base_url(document, page_url)
+    links = []
+    for link in document.find_all(lambda el: el.tag == 'a' and {'btn', 'btn-primary'} <= el.classes):
+        href = urljoin(base_url, link.attrs['href']) if 'href' in link.attrs else ''
+        if 'Isi' in link.text_content() and 'input' in href:
+            links.append(href)
+    return links
+
+
+def looks_like_login(html):
+    """Whether a page is the login form (the session is gone)"""
+    document = parse_html(html)
+    return document.find(lambda el: el.tag == 'input' and (
+        el.attrs.get('type', '').lower() in ('password', 'email')
+        or 'email' in el.attrs.get('name', '')
+        or 'email' in el.attrs.get('placeholder', '')
+    )) is not None
+
+
+def save_fixture(directory, name, url, html):
+    """Save a raw page for parity checks; the URL goes in a leading comment"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    # Line endings are kept as served, they matter to the parser
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(f"<!-- url: {url} -->\n{html}")
+    return path
+
+
+def load_fixture(path):
+    """Return the (url, html) of a saved fixture"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        first_line = f.readline()
+        html = f.read()
+    match = re.match(r'<!-- url: (\S+) -->', first_line)
+    if not match:
+        raise ValueError(f"{path} has no '<!-- url: ... -->' header")
+    return match.group(1), html
+
+
+class HttpExtractor:
+    """Pooled HTTP client fetching pages with the browser's session cookies"""
+
+    def __init__(self, concurrency=8, timeout=30, save_html_dir=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.save_html_dir = save_html_dir
+        self.fetched = 0
+        self._session = None
+
+    async def start(self, page):
+        """Open the client with the cookies and user agent of a logged-in page"""
+        import aiohttp
+        from yarl import URL
+
+        # Unsafe lets the jar keep cookies of hosts given as IP addresses
+        jar = aiohttp.CookieJar(unsafe=True)
+        for cookie in await page.cookies():
+            domain = cookie['domain'].lstrip('.')
+            morsel = Morsel()
+            morsel.set(cookie['name'], cookie['value'], cookie['value'])
+            morsel['domain'] = domain
+            morsel['path'] = cookie.get('path', '/')
+            jar.update_cookies({cookie['name']: morsel},
+                               response_url=URL(f"https://{domain}{morsel['path']}"))
+
+        user_agent = await page.evaluate('() => navigator.userAgent')
+        self._session = aiohttp.ClientSession(
+            cookie_jar=jar,
+            headers={'User-Agent': user_agent},
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def fetch(self, url, fixture_name=None):
+        """GET a page; returns its (final url, html)"""
+        async with self._session.get(url) as response:
+            response.raise_for_status()
+            html = await response.text()
+            final_url = str(response.url)
+        self.fetched += 1
+        if looks_like_login(html):
+            raise SessionExpiredError(f"Redirected to the login form while fetching {url}")
+        if self.save_html_dir and fixture_name:
+            save_fixture(self.save_html_dir, fixture_name, final_url, html)
+        return final_url, html
+
+    async def form_data(self, url, fixture_name=None):
+        final_url, html = await self.fetch(url, fixture_name)
+        return extract_form_data(html, final_url)
+
+    async def isi_links(self, url):
+        final_url, html = await self.fetch(url)
+        return extract_isi_links(html, final_url)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+
+def check_expected(directory):
+    """Compare the HTML parser with the page script's recorded values
+
+    ``expected.json`` maps fixture names to the ``form_data`` of
+    EXTRACT_FORM_DATA_JS or the ``isi_links`` of FIND_ISI_LINKS_JS on that
+    page, so the parser can be checked without a browser. Returns the
+    checked paths and a list of (path, key, parser value, script value)
+    differences.
+    """
+    with open(os.path.join(directory, EXPECTED_FILE), 'r', encoding='utf-8') as f:
+        expected_values = json.load(f)
+
+    paths = []
+    differences = []
+    for name, expected in sorted(expected_values.items()):
+        path = os.path.join(directory, name)
+        paths.append(path)
+        url, html = load_fixture(path)
+        if 'isi_links' in expected:
+            actual = extract_isi_links(html, url)
+            if actual != expected['isi_links']:
+                differences.append((path, 'isi_links', actual, expected['isi_links']))
+            continue
+        actual = extract_form_data(html, url)
+        expected = expected['form_data']
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                differences.append((path, key, actual.get(key), expected.get(key)))
+    return paths, differences
+
+
+async def check_parity(page, fixture_paths, js_extractor):
+    """Compare the HTML parser with the page script on saved fixtures
+
+    Each fixture is served to the browser page at its original URL with
+    every other request blocked, so both extractors see the same document.
+    Returns a list of (path, key, parser value, script value) differences.
+    """
+    served = {}
+
+    async def serve(request):
+        if request.url in served and request.resourceType == 'document':
+            await request.respond({'status': 200, 'contentType': 'text/html; charset=utf-8',
+                                   'body': served[request.url]})
+        else:
+            await request.abort('blockedbyclient')
+
+    await page.setRequestInterception(True)
+    page.on('request', lambda request: asyncio.ensure_future(serve(request)))
+
+    differences = []
+    for path in fixture_paths:
+        url, html = load_fixture(path)
+        served.clear()
+        served[url] = html
+        await page.goto(url, {'waitUntil': 'domcontentloaded'})
+        expected = await page.evaluate(js_extractor)
+        actual = extract_form_data(html, page.url)
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                differences.append((path, key, actual.get(key), expected.get(key)))
+    return differences
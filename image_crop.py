@@ -0,0 +1,207 @@
+"""
+Auto-crop of full page screenshots
+
+Kept free of browser imports so it can run in worker processes. The content
+box is found from horizontal strips of the image with integer reductions, so
+no full-size grayscale or float copy of a tall capture is ever made. The
+strips are cut from the decoded image: Pillow decodes a PNG whole on its
+first crop, so the screenshot itself is still held in memory once.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import numpy as np
+
+# Bytes of pixel data converted per strip
+STRIP_BYTES = 4 * 1024 * 1024
+
+# A left band counts as a sidebar when most of its columns are covered by
+# non-white pixels over the content rows, and it is neither a hairline nor a
+# large part of the page.
+SIDEBAR_MIN_COVERAGE = 0.5
+SIDEBAR_MIN_WIDTH = 40
+SIDEBAR_MAX_FRACTION = 0.35
+
+# Screenshot file types, by extension, and the Pillow format they save as
+IMAGE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.webp': 'WEBP'}
+
+
+def _analysis_mode(img):
+    """Mode each strip is converted to before it is measured"""
+    if img.mode in ('RGB', 'L'):
+        return img.mode
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        return 'RGBA'
+    if img.mode in ('1', 'I', 'I;16', 'F'):
+        return 'L'
+    return 'RGB'
+
+
+def _non_white(strip, threshold):
+    """Boolean mask of the strip's pixels darker than ``threshold``"""
+    pixels = np.asarray(strip)
+    if pixels.ndim == 2:
+        return pixels < threshold
+    if pixels.shape[2] == 4:
+        # Blend over white: transparent pixels count as background
+        alpha = pixels[:, :, 3].astype(np.uint32)
+        rgb_sum = pixels[:, :, :3].sum(axis=2, dtype=np.uint32)
+        blended = rgb_sum * alpha + 3 * 255 * (255 - alpha)
+        return blended < 3 * threshold * 255
+    # mean(R, G, B) < threshold without a float copy
+    return pixels.sum(axis=2, dtype=np.uint16) < 3 * threshold
+
+
+def _sidebar_width(col_counts, content_rows, width):
+    """Width of a dark band on the left edge, or 0 when there is none"""
+    if not content_rows:
+        return 0
+    covered = col_counts >= SIDEBAR_MIN_COVERAGE * content_rows
+    if not covered[0]:
+        return 0
+    uncovered = np.flatnonzero(~covered)
+    band = int(uncovered[0]) if uncovered.size else width
+    if band < SIDEBAR_MIN_WIDTH or band > SIDEBAR_MAX_FRACTION * width:
+        return 0
+    return band
+
+
+def find_content_box(img, threshold=240, padding=20, remove_sidebar=True):
+    """Return the (left, top, right, bottom) box around non-white content, or None
+
+    With ``remove_sidebar`` a dark navigation band on the left edge is left
+    out of the box.
+    """
+    width, height = img.size
+    mode = _analysis_mode(img)
+    channels = len(mode)
+    strip_rows = max(16, STRIP_BYTES // max(1, width * channels))
+
+    # Per row: the rightmost non-white column (-1 when the row is blank).
+    # Per column: how many rows are non-white there.
+    rightmost = np.full(height, -1, dtype=np.int32)
+    col_counts = np.zeros(width, dtype=np.uint32)
+
+    for y0 in range(0, height, strip_rows):
+        y1 = min(height, y0 + strip_rows)
+        # The first crop decodes the whole image; only the converted strip
+        # and its mask are per band
+        strip = img.crop((0, y0, width, y1))
+        if strip.mode != mode:
+            strip = strip.convert(mode)
+        mask = _non_white(strip, threshold)
+        has_content = mask.any(axis=1)
+        rightmost[y0:y1] = np.where(has_content, width - 1 - mask[:, ::-1].argmax(axis=1), -1)
+        col_counts += mask.sum(axis=0, dtype=np.uint32)
+
+    content_rows = int(np.count_nonzero(rightmost >= 0))
+    sidebar = _sidebar_width(col_counts, content_rows, width) if remove_sidebar else 0
+
+    rows = np.flatnonzero(rightmost >= sidebar)
+    cols = np.flatnonzero(col_counts[sidebar:]) + sidebar
+    if not rows.size or not cols.size:
+        return None
+
+    # Get bounding box coordinates
+    top, bottom = int(rows[0]), int(rows[-1])
+    left, right = int(cols[0]), int(cols[-1])
+
+    # Add small padding, without reaching back into the sidebar
+    top = max(0, top - padding)
+    left = max(sidebar, left - padding)
+    bottom = min(height, bottom + padding)
+    right = min(width, right + padding)
+    return left, top, right, bottom
+
+
+def cropped_name(image_path):
+    """``shot.png`` -> ``shot_cropped.png`` (same for .jpg and .webp)"""
+    root, ext = os.path.splitext(image_path)
+    return f"{root}_cropped{ext}"
+
+
+def crop_to_file(img, image_path, remove_sidebar=True, quality=None):
+    """Crop an opened screenshot and save it next to ``image_path``
+
+    The crop keeps the file type of ``image_path``; ``quality`` applies to
+    JPEG and WebP.
+    """
+    box = find_content_box(img, remove_sidebar=remove_sidebar)
+    if box is None:
+        print("No content found to crop")
+        return None
+
+    # Crop the image
+    cropped = img.crop(box)
+
+    # Save cropped image
+    cropped_path = cropped_name(image_path)
+    image_format = IMAGE_FORMATS.get(os.path.splitext(image_path)[1].lower(), 'PNG')
+    if image_format == 'PNG' or quality is None:
+        cropped.save(cropped_path, image_format)
+    else:
+        cropped.save(cropped_path, image_format, quality=quality)
+
+    print(f"Image cropped: {cropped_path}")
+    print(f"Original size: {img.size}, Cropped size: {cropped.size}")
+    return cropped_path
+
+
+def auto_crop_image(image_path, remove_sidebar=True):
+    """Auto crop image to remove sidebar and blank spaces"""
+    try:
+        img = Image.open(image_path)
+        return crop_to_file(img, image_path, remove_sidebar) or image_path
+    except Exception as e:
+        print(f"Error cropping image: {e}")
+        return image_path
+
+
+def crop_screenshot(png_bytes, image_path, keep_original=True, quality=None):
+    """Crop an in-memory screenshot and write the results to disk
+
+    The full screenshot is written to ``image_path`` when ``keep_original``
+    is set, or whenever it cannot be cropped. Returns the path of the file
+    to use for the row.
+    """
+    if keep_original:
+        with open(image_path, 'wb') as f:
+            f.write(png_bytes)
+    try:
+        img = Image.open(io.BytesIO(png_bytes))
+        cropped_path = crop_to_file(img, image_path, quality=quality)
+    except Exception as e:
+        print(f"Error cropping image: {e}")
+        cropped_path = None
+
+    if cropped_path is None and not keep_original:
+        with open(image_path, 'wb') as f:
+            f.write(png_bytes)
+    return cropped_path or image_path
+
+
+def recrop_directory(directory, workers=None, remove_sidebar=True):
+    """Re-crop every original screenshot in a directory using all cores
+
+    Files already ending in ``_cropped`` are skipped; their crops are
+    overwritten from the originals. Returns the cropped paths.
+    """
+    originals = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_FORMATS
+        and not os.path.splitext(name)[0].endswith('_cropped')
+    )
+    if not originals:
+        print(f"No screenshots found in {directory}")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Re-cropping {len(originals)} screenshots with {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        cropped = list(executor.map(auto_crop_image, originals,
+                                    [remove_sidebar] * len(originals), chunksize=4))
+    done = sum(1 for original, path in zip(originals, cropped) if path != original)
+    print(f"✅ {done}/{len(originals)} screenshots cropped")
+    return cropped
@@ -0,0 +1,79 @@
+"""
+Browser start-up profiles
+
+``window`` is the original start-up: a visible browser on a fresh temporary
+profile with pyppeteer's default flags, maximised to the screen. ``fast``
+starts headless on a Chromium profile directory kept between runs, so the
+HTTP cache still holds the site's static assets, with a trimmed set of
+pyppeteer's default flags.
+"""
+
+from dataclasses import dataclass, replace
+
+# Needed in containers and CI, whatever the profile
+BASE_ARGS = ('--no-sandbox', '--disable-setuid-sandbox')
+
+# pyppeteer defaults the fast profile leaves out: switches of features
+# Chromium no longer has, and of dialogs and services a run never meets
+TRIMMED_DEFAULT_ARGS = (
+    '--disable-browser-side-navigation',
+    '--disable-client-side-phishing-detection',
+    '--disable-hang-monitor',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-translate',
+    '--enable-automation',
+    '--safebrowsing-disable-auto-update',
+)
+
+# Added by the fast profile: no start-up checks or component downloads, and
+# background tabs keep their timers for the readiness probe
+FAST_ARGS = (
+    '--no-default-browser-check',
+    '--disable-component-update',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+)
+
+
+@dataclass(frozen=True)
+class LaunchProfile:
+    """How the browser is started"""
+    headless: bool = False
+    # Chromium profile kept between runs (HTTP cache, cookies); None for a temporary one
+    user_data_dir: str = None
+    # pyppeteer default flags left out, and flags added
+    dropped_args: tuple = ()
+    args: tuple = ()
+    # Resize the window to the screen once the browser is up
+    maximize: bool = True
+
+
+PROFILES = {
+    'window': LaunchProfile(),
+    'fast': LaunchProfile(headless=True, user_data_dir='chromium_profile',
+                          dropped_args=TRIMMED_DEFAULT_ARGS, args=FAST_ARGS, maximize=False),
+}
+
+
+def resolve_profile(name, headless=False, user_data_dir=None):
+    """Profile ``name`` with the command line's overrides applied"""
+    profile = PROFILES[name]
+    if headless:
+        profile = replace(profile, headless=True, maximize=False)
+    if user_data_dir:
+        profile = replace(profile, user_data_dir=user_data_dir)
+    return profile
+
+
+def launch_arguments(profile, browser_args=None):
+    """Keyword arguments of pyppeteer's ``launch`` for a profile"""
+    options = {
+        'headless': profile.headless,
+        'args': list(BASE_ARGS) + list(profile.args) + list(browser_args or []),
+    }
+    if profile.dropped_args:
+        options['ignoreDefaultArgs'] = list(profile.dropped_args)
+    if profile.user_data_dir:
+        options['userDataDir'] = profile.user_data_dir
+    return options
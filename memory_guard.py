@@ -0,0 +1,74 @@
+"""
+Memory guard for long runs
+
+Tabs that navigate row after row build up JS heap and renderer memory. The
+guard looks at a tab after each job: past ``max_heap_mb`` of used JS heap or
+``max_navigations`` jobs it is swapped for a fresh tab, and once the whole
+browser (all Chromium processes) grows past ``max_browser_rss_mb`` the pool
+restarts the browser. Cookies live in the browser, so a new tab keeps the
+session; a restarted browser gets the old one's session copied over.
+"""
+
+import time
+from dataclasses import dataclass
+
+from process_memory import process_tree_rss_mb
+
+
+@dataclass
+class MemoryLimits:
+    """Thresholds of the guard; None switches a check off"""
+    max_heap_mb: float = 512
+    max_navigations: int = 250
+    max_browser_rss_mb: float = None
+    # Seconds between two measurements of the browser's processes
+    rss_interval: float = 5.0
+
+
+class MemoryGuard:
+    """Decides when a tab is recycled or the browser restarted"""
+
+    def __init__(self, limits=None):
+        self.limits = limits or MemoryLimits()
+        self.recycled = {'heap': 0, 'navigations': 0}
+        self.restarts = 0
+        self.peak_heap_mb = 0.0
+        self.peak_browser_mb = 0.0
+        self._navigations = {}
+        self._rss_checked = 0.0
+
+    def forget(self, page):
+        self._navigations.pop(page, None)
+
+    async def check_tab(self, page):
+        """Reason to replace a tab after its latest job, or None"""
+        navigations = self._navigations.get(page, 0) + 1
+        self._navigations[page] = navigations
+        if self.limits.max_navigations and navigations >= self.limits.max_navigations:
+            return 'navigations'
+        if self.limits.max_heap_mb:
+            try:
+                heap_mb = (await page.metrics())['JSHeapUsedSize'] / (1024 * 1024)
+            except Exception:
+                return None
+            self.peak_heap_mb = max(self.peak_heap_mb, heap_mb)
+            if heap_mb > self.limits.max_heap_mb:
+                return 'heap'
+        return None
+
+    def browser_over_limit(self, browser):
+        """Whether the browser's processes use more than allowed (sampled)"""
+        if not self.limits.max_browser_rss_mb or browser.process is None:
+            return False
+        now = time.monotonic()
+        if now - self._rss_checked < self.limits.rss_interval:
+            return False
+        self._rss_checked = now
+        rss_mb = process_tree_rss_mb(browser.process.pid)
+        self.peak_browser_mb = max(self.peak_browser_mb, rss_mb)
+        return rss_mb > self.limits.max_browser_rss_mb
+
+    def summary(self):
+        recycled = ", ".join(f"{count} for {reason}" for reason, count in self.recycled.items())
+        return (f"tabs recycled: {recycled}; browser restarts: {self.restarts}; "
+                f"peak tab heap {self.peak_heap_mb:.0f} MiB, peak browser {self.peak_browser_mb:.0f} MiB")
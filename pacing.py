@@ -0,0 +1,133 @@
+"""
+Adaptive pacing of page navigations
+
+Navigations to a host are dispatched at a rate (navigations per second)
+that follows the server: after every window of navigations the rate grows
+by a fixed step while latency stays under the target and errors are rare,
+and is cut by a factor as soon as it does not (AIMD, as in TCP congestion
+control). The rate stays between a floor and a ceiling, and every change is
+printed to the run log.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from run_trace import percentile
+
+
+@dataclass
+class PacingLimits:
+    """Bounds and steps of the controller, rates in navigations per second"""
+    floor: float = 0.5
+    ceiling: float = 10.0
+    start: float = 2.0
+    # 90th percentile of a window's navigation times that still counts as healthy
+    target_latency_ms: float = 2000
+    increase: float = 1.0
+    decrease: float = 0.5
+    window: int = 10
+    max_error_rate: float = 0.1
+
+
+class HostPace:
+    """Rate and current window of one host"""
+
+    def __init__(self, host, rate):
+        self.host = host
+        self.rate = rate
+        self.next_slot = 0.0
+        self.latencies = []
+        self.errors = 0
+        self.waited = 0.0
+        self.navigations = 0
+
+
+class PacingController:
+    """Per-host AIMD rate limiter wrapped around navigations"""
+
+    def __init__(self, limits=None):
+        self.limits = limits or PacingLimits()
+        self.decisions = []
+        self._hosts = {}
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        pace = self._hosts.get(host)
+        if pace is None:
+            start = min(max(self.limits.start, self.limits.floor), self.limits.ceiling)
+            pace = self._hosts[host] = HostPace(host, start)
+        return pace
+
+    async def _wait_for_slot(self, pace):
+        now = time.monotonic()
+        slot = max(now, pace.next_slot)
+        pace.next_slot = slot + 1 / pace.rate
+        if slot > now:
+            pace.waited += slot - now
+            await asyncio.sleep(slot - now)
+
+    @asynccontextmanager
+    async def navigation(self, url):
+        """Wait for the host's next slot, then time the body as a navigation
+
+        Yields a dict; a body that sets ``status`` to an HTTP status of 429
+        or 5xx counts as an error, like one that raises.
+        """
+        pace = self._host(url)
+        await self._wait_for_slot(pace)
+        outcome = {}
+        started = time.monotonic()
+        failed = True
+        try:
+            yield outcome
+            status = outcome.get('status') or 200
+            failed = status == 429 or status >= 500
+        finally:
+            self._observe(pace, (time.monotonic() - started) * 1000, failed)
+
+    def _observe(self, pace, latency_ms, failed):
+        pace.navigations += 1
+        pace.latencies.append(latency_ms)
+        pace.errors += failed
+        limits = self.limits
+        # An error closes the window early, so the rate backs off at once
+        if len(pace.latencies) < limits.window and not pace.errors:
+            return
+        p90 = percentile(pace.latencies, 0.9)
+        error_rate = pace.errors / len(pace.latencies)
+        old_rate = pace.rate
+        if error_rate > limits.max_error_rate or p90 > limits.target_latency_ms:
+            pace.rate = max(limits.floor, pace.rate * limits.decrease)
+        else:
+            pace.rate = min(limits.ceiling, pace.rate + limits.increase)
+        if pace.rate != old_rate:
+            decision = {
+                'time': time.time(),
+                'host': pace.host,
+                'from': round(old_rate, 2),
+                'to': round(pace.rate, 2),
+                'p90_ms': round(p90),
+                'errors': pace.errors,
+                'navigations': len(pace.latencies),
+            }
+            self.decisions.append(decision)
+            arrow = '⏫' if pace.rate > old_rate else '⏬'
+            print(f"{arrow} Pacing {pace.host}: {old_rate:.2f} -> {pace.rate:.2f} nav/s "
+                  f"(p90 {p90:.0f} ms, {pace.errors}/{len(pace.latencies)} errors)")
+        pace.latencies = []
+        pace.errors = 0
+
+    def summary(self):
+        """Final rate, navigations and time spent waiting, per host"""
+        return {
+            host: {
+                'rate': round(pace.rate, 2),
+                'navigations': pace.navigations,
+                'waited_s': round(pace.waited, 1),
+                'changes': sum(1 for d in self.decisions if d['host'] == host),
+            }
+            for host, pace in self._hosts.items()
+        }
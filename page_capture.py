@@ -0,0 +1,102 @@
+"""
+Screenshots of a row's form page
+
+In ``clip`` mode the content region (the container of the course info rows
+and the form, right of any sidebar) is measured in the page and passed as
+the capture clip, so only that region is rendered and encoded and no pixel
+crop is needed afterwards. ``full`` mode captures the whole document for the
+crop pipeline, as before. Either mode can encode PNG, JPEG or WebP; quality
+applies to JPEG and WebP.
+"""
+
+import base64
+
+FORMATS = ('png', 'jpeg', 'webp')
+EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+# Space kept around the content, as in the pixel crop
+CLIP_PADDING = 20
+
+# Document-relative box of the form container, or null when there is none
+CONTENT_CLIP_JS = '''(padding) => {
+    const parts = Array.from(document.querySelectorAll('.row.border-gray-300'));
+    const form = document.querySelector('form');
+    if (form) parts.push(form);
+    if (!parts.length) return null;
+
+    // Closest element holding all of them, unless that is the whole page
+    let container = parts[0];
+    while (container && !parts.every(el => container.contains(el))) {
+        container = container.parentElement;
+    }
+    let left, top, right, bottom;
+    if (container && container !== document.body && container !== document.documentElement) {
+        ({left, top, right, bottom} = container.getBoundingClientRect());
+    } else {
+        const rects = parts.map(el => el.getBoundingClientRect());
+        left = Math.min(...rects.map(r => r.left));
+        top = Math.min(...rects.map(r => r.top));
+        right = Math.max(...rects.map(r => r.right));
+        bottom = Math.max(...rects.map(r => r.bottom));
+    }
+
+    // Keep a navigation sidebar on the left edge out of the clip
+    document.querySelectorAll('aside, nav, [class*="sidebar"]').forEach(el => {
+        const r = el.getBoundingClientRect();
+        if (r.left <= 1 && r.width > 0 && r.width < window.innerWidth * 0.35 && r.right < right) {
+            left = Math.max(left, r.right);
+        }
+    });
+
+    const pageWidth = document.documentElement.scrollWidth;
+    const pageHeight = document.documentElement.scrollHeight;
+    const x = Math.max(0, Math.floor(left + window.scrollX - padding));
+    const y = Math.max(0, Math.floor(top + window.scrollY - padding));
+    const width = Math.min(pageWidth, Math.ceil(right + window.scrollX + padding)) - x;
+    const height = Math.min(pageHeight, Math.ceil(bottom + window.scrollY + padding)) - y;
+    if (width <= 0 || height <= 0) return null;
+    return {x, y, width, height};
+}'''
+
+DOCUMENT_BOX_JS = '''() => ({
+    x: 0,
+    y: 0,
+    width: document.documentElement.scrollWidth,
+    height: document.documentElement.scrollHeight,
+})'''
+
+
+async def capture_clip(page, clip, image_format='png', quality=90):
+    """Capture a document-relative region, also below the viewport"""
+    options = {
+        'format': image_format,
+        'clip': dict(clip, scale=1),
+        'captureBeyondViewport': True,
+    }
+    if image_format != 'png':
+        options['quality'] = quality
+    result = await page._client.send('Page.captureScreenshot', options)
+    return base64.b64decode(result['data'])
+
+
+async def capture_row_screenshot(page, mode='full', image_format='png', quality=90, clip=None):
+    """Screenshot a form page; returns the image bytes and whether it is clipped
+
+    A page without a form container falls back to a full capture, which
+    the pipeline then crops from its pixels. A ``clip`` already measured
+    by CONTENT_CLIP_JS (in the readiness probe) is used as it is.
+    """
+    if mode == 'clip':
+        if clip is None:
+            clip = await page.evaluate(CONTENT_CLIP_JS, CLIP_PADDING)
+        if clip:
+            return await capture_clip(page, clip, image_format, quality), True
+        print("No form container found, capturing the full page")
+
+    if image_format == 'webp':
+        # page.screenshot only encodes PNG and JPEG
+        return await capture_clip(page, await page.evaluate(DOCUMENT_BOX_JS), image_format, quality), False
+    options = {'fullPage': True, 'type': image_format}
+    if image_format == 'jpeg':
+        options['quality'] = quality
+    return await page.screenshot(options), False
@@ -0,0 +1,351 @@
+"""
+Event-driven page readiness for the SATU automation
+
+Instead of fixed sleeps, a page counts as settled once its network has been
+quiet, the DOM has stopped mutating and (depending on the profile) images and
+web fonts have finished loading. Each wait is timed so the run can report how
+long pages actually took to become ready.
+
+An engine given page functions (link discovery, form extraction, ...)
+registers them with the readiness checks as one script on every new
+document. ``probe`` then waits, scrolls and runs the functions inside the
+page with a ``Runtime.evaluate``, where ``settle`` and the separate
+scripts send a ``waitForFunction``, scroll step and ``evaluate`` each.
+bench_pipeline's tabs-4 and separate-scripts modes record the CDP traffic
+per row of both.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ReadinessProfile:
+    """How long a page must be quiet, and what it must have loaded, to be settled"""
+    dom_quiet_ms: int = 300
+    network_quiet_ms: int = 300
+    wait_images: bool = True
+    wait_fonts: bool = False
+    # Scroll to the bottom until the page stops growing (lazy-loaded rows)
+    scroll: bool = False
+    max_scroll_passes: int = 20
+    timeout_ms: int = 15000
+    # In-flight requests older than this (beacons, long polling) are ignored
+    stale_request_ms: int = 5000
+    poll_ms: int = 50
+
+
+PROFILES = {
+    # Course list pages: lazy content below the fold, images must be in
+    'list': ReadinessProfile(dom_quiet_ms=300, network_quiet_ms=300, scroll=True),
+    # "Isi" input form pages: form fields are extracted and screenshotted
+    'form': ReadinessProfile(dom_quiet_ms=200, network_quiet_ms=250, wait_fonts=True, timeout_ms=10000),
+}
+
+OBSERVER_JS = '''() => {
+    if (window.__satuReadiness) return;
+    const state = window.__satuReadiness = { lastMutation: performance.now() };
+    new MutationObserver(() => { state.lastMutation = performance.now(); })
+        .observe(document, { childList: true, subtree: true, attributes: true, characterData: true });
+}'''
+
+SETTLED_JS = '''(quietMs, waitImages, waitFonts) => {
+    if (document.readyState !== 'complete') return false;
+    if (!window.__satuReadiness) {
+        // The page was loaded before the observer was registered
+        (''' + OBSERVER_JS + ''')();
+        return false;
+    }
+    if (performance.now() - window.__satuReadiness.lastMutation < quietMs) return false;
+    if (waitImages && !Array.from(document.images).every(img => img.complete)) return false;
+    if (waitFonts && document.fonts && document.fonts.status !== 'loaded') return false;
+    return true;
+}'''
+
+# Readiness checks and page functions, registered once per document
+PROBE_JS = '''() => {
+    if (window.__satu) return;
+    if (!window.__satuReadiness) {
+        (''' + OBSERVER_JS + ''')();
+    }
+    const state = window.__satuReadiness;
+    const functions = {/*FUNCTIONS*/};
+
+    const isSettled = (o) => {
+        if (document.readyState !== 'complete') return false;
+        if (performance.now() - state.lastMutation < o.quietMs) return false;
+        if (o.waitImages && !Array.from(document.images).every(img => img.complete)) return false;
+        if (o.waitFonts && document.fonts && document.fonts.status !== 'loaded') return false;
+        return true;
+    };
+    const waitSettled = async (o, deadline) => {
+        while (!isSettled(o)) {
+            if (performance.now() >= deadline) return false;
+            await new Promise(resolve => setTimeout(resolve, o.pollMs));
+        }
+        return true;
+    };
+
+    window.__satu = {
+        async probe(o) {
+            const deadline = performance.now() + o.timeoutMs;
+            let settled = o.wait ? await waitSettled(o, deadline) : isSettled(o);
+            let scrollPasses = 0;
+            if (settled && o.scroll) {
+                // Scroll to the bottom until the page stops growing
+                let height = null;
+                while (settled && scrollPasses < o.maxScrollPasses) {
+                    const newHeight = document.documentElement.scrollHeight;
+                    window.scrollTo(0, newHeight);
+                    if (newHeight === height) break;
+                    height = newHeight;
+                    scrollPasses++;
+                    settled = await waitSettled(o, deadline);
+                }
+                if (settled) window.scrollTo(0, 0);
+            }
+            const results = {};
+            for (const [name, args] of Object.entries(o.calls)) {
+                results[name] = functions[name](...args);
+            }
+            return {settled, scrollPasses, results};
+        },
+    };
+}'''
+
+
+def probe_script(functions):
+    """PROBE_JS with the given name -> function source page functions"""
+    entries = ', '.join(f"{json.dumps(name)}: ({source})" for name, source in functions.items())
+    return PROBE_JS.replace('/*FUNCTIONS*/', entries)
+
+
+SCROLL_STEP_JS = '''() => {
+    const height = document.documentElement.scrollHeight;
+    window.scrollTo(0, height);
+    return height;
+}'''
+
+
+class NetworkTracker:
+    """Track the in-flight requests of one page from its request events"""
+
+    def __init__(self, page):
+        self.pending = {}
+        self.last_activity = time.monotonic()
+        page.on('request', self._on_start)
+        page.on('requestfinished', self._on_end)
+        page.on('requestfailed', self._on_end)
+
+    def _on_start(self, request):
+        self.pending[request] = self.last_activity = time.monotonic()
+
+    def _on_end(self, request):
+        self.pending.pop(request, None)
+        self.last_activity = time.monotonic()
+
+    def is_idle(self, quiet_ms, stale_ms):
+        now = time.monotonic()
+        if any((now - started) * 1000 < stale_ms for started in self.pending.values()):
+            return False
+        return (now - self.last_activity) * 1000 >= quiet_ms
+
+    async def wait_idle(self, quiet_ms, stale_ms, poll_ms, deadline):
+        while not self.is_idle(quiet_ms, stale_ms):
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(poll_ms / 1000)
+
+
+class ProbeError(Exception):
+    """A page function failed inside the probe"""
+
+
+def _raise_exception(response):
+    """Raise ProbeError for a ``Runtime.evaluate`` response that threw"""
+    if 'exceptionDetails' in response:
+        details = response['exceptionDetails']
+        message = (details.get('exception') or {}).get('description') or details.get('text')
+        raise ProbeError(message)
+
+
+class ReadinessEngine:
+    """Wait for pages to settle on real signals and keep per-profile timings
+
+    ``functions`` (name -> JS function source) are made available to
+    ``probe``; without them pages are settled with separate calls.
+    """
+
+    def __init__(self, profiles=None, functions=None):
+        self.profiles = dict(PROFILES, **(profiles or {}))
+        self.functions = dict(functions or {})
+        self.timings = {}
+        self._trackers = {}
+        self._script = probe_script(self.functions) if self.functions else OBSERVER_JS
+
+    @property
+    def probing(self):
+        return bool(self.functions)
+
+    async def attach(self, page):
+        """Start tracking a page; call once per tab before it navigates"""
+        self._trackers[page] = NetworkTracker(page)
+        page.on('close', lambda: self._trackers.pop(page, None))
+        await page.evaluateOnNewDocument(self._script)
+
+    async def _wait_settled(self, page, profile, deadline):
+        tracker = self._trackers.get(page)
+        while True:
+            remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+            await page.waitForFunction(
+                SETTLED_JS, {'polling': profile.poll_ms, 'timeout': remaining_ms},
+                profile.dom_quiet_ms, profile.wait_images, profile.wait_fonts,
+            )
+            if tracker is None:
+                return
+            await tracker.wait_idle(profile.network_quiet_ms, profile.stale_request_ms,
+                                    profile.poll_ms, deadline)
+            # Requests that just finished may have changed the DOM again
+            if await page.evaluate(SETTLED_JS, profile.dom_quiet_ms,
+                                   profile.wait_images, profile.wait_fonts):
+                return
+
+    async def _probe_once(self, page, options, deadline):
+        """One ``Runtime.evaluate`` of the page's probe, installing it if missing"""
+        expression = f"window.__satu ? window.__satu.probe({json.dumps(options)}) : null"
+        installed = False
+        while True:
+            try:
+                response = await page._client.send('Runtime.evaluate', {
+                    'expression': expression,
+                    'awaitPromise': True,
+                    'returnByValue': True,
+                })
+            except Exception as e:
+                # The document was replaced while the probe ran
+                if 'context' not in str(e).lower() or time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(options['pollMs'] / 1000)
+                continue
+            _raise_exception(response)
+            result = response['result'].get('value')
+            if result is not None:
+                return result
+            if installed:
+                # Replaced by a new document since the install, or the install did not stick
+                if time.monotonic() >= deadline:
+                    raise ProbeError("Probe script is missing from the page")
+                await asyncio.sleep(options['pollMs'] / 1000)
+            # Loaded before the script was registered (or not a page of ours)
+            install = await page._client.send('Runtime.evaluate', {'expression': f"({self._script})()"})
+            _raise_exception(install)
+            installed = True
+
+    async def probe(self, page, profile_name, **calls):
+        """Settle a page and run page functions on it in one go
+
+        ``calls`` maps the names of the engine's functions to their
+        arguments. The page waits and scrolls by itself, and is probed
+        again only when requests were still in flight once its DOM settled. Like ``settle`` it never raises on
+        timeout. Returns the timing record and the functions' results.
+        """
+        profile = self.profiles[profile_name]
+        started = time.monotonic()
+        deadline = started + profile.timeout_ms / 1000
+        tracker = self._trackers.get(page)
+        options = {
+            'wait': True,
+            'quietMs': profile.dom_quiet_ms,
+            'waitImages': profile.wait_images,
+            'waitFonts': profile.wait_fonts,
+            'scroll': profile.scroll,
+            'maxScrollPasses': profile.max_scroll_passes,
+            'pollMs': profile.poll_ms,
+            'calls': {name: list(args) for name, args in calls.items()},
+        }
+        probes = 0
+        scroll_passes = 0
+        timed_out = False
+        while True:
+            remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+            result = await self._probe_once(page, dict(options, timeoutMs=remaining_ms), deadline)
+            probes += 1
+            scroll_passes += result['scrollPasses']
+            if not result['settled']:
+                timed_out = True
+                break
+            if tracker is None or tracker.is_idle(profile.network_quiet_ms, profile.stale_request_ms):
+                break
+            try:
+                await tracker.wait_idle(profile.network_quiet_ms, profile.stale_request_ms,
+                                        profile.poll_ms, deadline)
+            except asyncio.TimeoutError:
+                # Use the page as it is now
+                timed_out = True
+                result = await self._probe_once(page, dict(options, wait=False, scroll=False, timeoutMs=0),
+                                                deadline)
+                probes += 1
+                break
+
+        record = self._record(profile_name, started, scroll_passes, timed_out)
+        record['probes'] = probes
+        return record, result['results']
+
+    async def settle(self, page, profile_name):
+        """Wait until the page is settled for the given profile
+
+        Never raises on timeout: the page is used as it is and the wait is
+        reported as timed out. Returns the timing record of the wait.
+        """
+        profile = self.profiles[profile_name]
+        started = time.monotonic()
+        deadline = started + profile.timeout_ms / 1000
+        scroll_passes = 0
+        timed_out = False
+        try:
+            await self._wait_settled(page, profile, deadline)
+            if profile.scroll:
+                height = None
+                while scroll_passes < profile.max_scroll_passes:
+                    new_height = await page.evaluate(SCROLL_STEP_JS)
+                    if new_height == height:
+                        break
+                    height = new_height
+                    scroll_passes += 1
+                    await self._wait_settled(page, profile, deadline)
+                await page.evaluate('() => window.scrollTo(0, 0)')
+        except asyncio.TimeoutError:
+            # Also catches pyppeteer's TimeoutError from waitForFunction
+            timed_out = True
+
+        return self._record(profile_name, started, scroll_passes, timed_out)
+
+    def _record(self, profile_name, started, scroll_passes, timed_out):
+        waited_ms = (time.monotonic() - started) * 1000
+        record = {
+            'profile': profile_name,
+            'waited_ms': round(waited_ms, 1),
+            'scroll_passes': scroll_passes,
+            'timed_out': timed_out,
+        }
+        self.timings.setdefault(profile_name, []).append(record)
+        if timed_out:
+            print(f"⚠️ Page not settled after {waited_ms:.0f} ms ({profile_name}), continuing")
+        else:
+            print(f"Page settled in {waited_ms:.0f} ms ({profile_name})")
+        return record
+
+    def summary(self):
+        """Count, mean, max and timeouts of the waits, per profile"""
+        stats = {}
+        for name, records in self.timings.items():
+            waits = [r['waited_ms'] for r in records]
+            stats[name] = {
+                'count': len(waits),
+                'mean_ms': round(sum(waits) / len(waits), 1),
+                'max_ms': max(waits),
+                'timeouts': sum(1 for r in records if r['timed_out']),
+            }
+        return stats
@@ -0,0 +1,43 @@
+"""
+Resident memory of a process tree
+
+Used to watch Chromium (a browser process and its renderers) and the shard
+workers. psutil is used when installed, otherwise /proc is read (Linux).
+"""
+
+import os
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants (Chromium)"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes if p.is_running()) / (1024 * 1024)
+        except psutil.Error:
+            return 0.0
+
+    # Without psutil, walk /proc (Linux)
+    children = {}
+    rss_pages = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            rss_pages[int(entry)] = int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_pages.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
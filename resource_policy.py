@@ -0,0 +1,192 @@
+"""
+Request interception policy for the SATU automation
+
+Each tab is in a phase ("discovery", "extract", "capture", or none during the
+login) and every request is allowed, blocked or stubbed according to that
+phase's rules. Blocked and stubbed requests are counted, together with the
+bytes they would have cost when the same URL has been seen loading before.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+# Third-party hosts that never matter for extraction or screenshots
+TRACKER_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'connect.facebook.net',
+    'hotjar.com',
+    'clarity.ms',
+)
+
+STUB_BODIES = {
+    'script': ('application/javascript', ''),
+    'stylesheet': ('text/css', ''),
+    'xhr': ('application/json', '{}'),
+    'fetch': ('application/json', '{}'),
+}
+
+
+@dataclass(frozen=True)
+class PhaseRules:
+    """What a tab may load while it is in one phase"""
+    # None allows every resource type
+    allow_types: frozenset = None
+    block_domains: tuple = ()
+    # Requests to these hosts get an empty 200 instead of a network error
+    stub_domains: tuple = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        allow_types = data.get('allow_types')
+        return cls(
+            allow_types=frozenset(allow_types) if allow_types is not None else None,
+            block_domains=tuple(data.get('block_domains', ())),
+            stub_domains=tuple(data.get('stub_domains', ())),
+        )
+
+
+DEFAULT_PHASES = {
+    # List pages: only the HTML and what builds the table ("Isi" links).
+    # Scripts stay allowed because the XHRs are issued by them.
+    'discovery': PhaseRules(
+        allow_types=frozenset({'document', 'xhr', 'fetch', 'script'}),
+        stub_domains=TRACKER_DOMAINS,
+    ),
+    # Form pages read without a screenshot
+    'extract': PhaseRules(
+        allow_types=frozenset({'document', 'xhr', 'fetch', 'script'}),
+        stub_domains=TRACKER_DOMAINS,
+    ),
+    # Form pages that are screenshotted: styles, images and fonts must load
+    'capture': PhaseRules(stub_domains=TRACKER_DOMAINS),
+}
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+@dataclass
+class PolicyStats:
+    """Requests and known bytes kept off the wire by the policy"""
+    allowed: int = 0
+    blocked: int = 0
+    stubbed: int = 0
+    bytes_saved: int = 0
+    unknown_size: int = 0
+    by_type: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            'allowed': self.allowed,
+            'blocked': self.blocked,
+            'stubbed': self.stubbed,
+            'bytes_saved': self.bytes_saved,
+            'unknown_size': self.unknown_size,
+            'by_type': dict(self.by_type),
+        }
+
+
+class ResourcePolicy:
+    """Intercept the requests of every attached tab and apply its phase rules"""
+
+    def __init__(self, phases=None):
+        self.phases = dict(DEFAULT_PHASES, **(phases or {}))
+        self.stats = PolicyStats()
+        self._phase = {}
+        # Response sizes seen so far, used to price later blocked requests
+        self._sizes = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """Build a policy whose phases override the defaults from a JSON file
+
+        The file maps phase names to ``allow_types``, ``block_domains`` and
+        ``stub_domains`` lists, e.g. ``{"capture": {"block_domains": [...]}}``.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls({name: PhaseRules.from_dict(rules) for name, rules in data.items()})
+
+    async def attach(self, page):
+        """Turn on request interception for a tab; it starts without a phase"""
+        self._phase[page] = None
+        page.on('close', lambda: self._phase.pop(page, None))
+        page.on('request', lambda request: asyncio.ensure_future(self._handle(page, request)))
+        page.on('response', self._on_response)
+        await page.setRequestInterception(True)
+        # Interception turns the HTTP cache off; keep it, so a persistent
+        # profile serves static assets from disk. Cache hits skip the
+        # interception (and the phase rules), but cost no network either.
+        await page.setCacheEnabled(True)
+
+    def current_phase(self, page):
+        return self._phase.get(page)
+
+    def set_phase(self, page, phase):
+        """Switch the rules used for the tab's next requests"""
+        if phase is not None and phase not in self.phases:
+            raise ValueError(f"Unknown resource phase: {phase}")
+        self._phase[page] = phase
+
+    def _decide(self, phase, request):
+        rules = self.phases.get(phase)
+        if rules is None:
+            return 'allow'
+        host = urlsplit(request.url).hostname or ''
+        if _host_matches(host, rules.stub_domains):
+            return 'stub'
+        if _host_matches(host, rules.block_domains):
+            return 'block'
+        if rules.allow_types is not None and request.resourceType not in rules.allow_types:
+            return 'block'
+        return 'allow'
+
+    def _count_saved(self, request):
+        stats = self.stats
+        stats.by_type[request.resourceType] = stats.by_type.get(request.resourceType, 0) + 1
+        size = self._sizes.get(request.url)
+        if size is None:
+            stats.unknown_size += 1
+        else:
+            stats.bytes_saved += size
+
+    async def _handle(self, page, request):
+        decision = self._decide(self._phase.get(page), request)
+        try:
+            if decision == 'allow':
+                self.stats.allowed += 1
+                await request.continue_()
+            elif decision == 'stub':
+                self.stats.stubbed += 1
+                self._count_saved(request)
+                content_type, body = STUB_BODIES.get(request.resourceType, ('text/plain', ''))
+                await request.respond({'status': 200, 'contentType': content_type, 'body': body})
+            else:
+                self.stats.blocked += 1
+                self._count_saved(request)
+                await request.abort('blockedbyclient')
+        except Exception as e:
+            # The request may already be gone (tab closed, navigation away)
+            print(f"Could not {decision} {request.url}: {e}")
+
+    def _on_response(self, response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            self._sizes[response.url] = int(length)
+
+    def summary(self):
+        """Printable line with the requests and bytes saved so far"""
+        stats = self.stats
+        saved = stats.blocked + stats.stubbed
+        line = (f"{saved} request(s) blocked/stubbed, {stats.allowed} allowed, "
+                f"{stats.bytes_saved / 1024:.1f} KiB saved")
+        if stats.unknown_size:
+            line += f" (+{stats.unknown_size} request(s) of unknown size)"
+        return line
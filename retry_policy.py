@@ -0,0 +1,127 @@
+"""
+Retries of failed pages
+
+Each step of a page (navigation, settling, extraction, screenshot) has its
+own time limit, so a page that hangs fails on its own instead of stalling
+its tab. A list page or row that fails is tried again after an exponential
+backoff with full jitter, during which its tab serves other pages; a page
+that lands on the login form logs the run in again first. Pages that still
+fail after their last attempt end up on a dead-letter list, written next to
+the run's combined JSON.
+"""
+
+import asyncio
+import json
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+
+def failures_file(run_id):
+    """Name of a run's failure summary, next to its combined JSON"""
+    return f"failures_{run_id}.json"
+
+
+class StepTimeout(asyncio.TimeoutError):
+    """A step of a page took longer than its limit"""
+
+    def __init__(self, step, seconds):
+        super().__init__(f"{step} step took longer than {seconds:g} s")
+        self.step = step
+        self.seconds = seconds
+
+
+@dataclass
+class StepTimeouts:
+    """Limits of the steps of a page in seconds, 0 or None for no limit"""
+    navigate: float = 30.0
+    settle: float = 30.0
+    extract: float = 20.0
+    screenshot: float = 60.0
+
+    async def run(self, step, awaitable):
+        """Await ``awaitable``, raising StepTimeout once the step's limit passed"""
+        seconds = getattr(self, step)
+        if not seconds:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, seconds)
+        except asyncio.TimeoutError as e:
+            # Only the limit itself, not pyppeteer's own timeouts inside the step
+            if type(e) is not asyncio.TimeoutError:
+                raise
+            raise StepTimeout(step, seconds) from None
+
+
+@dataclass
+class RetryPolicy:
+    """Attempts per row and per list page, and the backoff between them"""
+    row_attempts: int = 3
+    list_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def attempts(self, kind):
+        return self.list_attempts if kind == 'list' else self.row_attempts
+
+    def backoff(self, attempt):
+        """Seconds to wait after failed attempt number ``attempt`` (from 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+@dataclass
+class DeadLetter:
+    """A page that failed every attempt"""
+    kind: str
+    url_index: int
+    url: str
+    attempts: int
+    error_type: str
+    error: str
+    row_number: int = None
+    link: str = None
+    # Step that timed out, if that is how the last attempt failed
+    step: str = None
+
+
+class FailureLog:
+    """Failed attempts, retries and dead letters of one run"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.failed_attempts = 0
+        self.recovered = 0
+        self.relogins = 0
+        self.dead_letters = []
+
+    def add_dead_letter(self, kind, url_index, url, error, attempts, row_number=None, link=None):
+        letter = DeadLetter(kind, url_index, url, attempts, type(error).__name__, str(error),
+                            row_number, link, getattr(error, 'step', None))
+        self.dead_letters.append(letter)
+        return letter
+
+    def absorb(self, summary):
+        """Add the counts and dead letters of another log's written summary"""
+        self.failed_attempts += summary['failed_attempts']
+        self.recovered += summary['recovered']
+        self.relogins += summary['relogins']
+        self.dead_letters.extend(DeadLetter(**letter) for letter in summary['dead_letters'])
+
+    @property
+    def empty(self):
+        return not self.failed_attempts and not self.relogins
+
+    def summary(self):
+        return {
+            'run_id': self.run_id,
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'failed_attempts': self.failed_attempts,
+            'recovered': self.recovered,
+            'relogins': self.relogins,
+            'dead_letters': [asdict(letter) for letter in self.dead_letters],
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        return path
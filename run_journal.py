@@ -0,0 +1,144 @@
+"""
+Streaming output and checkpoints of a run
+
+Every row is appended to ``form_data_<run>.jsonl`` as soon as it is
+extracted, and to ``checkpoint_<run>.jsonl`` once its screenshot is saved.
+A resumed run reads the checkpoint and skips what is already done. The
+combined JSON is written from the JSONL file record by record, so the
+form data of a run is never held in memory all at once.
+"""
+
+import glob
+import json
+import os
+import re
+import textwrap
+
+RUN_ID_PATTERN = re.compile(r'checkpoint_(\d{8}_\d{6})\.jsonl$')
+
+
+def _read_jsonl(path):
+    """Yield the records of a JSONL file, skipping a torn last line"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def latest_run_id(output_dir):
+    """Run id of the most recent checkpoint in a directory, or None"""
+    run_ids = []
+    for path in glob.glob(os.path.join(output_dir, 'checkpoint_*.jsonl')):
+        match = RUN_ID_PATTERN.search(os.path.basename(path))
+        if match:
+            run_ids.append(match.group(1))
+    return max(run_ids) if run_ids else None
+
+
+def iter_records(records_path):
+    """Yield the rows of a JSONL record file ordered by url_index/row_number
+
+    Only an index of line offsets is kept in memory; a row extracted more
+    than once (an interrupted attempt) yields its latest record.
+    """
+    offsets = {}
+    with open(records_path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            key = (record['original_url'], record['row_number'])
+            offsets[key] = (record['url_index'], record['row_number'], offset)
+
+    with open(records_path, 'rb') as records:
+        for _, _, offset in sorted(offsets.values()):
+            records.seek(offset)
+            yield json.loads(records.readline())
+
+
+class RunJournal:
+    """JSONL record stream and checkpoint of (url, row) pairs for one run"""
+
+    def __init__(self, output_dir, run_id):
+        self.output_dir = output_dir
+        self.run_id = run_id
+        self.records_path = os.path.join(output_dir, f"form_data_{run_id}.jsonl")
+        self.checkpoint_path = os.path.join(output_dir, f"checkpoint_{run_id}.jsonl")
+        self.done = {}
+        self.lists = {}
+        for entry in _read_jsonl(self.checkpoint_path):
+            if 'list' in entry:
+                self.lists[entry['list']] = entry['rows']
+            else:
+                self.done[(entry['url'], entry['row'])] = entry
+        self.resumed = bool(self.done or self.lists)
+        self._records = open(self.records_path, 'a', encoding='utf-8')
+        self._checkpoint = open(self.checkpoint_path, 'a', encoding='utf-8')
+
+    def _append(self, f, entry):
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        f.flush()
+
+    def is_done(self, url, row_number):
+        return (url, row_number) in self.done
+
+    def list_done(self, url):
+        """Whether every row of a list page seen in an earlier attempt is done"""
+        rows = self.lists.get(url)
+        return rows is not None and all(self.is_done(url, row) for row in rows)
+
+    def add_list(self, url, row_numbers):
+        """Remember which rows a list page has, so it can be skipped on resume"""
+        if self.lists.get(url) != row_numbers:
+            self.lists[url] = row_numbers
+            self._append(self._checkpoint, {'list': url, 'rows': row_numbers})
+
+    def add_row(self, form_data):
+        """Append an extracted row to the JSONL file"""
+        self._append(self._records, form_data)
+
+    def complete_row(self, url, row_number, url_index, screenshot=None):
+        """Checkpoint a row once everything for it is on disk"""
+        entry = {'url': url, 'row': row_number, 'url_index': url_index, 'screenshot': screenshot}
+        self.done[(url, row_number)] = entry
+        self._append(self._checkpoint, entry)
+
+    def screenshot_files(self):
+        """Screenshots of every completed row, this attempt and earlier ones
+
+        Rows that reused another row's page share its screenshot, which is
+        listed once.
+        """
+        entries = sorted(self.done.values(), key=lambda e: (e['url_index'], e['row']))
+        return list(dict.fromkeys(e['screenshot'] for e in entries if e['screenshot']))
+
+    def write_combined(self, path):
+        """Write the rows as one JSON array, ordered by url_index/row_number
+
+        Records are streamed from the JSONL file (see ``iter_records``).
+        """
+        self._records.flush()
+        count = 0
+        with open(path, 'w', encoding='utf-8') as out:
+            out.write('[')
+            for record in iter_records(self.records_path):
+                # Same layout as json.dump(rows, indent=2)
+                out.write(',\n' if count else '\n')
+                out.write(textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  '))
+                count += 1
+            out.write('\n]' if count else ']')
+        return count
+
+    def close(self):
+        self._records.close()
+        self._checkpoint.close()
@@ -0,0 +1,325 @@
+"""
+PDF and HTML report of a run
+
+Each row of a run gets a PDF page with its course info and form data above
+its cropped screenshot; a tall screenshot continues over as many pages as
+it needs. Rows are read from the run's JSONL records one at a time and
+their screenshots are cut into page-high strips that are downscaled and
+JPEG-encoded one by one, straight into the PDF file. An HTML index with the
+same fields, the screenshot and a link to the row's PDF page is written
+alongside. Only one screenshot is open at a time and nothing of a finished
+row is kept, so memory stays flat however many rows the run has. Each
+screenshot is decoded whole before its first strip is cut (Pillow has no
+partial PNG decode); the strips only avoid full-size converted copies.
+"""
+
+import html
+import io
+import os
+import textwrap
+
+from PIL import Image
+
+from run_journal import _read_jsonl, iter_records
+
+# A4 in points, with the margin kept free on every side
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 36
+FONT_SIZE = 9
+LEADING = 11
+TITLE_SIZE = 12
+# Characters per line of a field, for Helvetica at FONT_SIZE
+WRAP_WIDTH = 105
+# Less room than this under the fields starts the screenshot on a new page
+MIN_IMAGE_HEIGHT = 120
+
+# Row bookkeeping that is shown in the title, not as a field
+HIDDEN_FIELDS = {'url_index', 'row_number', 'original_url', 'csrf_token', 'course_info', 'references'}
+
+
+def _pdf_text(text):
+    """PDF string literal in WinAnsi, the encoding of the standard fonts"""
+    data = str(text).encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class PdfWriter:
+    """Minimal PDF writer that streams pages to the file as they are added
+
+    Only the byte offsets of the objects and the page object numbers are
+    kept; the page tree and cross-reference table are written on close.
+    """
+
+    PAGES = 1
+    CATALOG = 2
+    FONT = 3
+    BOLD_FONT = 4
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = []
+        self._offsets = {}
+        self._next_object = 5
+        self._file = open(path, 'wb')
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._write_object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                      b'/Encoding /WinAnsiEncoding >>')
+        self._write_object(self.BOLD_FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                           b'/Encoding /WinAnsiEncoding >>')
+
+    def _new_object(self):
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def _write_object(self, number, body, stream=None):
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode())
+        self._file.write(body)
+        if stream is not None:
+            self._file.write(b'\nstream\n')
+            self._file.write(stream)
+            self._file.write(b'\nendstream')
+        self._file.write(b'\nendobj\n')
+
+    def add_image(self, jpeg_bytes, width, height):
+        """Write a JPEG as an image object; returns its object number"""
+        number = self._new_object()
+        self._write_object(number, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg_bytes)} >>"
+        ).encode(), jpeg_bytes)
+        return number
+
+    def add_page(self, content, images=()):
+        """Write a page drawing ``content`` (operators) with the given image objects"""
+        content_number = self._new_object()
+        self._write_object(content_number, f"<< /Length {len(content)} >>".encode(), content)
+        xobjects = ' '.join(f"/Im{i} {number} 0 R" for i, number in enumerate(images))
+        page_number = self._new_object()
+        self._write_object(page_number, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {self.FONT} 0 R /F2 {self.BOLD_FONT} 0 R >> "
+            f"/XObject << {xobjects} >> >> /Contents {content_number} 0 R >>"
+        ).encode())
+        self.pages.append(page_number)
+        return len(self.pages)
+
+    def close(self):
+        kids = ' '.join(f"{number} 0 R" for number in self.pages)
+        self._write_object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._write_object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+        xref = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_object}\n".encode())
+        self._file.write(b'0000000000 65535 f \n')
+        for number in range(1, self._next_object):
+            self._file.write(f"{self._offsets[number]:010d} 00000 n \n".encode())
+        self._file.write(f"trailer\n<< /Size {self._next_object} /Root {self.CATALOG} 0 R >>\n"
+                         f"startxref\n{xref}\n%%EOF\n".encode())
+        self._file.close()
+
+
+class PageText:
+    """Text lines of a page, top-down from the top margin"""
+
+    def __init__(self):
+        self.y = PAGE_HEIGHT - MARGIN
+        self.operators = []
+
+    def line(self, text, bold=False, size=FONT_SIZE):
+        self.y -= LEADING if size == FONT_SIZE else size + 4
+        font = b'/F2' if bold else b'/F1'
+        self.operators.append(b'BT %s %d Tf %.2f %.2f Td %s Tj ET'
+                              % (font, size, MARGIN, self.y, _pdf_text(text)))
+
+    def content(self):
+        return b'\n'.join(self.operators)
+
+
+def field_lines(record):
+    """(label, value) lines of a row's course info and form data"""
+    def value_text(value):
+        if isinstance(value, dict):
+            if 'text' in value:
+                return f"{value.get('text', '')} ({value.get('value', '')})"
+            return ', '.join(f"{k}={value_text(v)}" for k, v in value.items())
+        if isinstance(value, list):
+            return ', '.join(value_text(v) for v in value)
+        return '' if value is None else str(value)
+
+    lines = []
+    for key, value in (record.get('course_info') or {}).items():
+        lines.append((key, value_text(value)))
+    for key, value in record.items():
+        if key not in HIDDEN_FIELDS:
+            lines.append((key, value_text(value)))
+    return lines
+
+
+def row_title(record):
+    return f"URL {record.get('url_index')} / row {record.get('row_number')}"
+
+
+def _flatten(strip):
+    """RGB copy of a strip, transparency on white"""
+    if strip.mode in ('RGBA', 'LA', 'PA') or 'transparency' in strip.info:
+        strip = strip.convert('RGBA')
+        background = Image.new('RGB', strip.size, 'white')
+        background.paste(strip, mask=strip.getchannel('A'))
+        return background
+    return strip.convert('RGB')
+
+
+def screenshot_strips(path, width_pt, first_height_pt, page_height_pt, dpi, quality):
+    """Yield (jpeg bytes, pixel width, pixel height, height in points) strips
+
+    The first strip fits ``first_height_pt`` (below the row's fields), the
+    others a whole page. Each strip is cut, downscaled to ``dpi`` and
+    encoded before the next one is made.
+    """
+    with Image.open(path) as img:
+        target_width = min(img.width, round(width_pt / 72 * dpi))
+        if img.format == 'JPEG':
+            # Let the decoder scale down by a power of two
+            img.draft('RGB', (target_width, round(img.height * target_width / img.width)))
+        points_per_pixel = width_pt / img.width
+        top = 0
+        available = first_height_pt
+        while top < img.height:
+            rows = max(1, min(img.height - top, int(available / points_per_pixel)))
+            strip = _flatten(img.crop((0, top, img.width, top + rows)))
+            size = (target_width, max(1, round(rows * target_width / img.width)))
+            if size != strip.size:
+                strip = strip.resize(size, Image.LANCZOS, reducing_gap=2.0)
+            out = io.BytesIO()
+            strip.save(out, 'JPEG', quality=quality, optimize=True)
+            yield out.getvalue(), size[0], size[1], rows * points_per_pixel
+            top += rows
+            available = page_height_pt
+
+
+class HtmlIndex:
+    """HTML index of the report, written section by section"""
+
+    def __init__(self, path, title, pdf_name):
+        self.path = path
+        self.pdf_name = pdf_name
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(
+            f"<!DOCTYPE html>\n<html lang=\"id\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{html.escape(title)}</title>\n<style>\n"
+            "body { font-family: sans-serif; margin: 2em; }\n"
+            "section { border-top: 1px solid #ccc; padding: 1em 0; }\n"
+            "dl { display: grid; grid-template-columns: max-content 1fr; gap: .2em 1em; }\n"
+            "dt { font-weight: bold; }\n"
+            "img { max-width: 100%; border: 1px solid #eee; }\n"
+            f"</style>\n</head>\n<body>\n<h1>{html.escape(title)}</h1>\n"
+            f"<p><a href=\"{html.escape(pdf_name)}\">{html.escape(pdf_name)}</a></p>\n"
+        )
+
+    def add_row(self, record, fields, screenshot, page):
+        anchor = f"url-{record.get('url_index')}-row-{record.get('row_number')}"
+        out = self._file
+        out.write(f"<section id=\"{anchor}\">\n<h2>{html.escape(row_title(record))}</h2>\n")
+        url = record.get('original_url', '')
+        out.write(f"<p><a href=\"{html.escape(url)}\">{html.escape(url)}</a> &middot; "
+                  f"<a href=\"{html.escape(self.pdf_name)}#page={page}\">PDF page {page}</a></p>\n<dl>\n")
+        for key, value in fields:
+            out.write(f"<dt>{html.escape(key)}</dt><dd>{html.escape(value)}</dd>\n")
+        out.write("</dl>\n")
+        references = record.get('references') or []
+        if references:
+            also = ', '.join(f"URL {r['url_index']} / row {r['row_number']}" for r in references)
+            out.write(f"<p>Also linked from: {html.escape(also)}</p>\n")
+        if screenshot:
+            src = os.path.relpath(screenshot, os.path.dirname(os.path.abspath(self.path)))
+            out.write(f"<img src=\"{html.escape(src)}\" loading=\"lazy\" "
+                      f"alt=\"{html.escape(row_title(record))}\">\n")
+        out.write("</section>\n")
+
+    def close(self):
+        self._file.write("</body>\n</html>\n")
+        self._file.close()
+
+
+def _find_screenshot(path, output_dir):
+    """Checkpointed screenshot path, also when the run was moved"""
+    if not path:
+        return None
+    for candidate in (path, os.path.join(output_dir, os.path.basename(path))):
+        if os.path.exists(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+def build_report(output_dir, run_id, dpi=110, quality=80):
+    """Write ``report_<run>.pdf`` and ``report_<run>.html`` for a run
+
+    Returns the two paths and the number of rows in the report.
+    """
+    records_path = os.path.join(output_dir, f"form_data_{run_id}.jsonl")
+    checkpoint_path = os.path.join(output_dir, f"checkpoint_{run_id}.jsonl")
+    screenshots = {
+        (entry['url'], entry['row']): entry['screenshot']
+        for entry in _read_jsonl(checkpoint_path) if 'url' in entry
+    }
+
+    pdf_path = os.path.join(output_dir, f"report_{run_id}.pdf")
+    html_path = os.path.join(output_dir, f"report_{run_id}.html")
+    pdf = PdfWriter(pdf_path)
+    index = HtmlIndex(html_path, f"SATU run {run_id}", os.path.basename(pdf_path))
+    width = PAGE_WIDTH - 2 * MARGIN
+    rows = 0
+    try:
+        for record in iter_records(records_path):
+            fields = field_lines(record)
+            screenshot = _find_screenshot(
+                screenshots.get((record.get('original_url'), record.get('row_number'))), output_dir
+            )
+
+            text = PageText()
+            text.line(row_title(record), bold=True, size=TITLE_SIZE)
+            text.line(record.get('original_url', ''))
+            for reference in record.get('references') or []:
+                text.line(f"Also linked from URL {reference['url_index']} / row {reference['row_number']}")
+            for key, value in fields:
+                wrapped = textwrap.wrap(f"{key}: {value}", WRAP_WIDTH, subsequent_indent='    ') or [key]
+                for line in wrapped:
+                    # Fields longer than a page are cut, the HTML index has them in full
+                    if text.y - LEADING < MARGIN:
+                        break
+                    text.line(line)
+            first_page = None
+
+            if screenshot:
+                page_room = PAGE_HEIGHT - 3 * MARGIN
+                available = text.y - LEADING - MARGIN
+                if available < MIN_IMAGE_HEIGHT:
+                    first_page = pdf.add_page(text.content())
+                    text = None
+                    available = page_room
+                try:
+                    for jpeg, px_width, px_height, height_pt in screenshot_strips(
+                            screenshot, width, available, page_room, dpi, quality):
+                        if text is None:
+                            text = PageText()
+                            text.line(f"{row_title(record)} (continued)", bold=True)
+                        image = pdf.add_image(jpeg, px_width, px_height)
+                        y = text.y - LEADING / 2 - height_pt
+                        draw = b'q %.2f 0 0 %.2f %.2f %.2f cm /Im0 Do Q' % (width, height_pt, MARGIN, y)
+                        page = pdf.add_page(text.content() + b'\n' + draw, [image])
+                        first_page = first_page or page
+                        text = None
+                except OSError as e:
+                    print(f"⚠️ Could not add {screenshot} to the report: {e}")
+            if text is not None:
+                page = pdf.add_page(text.content())
+                first_page = first_page or page
+
+            index.add_row(record, fields, screenshot, first_page)
+            rows += 1
+    finally:
+        pdf.close()
+        index.close()
+    return pdf_path, html_path, rows
@@ -0,0 +1,219 @@
+"""
+Per-phase timing of a run
+
+Each phase of the run (launch, login, list discovery, navigation, settling,
+extraction, screenshot, crop) is recorded with its wall time, the change in
+the tab's CDP performance metrics and the bytes the tab received while it
+ran. Events are appended to ``trace_<run>.jsonl`` as they finish; when the
+run ends they are also written as a Chrome trace-event file,
+``trace_<run>.json``, that opens in chrome://tracing or ui.perfetto.dev.
+"""
+
+import contextlib
+import json
+import math
+import os
+import time
+
+# page.metrics() counters reported as their change over a phase
+METRIC_DELTAS = ('LayoutCount', 'RecalcStyleCount', 'LayoutDuration',
+                 'RecalcStyleDuration', 'ScriptDuration', 'TaskDuration')
+# and those reported as their value at the end of it
+METRIC_LEVELS = ('JSHeapUsedSize', 'JSHeapTotalSize', 'Nodes', 'Documents')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class _NoPhase:
+    """Stand-in for ``RunTrace.phase`` when tracing is off"""
+
+    async def __aenter__(self):
+        return {}
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+NO_PHASE = _NoPhase()
+
+
+class RunTrace:
+    """JSONL and Chrome trace-event recorder of a run's phases"""
+
+    def __init__(self, output_dir, run_id):
+        self.jsonl_path = os.path.join(output_dir, f"trace_{run_id}.jsonl")
+        self.chrome_path = os.path.join(output_dir, f"trace_{run_id}.json")
+        self._events = open(self.jsonl_path, 'a', encoding='utf-8')
+        self._durations = {}
+        self._tabs = {}
+        self._received = {}
+
+    def attach(self, page):
+        """Give a tab its own trace track and count the bytes it receives"""
+        self._tabs[page] = len(self._tabs) + 1
+        self._received[page] = 0
+
+        def loaded(event):
+            self._received[page] += event.get('encodedDataLength', 0)
+        page._client.on('Network.loadingFinished', loaded)
+
+    async def _metrics(self, page):
+        if page is None or page.isClosed():
+            return {}
+        try:
+            return await page.metrics()
+        except Exception:
+            return {}
+
+    @contextlib.asynccontextmanager
+    async def phase(self, name, page=None, **args):
+        """Time the body as phase ``name`` of ``page``
+
+        Yields a dict; anything the body puts in it is kept with the event.
+        """
+        details = dict(args)
+        before = await self._metrics(page)
+        received = self._received.get(page, 0)
+        started = time.time()
+        try:
+            yield details
+        except Exception as e:
+            details['error'] = str(e)
+            raise
+        finally:
+            ended = time.time()
+            after = await self._metrics(page)
+            for key in METRIC_DELTAS:
+                if key in before and key in after:
+                    details[key] = round(after[key] - before[key], 6)
+            for key in METRIC_LEVELS:
+                if key in after:
+                    details[key] = after[key]
+            if page in self._received:
+                details['bytes'] = self._received[page] - received
+            self.record(name, started, ended, track=self._tabs.get(page, 0), **details)
+
+    def record(self, name, started, ended, track=0, **details):
+        """Add a phase that was timed elsewhere (``time.time()`` seconds)"""
+        duration_ms = (ended - started) * 1000
+        self._durations.setdefault(name, []).append(duration_ms)
+        event = {'phase': name, 'start': round(started, 6), 'ms': round(duration_ms, 3), 'track': track}
+        event.update(details)
+        self._events.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self._events.flush()
+
+    def summary(self):
+        """Count, p50, p95 and total seconds of every phase"""
+        return {
+            name: {
+                'count': len(durations),
+                'p50_ms': round(percentile(durations, 0.50), 1),
+                'p95_ms': round(percentile(durations, 0.95), 1),
+                'total_s': round(sum(durations) / 1000, 1),
+            }
+            for name, durations in self._durations.items()
+        }
+
+    def write_chrome_trace(self):
+        """Convert the JSONL events into a Chrome trace-event file"""
+        self._events.flush()
+        tracks = set()
+        with open(self.jsonl_path, 'r', encoding='utf-8') as events, \
+                open(self.chrome_path, 'w', encoding='utf-8') as out:
+            out.write('{"traceEvents": [\n')
+            first = True
+            for line in events:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                args = {key: value for key, value in event.items()
+                        if key not in ('phase', 'start', 'ms', 'track')}
+                # Crops run in the pipeline's processes, one track per worker
+                process = 2 if 'worker' in event else 1
+                thread = event.get('worker', event['track'])
+                tracks.add((process, thread))
+                trace_event = {
+                    'name': event['phase'],
+                    'cat': event['phase'].split('.')[0],
+                    'ph': 'X',
+                    'ts': round(event['start'] * 1e6),
+                    'dur': round(event['ms'] * 1000),
+                    'pid': process,
+                    'tid': thread,
+                    'args': args,
+                }
+                out.write(('' if first else ',\n') + json.dumps(trace_event, ensure_ascii=False))
+                first = False
+            for process, thread in sorted(tracks):
+                if process == 2:
+                    label = f'cropper {thread}'
+                else:
+                    label = f'tab {thread}' if thread else 'run'
+                out.write(('' if first else ',\n') + json.dumps(
+                    {'name': 'thread_name', 'ph': 'M', 'pid': process, 'tid': thread, 'args': {'name': label}}))
+                first = False
+            out.write('\n]}\n')
+        return self.chrome_path
+
+    def close(self):
+        self._events.close()
+
+
+class CdpCounter:
+    """Count the DevTools protocol traffic of tabs, and its average per row
+
+    Every command a tab's session sends and every response or event it
+    receives is counted, with the size of the sent parameters (page script
+    sources included). Phases of a trace add their own metrics calls.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.totals = {'sent': 0, 'received': 0, 'sent_bytes': 0}
+        self._counts = {}
+
+    def attach(self, page):
+        client = page._client
+        counts = self._counts[page] = {'sent': 0, 'received': 0, 'sent_bytes': 0}
+        send, on_message = client.send, client._on_message
+
+        def counted_send(method, params=None):
+            counts['sent'] += 1
+            counts['sent_bytes'] += len(json.dumps(params)) if params else 0
+            return send(method, params)
+
+        def counted_on_message(message):
+            counts['received'] += 1
+            return on_message(message)
+
+        # Page, frame and network managers all send through this session
+        client.send = counted_send
+        client._on_message = counted_on_message
+        page.on('close', lambda: self._counts.pop(page, None))
+
+    @contextlib.contextmanager
+    def row(self, page):
+        """Add the traffic of the body to the per-row average"""
+        counts = self._counts.get(page)
+        before = dict(counts) if counts else None
+        yield
+        if before is not None:
+            self.rows += 1
+            for key in self.totals:
+                self.totals[key] += counts[key] - before[key]
+
+    def per_row(self):
+        """Mean commands, received messages and KiB sent per row"""
+        if not self.rows:
+            return None
+        return {
+            'sent': round(self.totals['sent'] / self.rows, 1),
+            'received': round(self.totals['received'] / self.rows, 1),
+            'sent_kib': round(self.totals['sent_bytes'] / self.rows / 1024, 1),
+        }
@@ -0,0 +1,126 @@
+"""
+Off-loop screenshot post-processing
+
+Screenshots are handed over as encoded bytes to a process pool that crops
+and writes them, so the browser can go on to the next row straight away.
+Captures already clipped to the content in the page are only written. The
+number of screenshots waiting in the pool is bounded: when the croppers fall
+behind, ``submit`` waits for a free slot, which caps the memory held in
+pending PNGs.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def crop_capture(image_bytes, image_path, keep_original=True, quality=None):
+    """Crop and write a screenshot in a worker process; returns the crop's path
+
+    numpy and PIL are imported here, by the workers, on the first crop.
+    """
+    from image_crop import crop_screenshot
+    return crop_screenshot(image_bytes, image_path, keep_original, quality)
+
+
+def save_capture(image_bytes, image_path):
+    """Write a screenshot that needs no crop; returns its path"""
+    with open(image_path, 'wb') as f:
+        f.write(image_bytes)
+    return image_path
+
+
+def _timed(func, *args):
+    """Result of ``func`` plus when and in which worker it ran"""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time(), os.getpid()
+
+
+class ScreenshotPipeline:
+    """Bounded process-pool stage that crops and saves screenshots"""
+
+    def __init__(self, workers=None, max_pending=None, keep_original=True, trace=None, quality=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.keep_original = keep_original
+        # JPEG/WebP quality of the crops
+        self.quality = quality
+        # A RunTrace that gets a "crop" event per screenshot
+        self.trace = trace
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pending = set()
+        self._executor = None
+
+    def start(self):
+        # Spawned workers do not inherit the browser connection or event loop
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+        return self
+
+    async def submit(self, png_bytes, image_path, crop=True):
+        """Queue a screenshot; returns a future resolving to the row's image path
+
+        Waits while ``max_pending`` screenshots are already queued. Without
+        ``crop`` the image is written as it is.
+        """
+        if self._slots.locked():
+            self.stalls += 1
+            started = time.monotonic()
+            await self._slots.acquire()
+            self.stall_seconds += time.monotonic() - started
+        else:
+            await self._slots.acquire()
+
+        loop = asyncio.get_running_loop()
+        if crop:
+            job = (crop_capture, png_bytes, image_path, self.keep_original, self.quality)
+        else:
+            job = (save_capture, png_bytes, image_path)
+        if self.trace:
+            future = self._traced(loop, job, 'crop' if crop else 'save', len(png_bytes), image_path)
+        else:
+            future = loop.run_in_executor(self._executor, *job)
+        self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _traced(self, loop, job, phase, size, image_path):
+        """Run a job with timing; the returned future still resolves to the path"""
+        timed = loop.run_in_executor(self._executor, _timed, *job)
+        future = loop.create_future()
+
+        def unpack(done):
+            if done.cancelled():
+                future.cancel()
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                cropped_path, started, ended, worker = done.result()
+                self.trace.record(phase, started, ended, worker=worker,
+                                  image_bytes=size, path=os.path.basename(image_path))
+                future.set_result(cropped_path)
+        timed.add_done_callback(unpack)
+        return future
+
+    def _done(self, future):
+        self._pending.discard(future)
+        self._slots.release()
+
+    async def drain(self):
+        """Wait until every queued screenshot has been written"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def close(self):
+        """Wait for the queued screenshots, then stop the worker processes"""
+        await self.drain()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
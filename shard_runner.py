@@ -0,0 +1,275 @@
+"""
+Multi-process sharding of a run
+
+The URL list is split over K worker processes, each running its own browser
+with the normal single-process pipeline on its share. URLs are balanced by
+their measured cost from earlier runs (``url_costs.json``). When every shard
+is done, their screenshots and rows are merged into the output directory as
+one ordered run, exactly as a single-process run would have left it.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from run_journal import RunJournal, _read_jsonl
+from launch_profile import PROFILES as LAUNCH_PROFILES
+from process_memory import process_tree_rss_mb
+from retry_policy import FailureLog, failures_file
+
+COSTS_FILE = "url_costs.json"
+
+
+def load_costs(path):
+    """Seconds of tab time per list URL, from earlier runs"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def update_costs(path, measured, alpha=0.5):
+    """Blend newly measured URL costs into the cost file (moving average)"""
+    if not measured:
+        return
+    costs = load_costs(path)
+    for url, seconds in measured.items():
+        previous = costs.get(url)
+        costs[url] = round(seconds if previous is None else alpha * seconds + (1 - alpha) * previous, 3)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(costs, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def partition_urls(indexed_urls, shards, costs):
+    """Split (url_index, url) pairs into ``shards`` groups of similar cost
+
+    Longest-processing-time first: URLs are taken from the most to the
+    least expensive and each goes to the group with the least work so far.
+    URLs without history are priced at the median known cost.
+    """
+    known = [costs[url] for _, url in indexed_urls if url in costs]
+    default_cost = statistics.median(known) if known else 1.0
+    priced = sorted(indexed_urls, key=lambda item: -costs.get(item[1], default_cost))
+
+    groups = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+    for url_index, url in priced:
+        target = loads.index(min(loads))
+        groups[target].append((url_index, url))
+        loads[target] += costs.get(url, default_cost)
+    return [sorted(group) for group in groups if group], loads
+
+
+class Shard:
+    """One worker process and its slice of the URL list"""
+
+    def __init__(self, number, urls, directory, spec):
+        self.number = number
+        self.urls = urls
+        self.directory = directory
+        self.spec_path = os.path.join(directory, 'shard.json')
+        self.spec = spec
+        self.process = None
+        self.killed_for_memory = False
+        self.peak_rss_mb = 0.0
+        self.started = None
+        self.elapsed = None
+
+    def write_spec(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.spec_path, 'w', encoding='utf-8') as f:
+            json.dump(self.spec, f, indent=2)
+
+
+async def _relay_output(shard):
+    prefix = f"[shard {shard.number}] "
+    while True:
+        line = await shard.process.stdout.readline()
+        if not line:
+            break
+        sys.stdout.write(prefix + line.decode('utf-8', 'replace'))
+        sys.stdout.flush()
+
+
+async def _watch_memory(shard, limit_mb, interval=2.0):
+    while shard.process.returncode is None:
+        rss = process_tree_rss_mb(shard.process.pid)
+        shard.peak_rss_mb = max(shard.peak_rss_mb, rss)
+        if limit_mb and rss > limit_mb:
+            print(f"❌ Shard {shard.number} uses {rss:.0f} MiB (limit {limit_mb} MiB), stopping it")
+            shard.killed_for_memory = True
+            shard.process.send_signal(signal.SIGTERM)
+            return
+        await asyncio.sleep(interval)
+
+
+def _cpu_pinning(shard_number, cpus_per_shard):
+    """preexec_fn pinning a shard (and the Chromium it starts) to its own cores"""
+    if not cpus_per_shard or not hasattr(os, 'sched_setaffinity'):
+        return None
+    available = sorted(os.sched_getaffinity(0))
+    start = shard_number * cpus_per_shard
+    cores = {available[(start + offset) % len(available)] for offset in range(cpus_per_shard)}
+    return lambda: os.sched_setaffinity(0, cores)
+
+
+async def _run_shard(shard, script, cpus_per_shard, memory_limit_mb):
+    shard.started = time.monotonic()
+    shard.process = await asyncio.create_subprocess_exec(
+        sys.executable, '-u', script, 'shard-worker', shard.spec_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        preexec_fn=_cpu_pinning(shard.number, cpus_per_shard),
+    )
+    watcher = asyncio.ensure_future(_watch_memory(shard, memory_limit_mb))
+    await _relay_output(shard)
+    await shard.process.wait()
+    watcher.cancel()
+    shard.elapsed = time.monotonic() - shard.started
+    return shard.process.returncode
+
+
+def _move(path, output_dir):
+    """Move a shard's file into the output directory; returns the new path
+
+    Files already moved by an earlier merge of the same run are left alone.
+    """
+    if not path:
+        return path
+    target = os.path.join(output_dir, os.path.basename(path))
+    if os.path.exists(path):
+        os.replace(path, target)
+    return target if os.path.exists(target) else path
+
+
+def merge_shards(shards, output_dir, run_id):
+    """Merge the shards' rows, screenshots and failures into one run in ``output_dir``"""
+    merged = RunJournal(output_dir, run_id)
+    failures = FailureLog(run_id)
+    try:
+        for shard in shards:
+            shard_failures = os.path.join(shard.directory, failures_file(run_id))
+            if os.path.exists(shard_failures):
+                with open(shard_failures, 'r', encoding='utf-8') as f:
+                    failures.absorb(json.load(f))
+            shard_journal = RunJournal(shard.directory, run_id)
+            shard_journal.close()
+            for record in _read_jsonl(shard_journal.records_path):
+                merged.add_row(record)
+            for url, row_numbers in shard_journal.lists.items():
+                merged.add_list(url, row_numbers)
+            for entry in shard_journal.done.values():
+                screenshot = entry['screenshot']
+                if screenshot and os.path.splitext(screenshot)[0].endswith('_cropped'):
+                    # Bring the uncropped original along with its crop
+                    root, ext = os.path.splitext(screenshot)
+                    _move(root[:-len('_cropped')] + ext, output_dir)
+                merged.complete_row(entry['url'], entry['row'], entry['url_index'],
+                                    _move(screenshot, output_dir))
+            update_costs(os.path.join(output_dir, COSTS_FILE),
+                         load_costs(os.path.join(shard.directory, COSTS_FILE)))
+
+        combined_path = os.path.join(output_dir, f"combined_form_data_{run_id}.json")
+        entries = merged.write_combined(combined_path)
+        if not failures.empty:
+            failures.write(os.path.join(output_dir, failures_file(run_id)))
+            print(f"🩹 {len(failures.dead_letters)} page(s) failed every attempt, "
+                  f"see {failures_file(run_id)}")
+        return merged.screenshot_files(), combined_path, entries
+    finally:
+        merged.close()
+
+
+async def run_sharded(script, login_url, urls_list, output_dir, shards, options, resume=None,
+                      session_mode='shared', launch_delay=0.0, cpus_per_shard=None, memory_limit_mb=None,
+                      report=False):
+    """Run ``urls_list`` over ``shards`` worker processes and merge the results
+
+    ``options`` are the keyword arguments every shard passes to
+    ``login_and_visit_urls``. With ``session_mode="shared"`` all shards
+    reuse the session file saved before they start; with ``"own"`` each
+    logs in and caches its session separately. Shard ``k`` starts ``k * launch_delay``
+    seconds after the first, may be pinned to ``cpus_per_shard`` cores and
+    is stopped when its process tree grows past ``memory_limit_mb``; a
+    stopped or failed shard can be finished with ``--resume``. With
+    ``report`` the PDF and HTML report is built from the merged run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    run_id = None
+    if resume:
+        previous = sorted(name[len('shards_'):] for name in os.listdir(output_dir)
+                          if name.startswith('shards_'))
+        run_id = (previous[-1] if previous else None) if resume == 'latest' else resume
+    run_root = os.path.join(output_dir, f"shards_{run_id}") if run_id else None
+
+    shard_list = []
+    if run_root and os.path.isdir(run_root):
+        # Keep the earlier partition so finished rows stay with their shard
+        print(f"Resuming sharded run {run_id}")
+        for name in sorted(os.listdir(run_root)):
+            spec_path = os.path.join(run_root, name, 'shard.json')
+            if os.path.exists(spec_path):
+                with open(spec_path, 'r', encoding='utf-8') as f:
+                    spec = json.load(f)
+                shard_list.append(Shard(spec['number'], spec['urls'], os.path.dirname(spec_path), spec))
+    else:
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_root = os.path.join(output_dir, f"shards_{run_id}")
+        costs = load_costs(os.path.join(output_dir, COSTS_FILE))
+        groups, loads = partition_urls(list(enumerate(urls_list, 1)), shards, costs)
+        for number, group in enumerate(groups):
+            directory = os.path.join(run_root, f"shard_{number}")
+            shard_options = dict(options)
+            if session_mode == 'own' and shard_options.get('session_file'):
+                root, ext = os.path.splitext(shard_options['session_file'])
+                shard_options['session_file'] = f"{root}_shard{number}{ext}"
+            # A Chromium profile directory can only be open in one browser
+            profile_dir = (shard_options.get('user_data_dir')
+                           or LAUNCH_PROFILES[shard_options.get('launch_profile', 'window')].user_data_dir)
+            if profile_dir:
+                shard_options['user_data_dir'] = f"{profile_dir}_shard{number}"
+            spec = {
+                'number': number,
+                'run_id': run_id,
+                'login_url': login_url,
+                'urls': group,
+                'output_dir': directory,
+                'options': shard_options,
+            }
+            shard_list.append(Shard(number, group, directory, spec))
+            print(f"Shard {number}: {len(group)} URL(s), estimated {loads[number]:.1f} s")
+
+    for shard in shard_list:
+        shard.write_spec()
+
+    async def start(shard):
+        await asyncio.sleep(shard.number * launch_delay)
+        return await _run_shard(shard, script, cpus_per_shard, memory_limit_mb)
+
+    print(f"Starting {len(shard_list)} shard process(es)...")
+    return_codes = await asyncio.gather(*(start(shard) for shard in shard_list))
+
+    for shard, code in zip(shard_list, return_codes):
+        status = 'ok' if code == 0 and not shard.killed_for_memory else f'failed (exit {code})'
+        print(f"   shard {shard.number}: {status}, {len(shard.urls)} URL(s), "
+              f"{shard.elapsed:.1f} s, peak {shard.peak_rss_mb:.0f} MiB")
+
+    screenshot_files, combined_path, entries = merge_shards(shard_list, output_dir, run_id)
+    print(f"\n📄 Combined JSON data saved: {os.path.basename(combined_path)}")
+    print(f"📊 Total form data entries: {entries}")
+    if report:
+        from run_report import build_report
+        pdf_path, _, _ = await asyncio.get_running_loop().run_in_executor(
+            None, build_report, output_dir, run_id)
+        print(f"📑 Report saved: {os.path.basename(pdf_path)}")
+    if any(code != 0 for code in return_codes):
+        print(f"⚠️ Some shards did not finish; rerun with --shards {len(shard_list)} --resume {run_id}")
+    return screenshot_files
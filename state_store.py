@@ -0,0 +1,106 @@
+"""
+Row state kept between runs for incremental sweeps
+
+Each "Isi" row URL maps to a fingerprint of its extracted form data and of
+the form's rendered text, plus the screenshot taken for it. When a later run
+computes the same fingerprint and the screenshot is still on disk, the row
+is reported as unchanged and its screenshot is reused.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+# Fields that differ on every visit without the row changing
+VOLATILE_FIELDS = {'csrf_token', 'url_index', 'row_number', 'original_url', 'row_status',
+                   'references', 'cached_visit'}
+
+# Rendered text of the parts of the page that end up in the screenshot
+DOM_SIGNATURE_JS = '''() => {
+    const parts = [];
+    document.querySelectorAll('.row.border-gray-300').forEach(row => parts.push(row.innerText));
+    const form = document.querySelector('form');
+    if (form) {
+        parts.push(form.innerText);
+        form.querySelectorAll('input, select, textarea').forEach(field => {
+            if (field.name !== '_token') {
+                parts.push(`${field.name}=${field.type === 'radio' || field.type === 'checkbox' ? field.checked : field.value}`);
+            }
+        });
+    }
+    return parts.join('\\n');
+}'''
+
+
+def row_fingerprint(form_data, dom_signature=''):
+    """Stable hash of a row's content"""
+    content = {key: value for key, value in form_data.items() if key not in VOLATILE_FIELDS}
+    digest = hashlib.sha256()
+    digest.update(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(dom_signature.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RowStateStore:
+    """SQLite table of row URL -> fingerprint and screenshot"""
+
+    def __init__(self, path="satu_state.sqlite3"):
+        self.path = path
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS rows (
+                url TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                screenshot TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                last_changed TEXT NOT NULL
+            )
+        ''')
+        self._db.commit()
+
+    def check(self, url, fingerprint):
+        """Classify a row as new, changed or unchanged
+
+        Returns the status and, for an unchanged row, the screenshot to reuse.
+        A row whose screenshot has gone missing counts as changed.
+        """
+        row = self._db.execute('SELECT fingerprint, screenshot FROM rows WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            status, screenshot = 'new', None
+        elif row[0] == fingerprint and row[1] and os.path.exists(row[1]):
+            status, screenshot = 'unchanged', row[1]
+            self._db.execute('UPDATE rows SET last_seen = ? WHERE url = ?', (self._now(), url))
+            self._db.commit()
+        else:
+            status, screenshot = 'changed', None
+        self.counts[status] += 1
+        return status, screenshot
+
+    def record(self, url, fingerprint, screenshot):
+        """Store a row's fingerprint once its new screenshot is saved"""
+        now = self._now()
+        self._db.execute('''
+            INSERT INTO rows (url, fingerprint, screenshot, first_seen, last_seen, last_changed)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                screenshot = excluded.screenshot,
+                last_seen = excluded.last_seen,
+                last_changed = excluded.last_changed
+        ''', (url, fingerprint, screenshot, now, now, now))
+        self._db.commit()
+
+    def _now(self):
+        return datetime.now().isoformat(timespec='seconds')
+
+    def summary(self):
+        return ", ".join(f"{count} {status}" for status, count in self.counts.items())
+
+    def close(self):
+        self._db.close()
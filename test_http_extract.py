@@ -0,0 +1,20 @@
+"""
+The HTTP extractor against the page scripts' recorded values
+
+fixtures/http_extract holds saved list and "Isi" pages, and expected.json the
+form_data or links EXTRACT_FORM_DATA_JS and FIND_ISI_LINKS_JS give on them.
+"""
+
+import os
+
+from http_extract import check_expected
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'http_extract')
+
+
+def test_parser_matches_page_scripts():
+    paths, differences = check_expected(FIXTURES_DIR)
+    assert paths
+    assert [
+        (os.path.basename(path), key, parsed, scripted) for path, key, parsed, scripted in differences
+    ] == []
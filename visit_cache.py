@@ -0,0 +1,148 @@
+"""
+Run-wide cache of visited row pages
+
+The same "Isi" row can be linked from several list pages. Row URLs are
+normalized and the first row to claim one visits it; every later row with
+the same URL waits for that visit and is added to its record's
+``references`` instead of being navigated, extracted and screenshotted
+again. With a cache file the visits are also kept across runs, up to a
+maximum age.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Same page, same string: lower-case scheme and host, no default port,
+    sorted query and no fragment"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.port is not None and parts.port == DEFAULT_PORTS.get(scheme):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+class Visit:
+    """The first visit of a row URL and the rows waiting for its result"""
+
+    def __init__(self, url):
+        self.url = url
+        self.state = 'pending'
+        self.record = None
+        self.screenshot = None
+        # (form_data, screenshot, visited_at) kept from an earlier run, and
+        # whether this visit was resolved with it instead of a new visit
+        self.stored = None
+        self.used_stored = False
+        self._waiting = []
+
+    def then(self, callback):
+        """Call ``callback(visit)`` once the visit is done or failed"""
+        if self.state == 'pending':
+            self._waiting.append(callback)
+        else:
+            callback(self)
+
+    def _settle(self, state):
+        self.state = state
+        waiting, self._waiting = self._waiting, []
+        for callback in waiting:
+            callback(self)
+
+
+class VisitCache:
+    """Normalized row URL -> Visit, optionally backed by an SQLite file"""
+
+    def __init__(self, path=None, max_age_hours=24):
+        self.path = path
+        self.max_age = timedelta(hours=max_age_hours) if max_age_hours else None
+        self.hits = 0
+        self.stored_hits = 0
+        self._visits = {}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS visits (
+                    url TEXT PRIMARY KEY,
+                    form_data TEXT NOT NULL,
+                    screenshot TEXT,
+                    visited_at TEXT NOT NULL
+                )
+            ''')
+            self._db.commit()
+
+    def claim(self, url):
+        """Returns the URL's visit and whether the caller has to make it
+
+        A visit that failed is replaced, so the next row to claim the URL
+        tries again.
+        """
+        key = normalize_url(url)
+        visit = self._visits.get(key)
+        if visit and visit.state != 'failed':
+            self.hits += 1
+            return visit, False
+        visit = Visit(url)
+        visit.stored = self._load(key)
+        self._visits[key] = visit
+        return visit, True
+
+    def _load(self, key):
+        if not self._db:
+            return None
+        row = self._db.execute('SELECT form_data, screenshot, visited_at FROM visits WHERE url = ?',
+                               (key,)).fetchone()
+        if row is None:
+            return None
+        form_data, screenshot, visited_at = row
+        if self.max_age and datetime.now() - datetime.fromisoformat(visited_at) > self.max_age:
+            return None
+        if screenshot and not os.path.exists(screenshot):
+            screenshot = None
+        return json.loads(form_data), screenshot, visited_at
+
+    def resolve(self, visit, record, screenshot=None):
+        """Finish a visit with its row record; waiting rows get it too"""
+        visit.record = record
+        visit.screenshot = screenshot
+        if self._db and not visit.used_stored:
+            self._db.execute('''
+                INSERT INTO visits (url, form_data, screenshot, visited_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    form_data = excluded.form_data,
+                    screenshot = excluded.screenshot,
+                    visited_at = excluded.visited_at
+            ''', (normalize_url(visit.url), json.dumps(record, ensure_ascii=False), screenshot,
+                  datetime.now().isoformat(timespec='seconds')))
+            self._db.commit()
+        visit._settle('done')
+
+    def resolve_stored(self, visit, record, screenshot=None):
+        """Finish a visit with the entry kept from an earlier run"""
+        self.stored_hits += 1
+        visit.used_stored = True
+        self.resolve(visit, record, screenshot)
+
+    def fail(self, visit):
+        """Give up on a visit; waiting rows are visited on their own"""
+        visit._settle('failed')
+
+    def summary(self):
+        summary = f"{self.hits} duplicate row(s) reused"
+        if self._db:
+            summary += f", {self.stored_hits} row(s) taken from {self.path}"
+        return summary
+
+    def close(self):
+        if self._db:
+            self._db.close()